@@ -0,0 +1,394 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import argparse
+import logging
+import os
+import threading
+from flask import Flask, Response, jsonify, request
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from blockchain.ledger import Ledger
+from blockchain.verification import VerificationCache
+from data_manager.fragment_store import (
+    FRAGMENTS_DIRECTORY,
+    HEADER_FILENAME,
+    open_fragment_store,
+)
+from data_manager.archive import iter_chain_files, open_diploma
+from data_manager.fragmentation import iter_file_from_blockchain
+from data_manager.index import DiplomaIndex
+from data_manager.keystore import KEYSTORE_DIRECTORY, load_keys
+
+DB_DIRECTORY = "db_blockchains"
+# Nombre de blockchains gardées ouvertes entre les requêtes : projetées en
+# mémoire, seul leur index d'offsets (8 octets par bloc) est chargé
+CHAIN_CACHE_SIZE = 64
+# Nombre de registres partagés gardés ouverts
+LEDGER_CACHE_SIZE = 4
+# Nombre de sessions KEM gardées décapsulées (une par fichier extrait)
+SESSION_CACHE_SIZE = 256
+# Champs de l'index renvoyés par l'API (le chemin reste interne)
+PUBLIC_FIELDS = ["id", "metadata", "block_count", "tip_hash",
+                 "last_verified"]
+
+
+class LRUCache(OrderedDict):
+    """
+    Dictionnaire borné à `maxsize` entrées (éviction LRU), utilisable depuis
+    plusieurs threads. `on_evict` est appelé pour chaque valeur évincée ou
+    remplacée.
+    """
+
+    def __init__(self, maxsize, on_evict=None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                return default
+            self.move_to_end(key)
+            return self[key]
+
+    def __setitem__(self, key, value):
+        evicted = []
+        with self._lock:
+            if key in self and self[key] is not value:
+                evicted.append(self[key])
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                evicted.append(self.popitem(last=False)[1])
+        if self.on_evict is not None:
+            for old in evicted:
+                self.on_evict(old)
+
+
+class SharedResource:
+    """
+    Chaîne ouverte partagée par les requêtes (voir `DiplomaService`) : une
+    fois retirée du cache, elle n'est fermée que lorsque la dernière requête
+    qui l'utilise l'a libérée.
+    """
+
+    def __init__(self, value, stamp=None):
+        self.value = value
+        self.stamp = stamp
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Réserve la ressource ; retourne False si elle a déjà été retirée.
+        """
+        with self._lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            close = self._retired and not self._users
+        if close:
+            self.value.close()
+
+    def retire(self):
+        with self._lock:
+            if self._retired:
+                return
+            self._retired = True
+            close = not self._users
+        if close:
+            self.value.close()
+
+
+class DiplomaService:
+    """
+    État partagé par les requêtes du service : clés chargées une fois,
+    blockchains gardées ouvertes (rouvertes si leur fichier change),
+    signatures déjà vérifiées et sessions KEM déjà décapsulées. Chaque
+    thread a sa propre connexion à l'index SQLite.
+
+    Les blockchains sont projetées en mémoire et lues bloc par bloc : la
+    mémoire du service ne dépend pas de la taille des diplômes. Une chaîne
+    évincée du cache est fermée dès qu'aucune requête ne la lit plus.
+    """
+
+    def __init__(self, directory=DB_DIRECTORY,
+                 keystore_directory=KEYSTORE_DIRECTORY,
+                 cache_size=CHAIN_CACHE_SIZE):
+        self.directory = directory
+        self.keys = load_keys(keystore_directory)
+        self.verification_cache = VerificationCache()
+        self.sessions = LRUCache(SESSION_CACHE_SIZE)
+        self._chains = LRUCache(cache_size, SharedResource.retire)
+        # Registres partagés ouverts, par chemin
+        self._ledgers = LRUCache(LEDGER_CACHE_SIZE, SharedResource.retire)
+        self._local = threading.local()
+        # Index créé (et reconstruit si besoin) avant la première requête
+        self.index
+
+    @property
+    def index(self):
+        index = getattr(self._local, "index", None)
+        if index is None:
+            index = self._local.index = DiplomaIndex(self.directory)
+            if index.created:
+                index.rebuild(iter_chain_files(self.directory))
+        return index
+
+    @property
+    def fragment_store(self):
+        directory = os.path.join(self.directory, FRAGMENTS_DIRECTORY)
+        if not os.path.exists(os.path.join(directory, HEADER_FILENAME)):
+            return None
+        return open_fragment_store(
+            directory, self.keys.kem_public_key, self.keys.kem_private_key,
+            self.keys.kem_key_id
+        )
+
+    def entry(self, diploma_id):
+        """
+        Entrée de l'index d'un diplôme (`NotFound` s'il est inconnu).
+        """
+        entry = self.index.get(diploma_id)
+        if entry is None:
+            raise NotFound(f"Diplôme inconnu : {diploma_id}")
+        return entry
+
+    @contextmanager
+    def _lease(self, cache, key, stamp, opener):
+        # Ressource du cache réservée le temps de la requête : évincée ou
+        # remplacée entre-temps, elle n'est fermée qu'à sa libération
+        resource = cache.get(key)
+        if resource is None or resource.stamp != stamp \
+                or not resource.acquire():
+            resource = SharedResource(opener(), stamp)
+            resource.acquire()
+            cache[key] = resource
+        try:
+            yield resource.value
+        finally:
+            resource.release()
+
+    @contextmanager
+    def blockchain(self, entry):
+        """
+        Blockchain d'un diplôme (ou son segment du registre partagé), ouverte
+        une fois puis gardée ouverte tant que son fichier ne change pas.
+        """
+        path, start = entry["path"], entry["segment_start"]
+        if not os.path.exists(path):
+            raise NotFound(f"Blockchain absente : {entry['id']}")
+        if start is None:
+            stat = os.stat(path)
+            with self._lease(
+                self._chains, path, (stat.st_mtime_ns, stat.st_size),
+                lambda: open_diploma(entry)
+            ) as blockchain:
+                yield blockchain
+            return
+        # Un diplôme du registre partagé n'en lit que son segment, dans la
+        # chaîne du registre ouverte une fois pour toutes les requêtes
+        ledger, end = Ledger(path), entry["segment_end"]
+        with self._lease(
+            self._ledgers, path, None, ledger.open_chain
+        ) as chain:
+            if len(chain) <= end:
+                # Registre ouvert avant l'ajout du segment
+                ledger.refresh(chain)
+            yield ledger.open_segment(start, end, chain)
+
+    def verify(self, diploma_id):
+        """
+        Vérifie la blockchain d'un diplôme ; le point de contrôle de l'index
+        est mis à jour quand la chaîne a grandi depuis le dernier audit.
+        """
+        entry = self.entry(diploma_id)
+        with self.blockchain(entry) as blockchain:
+            # Signatures vérifiées avec la clé de l'archive, et non avec
+            # celle que chaque bloc déclare
+            report = blockchain.verify(
+                cache=self.verification_cache,
+                public_key=self.keys.sig_public_key
+            )
+            blocks = len(blockchain.chain)
+            tip_hash = blockchain.chain[-1].hash
+        if report.valid and report.checkpoint != (
+            entry["verified_index"], entry["verified_hash"]
+        ):
+            self.index.set_checkpoint(diploma_id, report.checkpoint)
+        return {
+            "id": diploma_id,
+            "valid": report.valid,
+            "failed_indexes": report.failed_indexes,
+            # Un segment est précédé du bloc qui le relie au registre
+            "blocks": blocks - (entry["segment_start"] is not None),
+            "tip_hash": tip_hash,
+        }
+
+    def iter_pdf(self, diploma_id):
+        """
+        Fragments déchiffrés du PDF d'un diplôme, dans l'ordre. La chaîne
+        est vérifiée avant le premier fragment, et reste réservée jusqu'à la
+        fermeture du générateur.
+        """
+        entry = self.entry(diploma_id)
+        with self.blockchain(entry) as blockchain:
+            yield from iter_file_from_blockchain(
+                blockchain, self.keys.kem_private_key,
+                self.keys.sig_public_key, self.keys.kem_key_id,
+                cache=self.verification_cache,
+                fragment_store=self.fragment_store, sessions=self.sessions,
+                quiet=True
+            )
+
+
+def _public(entry):
+    return {field: entry[field] for field in PUBLIC_FIELDS}
+
+
+def _stream(first, fragments):
+    # Fermer le générateur (fin de la réponse ou client parti) libère la
+    # chaîne qu'il lit
+    try:
+        yield first
+        yield from fragments
+    finally:
+        fragments.close()
+
+
+def create_app(directory=DB_DIRECTORY, keystore_directory=KEYSTORE_DIRECTORY,
+               cache_size=CHAIN_CACHE_SIZE):
+    """
+    Crée l'application Flask du service de vérification des diplômes.
+    """
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+    service = DiplomaService(directory, keystore_directory, cache_size)
+    app.config["SERVICE"] = service
+
+    @app.errorhandler(HTTPException)
+    def http_error(error):
+        return jsonify(error=error.description), error.code
+
+    @app.get("/diplomas")
+    def list_diplomas():
+        entries = service.index.search(
+            nom=request.args.get("nom"),
+            diplome=request.args.get("diplome"),
+            date=request.args.get("date"),
+            query=request.args.get("q"),
+        )
+        return jsonify(diplomas=[_public(entry) for entry in entries])
+
+    @app.get("/diplomas/<diploma_id>")
+    def get_diploma(diploma_id):
+        return jsonify(_public(service.entry(diploma_id)))
+
+    @app.get("/diplomas/<diploma_id>/verify")
+    def verify_diploma(diploma_id):
+        return jsonify(service.verify(diploma_id))
+
+    @app.get("/diplomas/<diploma_id>/pdf")
+    def diploma_pdf(diploma_id):
+        fragments = service.iter_pdf(diploma_id)
+        try:
+            # Vérification et premier fragment avant d'envoyer l'en-tête :
+            # une chaîne invalide donne une erreur plutôt qu'un PDF tronqué
+            first = next(fragments, b"")
+        except ValueError as e:
+            return jsonify(error=str(e)), 409
+        return Response(
+            _stream(first, fragments),
+            mimetype="application/pdf",
+            headers={
+                "Content-Disposition":
+                    f'attachment; filename="diploma_{diploma_id}.pdf"'
+            },
+        )
+
+    return app
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Serveur WSGI qui traite les connexions dans un pool de `workers`
+    threads : la concurrence est bornée, contrairement au serveur de
+    développement qui crée un thread par requête. Avec `log=False`, les
+    requêtes ne sont pas journalisées.
+    """
+
+    def __init__(self, host, port, app, workers=8, log=True):
+        super().__init__(
+            host, port, app,
+            handler=WSGIRequestHandler if log else _QuietRequestHandler
+        )
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="diploma-api"
+        )
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve(host="127.0.0.1", port=8000, workers=8, directory=DB_DIRECTORY,
+          keystore_directory=KEYSTORE_DIRECTORY):
+    """
+    Lance le service jusqu'à interruption.
+    """
+    app = create_app(directory, keystore_directory)
+    server = PooledWSGIServer(host, port, app, workers)
+    app.logger.setLevel(logging.INFO)
+    app.logger.info("Service des diplômes sur http://%s:%s (%s threads)",
+                    host, server.port, workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Service HTTP de vérification des diplômes"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=8,
+        help="Nombre de threads traitant les requêtes"
+    )
+    parser.add_argument("--directory", default=DB_DIRECTORY)
+    parser.add_argument("--keystore", default=KEYSTORE_DIRECTORY)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.directory, args.keystore)
+
+
+if __name__ == "__main__":
+    main()
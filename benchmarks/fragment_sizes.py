@@ -0,0 +1,113 @@
+"""
+Mesure le débit d'ajout et d'extraction selon la taille des fragments.
+
+    python benchmarks/fragment_sizes.py --file diploma.pdf --output sizes.json
+
+Pour chaque taille, le fichier est ajouté (mode session) à une blockchain
+enregistrée dans un journal binaire, puis extrait ; les durées, débits,
+nombres de blocs et tailles de journal sont écrits en JSON. La taille
+choisie par le mode adaptatif de `FragmentPolicy` est indiquée pour
+comparaison.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from blockchain.blockchain import Blockchain  # noqa: E402
+from blockchain.dilithium import generate_keys  # noqa: E402
+from data_manager.chiffrement import generate_kem_keys  # noqa: E402
+from data_manager.fragmentation import (  # noqa: E402
+    DEFAULT_POLICY,
+    IngestOptions,
+    add_file_to_blockchain,
+    extract_file_from_blockchain,
+)
+
+SIZES = [4, 16, 64, 256, 1024, 4096]  # en Kio
+
+
+def measure(file_path, fragment_size, keys, directory):
+    """
+    Ajoute puis extrait `file_path` avec des fragments de `fragment_size`
+    octets et retourne les mesures.
+    """
+    sig_public_key, sig_private_key, kem_public_key, kem_private_key = keys
+    file_size = os.path.getsize(file_path)
+    chain_path = os.path.join(directory, f"{fragment_size}.chain")
+
+    start = time.perf_counter()
+    blockchain = Blockchain.open(chain_path)
+    add_file_to_blockchain(
+        file_path, blockchain, kem_public_key, sig_private_key,
+        sig_public_key,
+        IngestOptions(session=True, fragment_size=fragment_size)
+    )
+    blockchain.close()
+    ingest = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blockchain = Blockchain.load_from_file(chain_path, lazy=True)
+    blocks = len(blockchain.chain)
+    extract_file_from_blockchain(
+        blockchain, os.path.join(directory, "extrait"), kem_private_key,
+        sig_public_key
+    )
+    blockchain.close()
+    extract = time.perf_counter() - start
+
+    return {
+        "fragment_size": fragment_size,
+        "blocks": blocks,
+        "chain_bytes": os.path.getsize(chain_path),
+        "ingest_seconds": ingest,
+        "extract_seconds": extract,
+        "ingest_mb_s": file_size / ingest / 1e6,
+        "extract_mb_s": file_size / extract / 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--file", default=os.path.join(ROOT, "diploma.pdf"))
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES,
+        help="Tailles de fragment à mesurer, en Kio"
+    )
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    keys = (*generate_keys(), *generate_kem_keys())
+    file_size = os.path.getsize(args.file)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            result = measure(args.file, size * 1024, keys, directory)
+            results.append(result)
+            print(
+                f"{size:6} Kio  {result['blocks']:6} blocs  "
+                f"ajout {result['ingest_mb_s']:7.2f} Mo/s  "
+                f"extraction {result['extract_mb_s']:7.2f} Mo/s  "
+                f"journal {result['chain_bytes'] / file_size:5.2f} x"
+            )
+    adaptive = DEFAULT_POLICY.fragment_size(file_size)
+    print(f"Taille adaptative : {adaptive // 1024} Kio")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "fragment_sizes": {
+                    "file_size": file_size,
+                    "adaptive_size": adaptive,
+                    "results": results,
+                }
+            }, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Test de charge du service HTTP : débit (requêtes/s) et latences.
+
+    python benchmarks/load_test.py --requests 200 --concurrency 8
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --id <id>
+
+Sans `--url`, un diplôme est créé à partir de `--file` dans un dossier
+temporaire et le service est lancé dans le processus (`--workers`
+threads). Les vérifications et les extractions sont envoyées par
+`--concurrency` clients simultanés ; le débit, les latences p50 et p99 et
+les erreurs sont écrits en JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_diplomas import PooledWSGIServer, create_app  # noqa: E402
+from data_manager.archive import ingest_diploma  # noqa: E402
+from data_manager.keystore import load_keys  # noqa: E402
+
+ENDPOINTS = {
+    "verify": "/diplomas/{id}/verify",
+    "extract": "/diplomas/{id}/pdf",
+}
+
+
+def percentile(values, q):
+    """
+    Percentile `q` (entre 0 et 1) par rang le plus proche.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def fetch(url):
+    start = time.perf_counter()
+    with urlopen(url, timeout=300) as response:
+        size = 0
+        while chunk := response.read(1024 * 1024):
+            size += len(chunk)
+    return time.perf_counter() - start, size
+
+
+def run(url, requests, concurrency):
+    """
+    Envoie `requests` requêtes GET sur `url` depuis `concurrency` clients
+    et retourne les mesures.
+    """
+    latencies, errors, sizes = [], [], 0
+
+    def one(_):
+        try:
+            return fetch(url)
+        except Exception as e:
+            return e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for result in executor.map(one, range(requests)):
+            if isinstance(result, Exception):
+                errors.append(str(result))
+            else:
+                latencies.append(result[0])
+                sizes += result[1]
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_s": len(latencies) / elapsed,
+        "mean": statistics.mean(latencies) if latencies else None,
+        "p50": percentile(latencies, 0.5) if latencies else None,
+        "p99": percentile(latencies, 0.99) if latencies else None,
+        "bytes": sizes,
+    }
+
+
+def start_service(file_path, directory, workers):
+    """
+    Crée un diplôme dans `directory` et lance le service dans un thread.
+    Retourne le serveur et l'identifiant du diplôme.
+    """
+    keystore = os.path.join(directory, "keystore")
+    keys = load_keys(keystore)
+    diploma_id, _ = ingest_diploma(
+        file_path,
+        {"Nom": "Test de charge", "Diplôme": "Master",
+         "Date d'obtention": "2024-06-30"},
+        keys.kem_public_key, keys.sig_private_key, keys.sig_public_key,
+        directory=os.path.join(directory, "db"), kem_key_id=keys.kem_key_id
+    )
+    server = PooledWSGIServer(
+        "127.0.0.1", 0, create_app(os.path.join(directory, "db"), keystore),
+        workers, log=False
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, diploma_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Service déjà lancé")
+    parser.add_argument("--id", help="Diplôme à demander (avec --url)")
+    parser.add_argument("--file", default=os.path.join(ROOT, "diploma.pdf"))
+    parser.add_argument(
+        "--endpoints", nargs="+", choices=list(ENDPOINTS),
+        default=list(ENDPOINTS)
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--workers", type=int, default=8,
+        help="Threads du service lancé dans le processus"
+    )
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        if args.url:
+            base, diploma_id = args.url.rstrip("/"), args.id
+            if diploma_id is None:
+                with urlopen(f"{base}/diplomas") as response:
+                    diploma_id = json.load(response)["diplomas"][0]["id"]
+        else:
+            server, diploma_id = start_service(
+                args.file, directory, args.workers
+            )
+            base = f"http://127.0.0.1:{server.port}"
+
+        results = {}
+        try:
+            for endpoint in args.endpoints:
+                url = base + ENDPOINTS[endpoint].format(id=diploma_id)
+                # Première requête hors mesure : clés et chaîne chargées
+                fetch(url)
+                result = run(url, args.requests, args.concurrency)
+                results[endpoint] = result
+                print(
+                    f"{endpoint:8} {result['requests_s']:8.1f} req/s  "
+                    f"p50 {result['p50'] * 1000:8.1f} ms  "
+                    f"p99 {result['p99'] * 1000:8.1f} ms  "
+                    f"erreurs {result['errors']}"
+                )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"load_test": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
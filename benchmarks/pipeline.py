@@ -0,0 +1,312 @@
+"""
+Mesure chaque étape de la chaîne d'ajout, d'extraction et de vérification.
+
+    python benchmarks/pipeline.py --sizes 0.1 1 10 --output pipeline.json
+    python benchmarks/pipeline.py --compare pipeline.json
+
+Les étapes unitaires (fragmentation, compression, chiffrement,
+construction et signature des blocs, ajout, validation, sauvegarde et
+chargement) sont mesurées séparément, puis l'ajout et l'extraction
+complets sur des PDF synthétiques de 100 Ko à 500 Mo. Les résultats (en
+secondes) sont écrits en JSON avec le commit mesuré ; `--compare` affiche
+l'écart des médianes avec un fichier de résultats précédent.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from blockchain.block import Block  # noqa: E402
+from blockchain.blockchain import Blockchain  # noqa: E402
+from blockchain.dilithium import generate_keys  # noqa: E402
+from data_manager.chiffrement import (  # noqa: E402
+    decrypt_fragment,
+    encrypt_fragment,
+    generate_kem_keys,
+)
+from data_manager.compression import compress_data  # noqa: E402
+from data_manager.fragmentation import (  # noqa: E402
+    IngestOptions,
+    add_file_to_blockchain,
+    extract_file_from_blockchain,
+    fragment_file,
+)
+
+SIZES = [0.1, 1, 10, 100, 500]  # en Mo
+STAGE_FILE_SIZE = 4_000_000
+FRAGMENT_SIZE = 64 * 1024
+CHAIN_LENGTH = 200
+WRITE_SIZE = 1024 * 1024
+
+
+def synthetic_pdf(path, size, seed=0):
+    """
+    Écrit un PDF synthétique de `size` octets : des flux de texte
+    (compressibles) alternent avec des flux d'image (aléatoires), comme
+    dans un diplôme scanné. Le contenu est reproductible pour un `seed`.
+    """
+    generator = random.Random(seed)
+    text = b"BT /F1 12 Tf 72 712 Td (Diplome de Master) Tj ET\n" * 400
+    written = 0
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        written += 9
+        number = 1
+        while written < size:
+            if number % 2:
+                stream = text
+            else:
+                stream = generator.randbytes(min(WRITE_SIZE, size))
+            obj = (
+                f"{number} 0 obj\n<< /Length {len(stream)} >>\nstream\n"
+            ).encode() + stream + b"\nendstream\nendobj\n"
+            obj = obj[:size - written]
+            f.write(obj)
+            written += len(obj)
+            number += 1
+    return path
+
+
+def measure(fn, runs, number=1):
+    """
+    Exécute `number` fois `fn` par mesure, `runs` mesures, et retourne les
+    durées par appel (minimum et médiane).
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        durations.append((time.perf_counter() - start) / number)
+    return {
+        "runs": runs,
+        "number": number,
+        "min": min(durations),
+        "median": statistics.median(durations),
+    }
+
+
+def _signed_chain(length, keys):
+    sig_public_key, sig_private_key = keys
+    blockchain = Blockchain()
+    for i in range(1, length):
+        blockchain.chain.append(Block(
+            index=i, data=os.urandom(512).hex(),
+            previous_hash=blockchain.chain[-1].hash,
+            private_key=sig_private_key, public_key=sig_public_key,
+        ))
+    return blockchain
+
+
+def measure_stages(directory, keys, runs):
+    """
+    Mesure les étapes unitaires de la chaîne de traitement.
+    """
+    sig_public_key, sig_private_key, kem_public_key, kem_private_key = keys
+    stages = {}
+
+    source = synthetic_pdf(
+        os.path.join(directory, "etapes.pdf"), STAGE_FILE_SIZE
+    )
+    stages["fragment_file"] = measure(
+        lambda: fragment_file(source, fragment_size=FRAGMENT_SIZE), runs
+    )
+    stages["fragment_file"]["bytes"] = STAGE_FILE_SIZE
+
+    with open(source, "rb") as f:
+        # Un fragment de texte puis d'image : compressible et non
+        fragment = f.read(FRAGMENT_SIZE)
+    for codec in ["auto", "zlib"]:
+        stages[f"compress_data[{codec}]"] = measure(
+            lambda: compress_data(fragment, codec), runs, number=20
+        )
+    encrypted = encrypt_fragment(fragment, kem_public_key)
+    stages["encrypt_fragment"] = measure(
+        lambda: encrypt_fragment(fragment, kem_public_key), runs, number=5
+    )
+    stages["decrypt_fragment"] = measure(
+        lambda: decrypt_fragment(encrypted, kem_private_key), runs, number=5
+    )
+    for name in ["compress_data[auto]", "compress_data[zlib]",
+                 "encrypt_fragment", "decrypt_fragment"]:
+        stages[name]["bytes"] = len(fragment)
+
+    data = fragment.hex()
+    stages["block_create"] = measure(
+        lambda: Block(index=1, data=data, previous_hash="0"),
+        runs, number=20
+    )
+    stages["block_sign"] = measure(
+        lambda: Block(
+            index=1, data=data, previous_hash="0",
+            private_key=sig_private_key, public_key=sig_public_key
+        ), runs, number=20
+    )
+
+    reference = _signed_chain(CHAIN_LENGTH, (sig_public_key, sig_private_key))
+
+    def add_blocks():
+        blockchain = Blockchain()
+        blockchain.chain[0] = reference.chain[0]
+        for block in reference.chain[1:]:
+            blockchain.add_block(block)
+
+    stages["add_block"] = measure(add_blocks, runs)
+    stages["is_chain_valid"] = measure(reference.is_chain_valid, runs)
+    for name in ["add_block", "is_chain_valid"]:
+        stages[name]["blocks"] = CHAIN_LENGTH
+
+    for extension in ["json", "chain"]:
+        path = os.path.join(directory, f"etapes.{extension}")
+
+        def save():
+            for suffix in ["", ".idx"]:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            reference.save_to_file(path)
+
+        stages[f"save_to_file[{extension}]"] = measure(save, runs)
+        stages[f"load_from_file[{extension}]"] = measure(
+            lambda: Blockchain.load_from_file(path), runs
+        )
+        stages[f"save_to_file[{extension}]"]["blocks"] = CHAIN_LENGTH
+        stages[f"load_from_file[{extension}]"]["blocks"] = CHAIN_LENGTH
+    return stages
+
+
+def measure_end_to_end(directory, size, keys, workers):
+    """
+    Ajoute puis extrait un PDF synthétique de `size` octets (journal binaire
+    et session KEM, comme l'outil en ligne de commande).
+    """
+    sig_public_key, sig_private_key, kem_public_key, kem_private_key = keys
+    source = synthetic_pdf(os.path.join(directory, "source.pdf"), size)
+    chain_path = os.path.join(directory, "source.chain")
+    output_path = os.path.join(directory, "extrait.pdf")
+    try:
+        start = time.perf_counter()
+        blockchain = Blockchain.open(chain_path)
+        add_file_to_blockchain(
+            source, blockchain, kem_public_key, sig_private_key,
+            sig_public_key, IngestOptions(session=True, workers=workers)
+        )
+        blockchain.close()
+        ingest = time.perf_counter() - start
+
+        start = time.perf_counter()
+        blockchain = Blockchain.load_from_file(chain_path, lazy=True)
+        blocks = len(blockchain.chain)
+        extract_file_from_blockchain(
+            blockchain, output_path, kem_private_key, sig_public_key
+        )
+        blockchain.close()
+        extract = time.perf_counter() - start
+        chain_bytes = os.path.getsize(chain_path)
+    finally:
+        for path in [source, chain_path, chain_path + ".idx", output_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {
+        "file_size": size,
+        "blocks": blocks,
+        "chain_bytes": chain_bytes,
+        "ingest_seconds": ingest,
+        "extract_seconds": extract,
+        "ingest_mb_s": size / ingest / 1e6,
+        "extract_mb_s": size / extract / 1e6,
+    }
+
+
+def _commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=ROOT,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _timings(results):
+    # Durées comparables d'un fichier de résultats : étape -> secondes
+    timings = {
+        name: stage["median"]
+        for name, stage in results["stages"].items()
+    }
+    for run in results["end_to_end"]:
+        for step in ["ingest", "extract"]:
+            timings[f"{step}[{run['file_size']}]"] = run[f"{step}_seconds"]
+    return timings
+
+
+def compare(previous, current):
+    """
+    Affiche le rapport des durées entre deux résultats (> 1 : plus lent).
+    """
+    before, after = _timings(previous), _timings(current)
+    print(f"Comparaison avec le commit {previous.get('commit')} :")
+    for name, seconds in after.items():
+        if name in before:
+            print(f"{name:28} {seconds / before[name]:6.2f} x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=float, nargs="+", default=SIZES,
+        help="Tailles des PDF synthétiques de bout en bout, en Mo"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument(
+        "--compare", help="Résultats précédents (JSON) à comparer"
+    )
+    args = parser.parse_args(argv)
+
+    keys = (*generate_keys(), *generate_kem_keys())
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "workers": args.workers,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        results["stages"] = measure_stages(directory, keys, args.runs)
+        for name, stage in results["stages"].items():
+            print(
+                f"{name:28} min {stage['min'] * 1000:9.3f} ms  "
+                f"médiane {stage['median'] * 1000:9.3f} ms"
+            )
+        results["end_to_end"] = []
+        for size in args.sizes:
+            result = measure_end_to_end(
+                directory, int(size * 1e6), keys, args.workers
+            )
+            results["end_to_end"].append(result)
+            print(
+                f"{size:8g} Mo  {result['blocks']:6} blocs  "
+                f"ajout {result['ingest_mb_s']:7.2f} Mo/s  "
+                f"extraction {result['extract_mb_s']:7.2f} Mo/s"
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["pipeline"], results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pipeline": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Mesure le temps d'import des modules au démarrage des outils.
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+
+Chaque import est mesuré dans un nouveau processus Python ; les résultats
+(en secondes) sont écrits en JSON pour comparer deux commits.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["blockchain.block", "cli_diplomas"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def measure_import(module, runs):
+    """
+    Importe `module` dans `runs` processus neufs et retourne les durées.
+    """
+    durations = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT.format(module=module)],
+            capture_output=True, text=True, check=True, cwd=ROOT,
+        )
+        durations.append(float(result.stdout.split()[-1]))
+    return durations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in MODULES:
+        durations = measure_import(module, args.runs)
+        results[module] = {
+            "runs": args.runs,
+            "min": min(durations),
+            "median": statistics.median(durations),
+        }
+        print(
+            f"{module:20} min {results[module]['min'] * 1000:8.1f} ms  "
+            f"médiane {results[module]['median'] * 1000:8.1f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"startup": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
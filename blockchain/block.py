@@ -1,42 +1,175 @@
 import hashlib
+from binascii import hexlify
 from blockchain.dilithium import sign, verify
+from blockchain.metrics import stage
 from time import time
 
+# Taille des tranches converties en hexadécimal pour le calcul du hash
+HASH_CHUNK = 64 * 1024
+
+# Types de bloc, inclus dans le hash. Les blocs des chaînes antérieures
+# n'ont pas de type (None) : leur hash est inchangé et leur type se déduit
+# de leur contenu.
+TYPE_GENESIS = 1
+TYPE_METADATA = 2
+TYPE_FRAGMENT_HEADER = 3  # En-tête de session KEM ou d'engagement Merkle
+TYPE_FRAGMENT = 4
+# Noms des types dans le format JSON
+BLOCK_TYPES = {
+    TYPE_GENESIS: "genesis",
+    TYPE_METADATA: "metadata",
+    TYPE_FRAGMENT_HEADER: "fragment_header",
+    TYPE_FRAGMENT: "fragment",
+}
+_TYPES_BY_NAME = {name: block_type for block_type, name in BLOCK_TYPES.items()}
+
+# Clés publiques déjà décodées : les blocs d'une même chaîne partagent le
+# même objet plutôt qu'une copie chacun
+_public_keys = {}
+_PUBLIC_KEYS_MAX = 64
+
+
+def _public_key_from_hex(value):
+    public_key = _public_keys.get(value)
+    if public_key is None:
+        public_key = bytes.fromhex(value)
+        if len(_public_keys) < _PUBLIC_KEYS_MAX:
+            _public_keys[value] = public_key
+    return public_key
+
 
 class Block:
+    """
+    Bloc de la blockchain.
+
+    Les attributs sont déclarés dans `__slots__` (pas de `__dict__` par
+    instance). Les données, hexadécimales pour tous les blocs sauf le
+    genèse, sont conservées en octets bruts (`payload`), deux fois plus
+    compacts ; `data` reste la chaîne hexadécimale utilisée pour le hash.
+    Le hash calculé est mis en cache, et une signature restaurée depuis
+    l'hexadécimal n'est décodée qu'au premier accès.
+
+    `block_type` (voir `BLOCK_TYPES`) indique la nature du bloc sans avoir
+    à lire ses données ; il fait partie du contenu haché et signé.
+    """
+
+    __slots__ = (
+        "index", "timestamp", "previous_hash", "hash", "public_key",
+        "block_type", "_payload", "_is_hex", "_signature", "_hashed",
+    )
+
     def __init__(self, index, timestamp=None, data="", previous_hash="",
-                 private_key=None, public_key=None):
+                 private_key=None, public_key=None, block_type=None):
         self.index = index
         self.timestamp = timestamp if timestamp is not None else \
             int(time() * 1000)
-        self.data = data
+        self.block_type = block_type
+        self._set_data(data)
         self.previous_hash = previous_hash
+        self._hashed = None
         self.hash = self.calculate_hash()
-        self.signature = None
+        self._signature = None
         self.public_key = public_key
         if private_key:
             self.signature = sign(self.hash.encode(), private_key)
 
+    def _set_data(self, value):
+        """
+        Fixe les données : une chaîne hexadécimale (ou des octets bruts) est
+        stockée en octets, tout autre texte en UTF-8.
+        """
+        if isinstance(value, (bytes, memoryview)):
+            self._payload, self._is_hex = value, True
+            return
+        if isinstance(value, bytearray):
+            self._payload, self._is_hex = bytes(value), True
+            return
+        if value and len(value) % 2 == 0:
+            try:
+                raw = bytes.fromhex(value)
+            except ValueError:
+                raw = None
+            if raw is not None and raw.hex() == value:
+                self._payload, self._is_hex = raw, True
+                return
+        self._payload, self._is_hex = value.encode(), False
+
     @property
     def data(self):
-        return self._data
+        if self._is_hex:
+            return self._payload.hex()
+        return bytes(self._payload).decode()
 
     @data.setter
     def data(self, value):
-        if hasattr(self, '_data'):  # Vérifie si l'attribut est déjà initialisé
-            raise AttributeError(
-                "Les données du bloc sont immuables après création."
-            )
-        self._data = value
+        raise AttributeError(
+            "Les données du bloc sont immuables après création."
+        )
+
+    @property
+    def payload(self):
+        """
+        Données du bloc en octets (hexadécimal décodé, ou texte UTF-8).
+        """
+        return self._payload
+
+    @property
+    def is_hex(self):
+        return self._is_hex
+
+    def hex_chunks(self):
+        """
+        Données du bloc sous forme hexadécimale (octets), par tranches :
+        permet de les hacher sans construire toute la chaîne `data`.
+        """
+        if not self._is_hex:
+            yield self._payload
+            return
+        view = memoryview(self._payload)
+        for start in range(0, len(view), HASH_CHUNK):
+            yield hexlify(view[start:start + HASH_CHUNK])
+
+    @property
+    def signature(self):
+        # Signature restaurée depuis l'hexadécimal ou une vue : décodée
+        # au premier accès
+        signature = self._signature
+        if signature is not None and not isinstance(signature, bytes):
+            signature = bytes.fromhex(signature) \
+                if isinstance(signature, str) else bytes(signature)
+            self._signature = signature
+        return signature
+
+    @signature.setter
+    def signature(self, value):
+        self._signature = value
 
     def calculate_hash(self):
-        content = (
-            f"{self.index}"
-            f"{self.timestamp}"
-            f"{self.data}"
-            f"{self.previous_hash}"
-        )
-        return hashlib.sha256(content.encode()).hexdigest()
+        """
+        Hash SHA-256 du type (pour un bloc typé), de l'indice, de
+        l'horodatage, des données (hexadécimales) et du hash précédent. Le
+        résultat est conservé tant que ces champs ne changent pas (les
+        données sont immuables).
+        """
+        key = (self.index, self.timestamp, self.block_type,
+               self.previous_hash)
+        if self._hashed is not None and self._hashed[0] == key:
+            return self._hashed[1]
+        with stage("block.hash", len(self._payload)):
+            digest = hashlib.sha256()
+            if self.block_type is not None:
+                # Préfixe d'un bloc typé : octet nul puis type. Le contenu
+                # haché d'un bloc sans type commence par son indice (un
+                # chiffre ou "-") : quelles que soient leurs données, un bloc
+                # typé et un bloc sans type n'ont jamais le même contenu
+                digest.update(bytes([0, self.block_type]))
+            digest.update(f"{self.index}{self.timestamp}".encode())
+            for chunk in self.hex_chunks():
+                digest.update(chunk)
+            digest.update(f"{self.previous_hash}".encode())
+            block_hash = digest.hexdigest()
+        self._hashed = (key, block_hash)
+        return block_hash
 
     def verify_block(self, public_key):
 
@@ -51,7 +184,7 @@ class Block:
         """
         Convertit le bloc en un dictionnaire sérialisable.
         """
-        return {
+        block = {
             "index": self.index,
             "timestamp": self.timestamp,
             "data": self.data,
@@ -60,25 +193,57 @@ class Block:
             "signature": self.signature.hex() if self.signature else None,
             "public_key": self.public_key.hex() if self.public_key else None
         }
+        if self.block_type is not None:
+            block["type"] = BLOCK_TYPES[self.block_type]
+        return block
+
+    def __reduce__(self):
+        return (Block.restore, (
+            self.index, self.timestamp, bytes(self._payload)
+            if self._is_hex else self.data, self.previous_hash, self.hash,
+            self.signature, self.public_key, self.block_type,
+        ))
+
+    @classmethod
+    def restore(cls, index, timestamp, data, previous_hash, block_hash,
+                signature=None, public_key=None, block_type=None):
+        """
+        Reconstruit un bloc enregistré à partir de ses champs. Les données
+        peuvent être une chaîne ou des octets bruts, la signature des
+        octets, une vue ou une chaîne hexadécimale (décodée au premier
+        accès).
+
+        Le hash enregistré est repris tel quel (il n'est pas recalculé) :
+        c'est la validation de la chaîne qui le compare aux données.
+        """
+        block = cls.__new__(cls)
+        block.index = index
+        block.timestamp = timestamp
+        block.block_type = block_type
+        block._set_data(data)
+        block.previous_hash = previous_hash
+        block._hashed = None
+        block.hash = block_hash or block.calculate_hash()
+        block._signature = signature or None
+        block.public_key = public_key
+        return block
 
     @classmethod
     def from_dict(cls, data):
         """
-        Reconstruit un bloc à partir d'un dictionnaire.
+        Reconstruit un bloc à partir d'un dictionnaire (voir `restore`).
         """
-        block = cls(
-            index=data["index"],
-            timestamp=data["timestamp"],
-            data=data["data"],
-            previous_hash=data["previous_hash"],
-            private_key=None,  # La clé privée n'est pas restaurée
-            public_key=(
-                bytes.fromhex(data["public_key"]) if data["public_key"]
-                else None
-            )
+        # Signature et clé publique restaurées en bytes (la clé privée n'est
+        # pas restaurée) : garder l'hexadécimal pour un décodage différé
+        # occuperait deux fois plus de mémoire
+        return cls.restore(
+            data["index"],
+            data["timestamp"],
+            data["data"],
+            data["previous_hash"],
+            data.get("hash"),
+            bytes.fromhex(data["signature"]) if data["signature"] else None,
+            _public_key_from_hex(data["public_key"]) if data["public_key"]
+            else None,
+            _TYPES_BY_NAME[data["type"]] if data.get("type") else None,
         )
-        # Restaure la signature en bytes
-        block.signature = (
-            bytes.fromhex(data["signature"]) if data["signature"] else None
-        )
-        return block
@@ -1,5 +1,9 @@
-from blockchain.block import Block
+from blockchain.block import TYPE_GENESIS, Block
+from blockchain.metrics import stage
+from blockchain.storage import ChainStore, LazyChain, is_store_file
+from blockchain.verification import verify_chain
 import json
+import os
 from time import time
 
 
@@ -8,6 +12,26 @@ class Blockchain:
         # Initialise la chaîne avec le bloc de genèse
         self.chain = [self.create_genesis_block()]
 
+    @classmethod
+    def open(cls, filename):
+        """
+        Ouvre (ou crée) une blockchain adossée à un journal binaire : chaque
+        bloc ajouté est écrit immédiatement en fin de fichier et n'est pas
+        conservé en mémoire.
+        """
+        blockchain = cls.__new__(cls)
+        blockchain.chain = LazyChain(filename, writable=True)
+        if not len(blockchain.chain):
+            blockchain.chain.append(blockchain.create_genesis_block())
+        return blockchain
+
+    def close(self):
+        """
+        Libère le fichier d'une chaîne chargée paresseusement.
+        """
+        if isinstance(self.chain, LazyChain):
+            self.chain.close()
+
     def create_genesis_block(self):
         """
         Crée le premier bloc de la chaîne (bloc de genèse).
@@ -17,12 +41,16 @@ class Blockchain:
             timestamp=int(time()),
             data="Genesis Block",
             previous_hash="0",
-            private_key=None  # Pas besoin de signature pour le genèse
+            private_key=None,  # Pas besoin de signature pour le genèse
+            block_type=TYPE_GENESIS
         )
 
-    def add_block(self, new_block):
+    def add_block(self, new_block, signed=True):
         """
         Ajoute un nouveau bloc à la chaîne après validation.
+
+        `signed=False` ajoute un bloc sans signature : réservé aux fragments
+        engagés par un en-tête Merkle (voir `blockchain.merkle`).
         """
         # Récupère le dernier bloc
         last_block = self.chain[-1]
@@ -31,17 +59,17 @@ class Blockchain:
         new_block.previous_hash = last_block.hash
 
         # Vérifie la validité du bloc
-        if self.is_block_valid(new_block, last_block):
+        if self.is_block_valid(new_block, last_block, signed):
             self.chain.append(new_block)
         else:
             raise ValueError("Bloc invalide : non ajouté à la chaîne.")
 
-    def is_block_valid(self, block, previous_block):
+    def is_block_valid(self, block, previous_block, signed=True):
         """
         Vérifie si un bloc est valide en :
         - Comparant le hash précédent avec celui du bloc précédent.
         - Vérifiant le hash du bloc actuel.
-        - Validant la signature du bloc.
+        - Validant la signature du bloc (si `signed`).
         """
         if block.previous_hash != previous_block.hash:
             return False
@@ -49,48 +77,93 @@ class Blockchain:
         if block.hash != block.calculate_hash():
             return False
 
-        if not block.verify_block(block.public_key):
+        if signed and not block.verify_block(block.public_key):
             return False
 
         return True
 
-    def is_chain_valid(self):
+    def is_chain_valid(self, workers=1, cache=None, public_key=None):
         """
         Vérifie la validité de toute la chaîne.
         """
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i - 1]
+        return self.verify(workers, cache, public_key=public_key).valid
 
-            # Vérifie chaque bloc
-            if not self.is_block_valid(current_block, previous_block):
-                return False
-        return True
+    def verify(self, workers=1, cache=None, checkpoint=None,
+               public_key=None):
+        """
+        Vérifie toute la chaîne et retourne un `VerificationReport` indiquant
+        les blocs invalides. Avec `workers > 1`, les signatures sont
+        vérifiées en parallèle sur plusieurs processus ; avec un
+        `VerificationCache`, les blocs déjà vérifiés sont sautés. Avec un
+        `checkpoint` (voir `VerificationReport.checkpoint`), seules les
+        signatures des blocs ajoutés depuis sont vérifiées. Avec
+        `public_key`, les signatures sont vérifiées avec cette clé et non
+        avec celle enregistrée dans chaque bloc.
+        """
+        return verify_chain(
+            self.chain, workers, cache=cache, checkpoint=checkpoint,
+            public_key=public_key
+        )
 
     def rebuild_data(self):
         """
         Reconstruit les données brutes à partir des blocs.
         """
-        data = ""
-        for block in self.chain:
-            data += block.data  # Concatène les données de chaque bloc
-        return data
+        # Concatène les données de chaque bloc en une seule passe
+        return "".join(block.data for block in self.chain)
 
     def save_to_file(self, filename):
         """
         Sauvegarde la chaîne dans un fichier texte.
+
+        Pour un journal binaire (`.chain`), seuls les blocs absents du
+        fichier sont ajoutés en fin de journal.
         """
-        with open(filename, "w") as file:
+        if is_store_file(filename):
+            with ChainStore(filename) as store:
+                saved = len(store)
+                if saved and (
+                    saved > len(self.chain)
+                    or store.read_block(saved - 1).hash
+                    != self.chain[saved - 1].hash
+                ):
+                    # Le fichier contient une autre chaîne : on la remplace
+                    store.truncate()
+                    saved = 0
+                for block in self.chain[saved:]:
+                    store.append(block)
+            return
+
+        with stage("chain.save"), open(filename, "w") as file:
             chain_data = [block.to_dict() for block in self.chain]
             json.dump(chain_data, file, indent=4)
 
     @classmethod
-    def load_from_file(cls, filename="blockchain.json"):
+    def load_from_file(cls, filename="blockchain.json", lazy=False):
         """
-        Charge la blockchain depuis un fichier JSON.
+        Charge la blockchain depuis un fichier JSON ou un journal binaire.
+
+        Avec `lazy=True`, un journal binaire est projeté en mémoire et ses
+        blocs ne sont décodés qu'à l'accès (`chain[i]`). Les fichiers JSON
+        sont toujours chargés entièrement.
         """
-        with open(filename, "r") as file:
+        # Pas de bloc de genèse temporaire : la chaîne vient du fichier
+        blockchain = cls.__new__(cls)
+        if is_store_file(filename):
+            # Comme pour un fichier JSON : charger ne crée pas de journal
+            if not os.path.exists(filename):
+                raise FileNotFoundError(
+                    f"Le fichier {filename} n'existe pas."
+                )
+            if lazy:
+                blockchain.chain = LazyChain(filename)
+            else:
+                with stage("chain.load"), \
+                        ChainStore(filename, writable=False) as store:
+                    blockchain.chain = list(store)
+            return blockchain
+
+        with stage("chain.load"), open(filename, "r") as file:
             chain_data = json.load(file)
-            blockchain = cls()
             blockchain.chain = [Block.from_dict(block) for block in chain_data]
         return blockchain
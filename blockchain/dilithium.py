@@ -1,4 +1,5 @@
 from pqc.sign import dilithium5 as dilithium
+from blockchain.metrics import stage
 
 
 class KeyManager:
@@ -20,34 +21,24 @@ def generate_keys():
     return public_key, private_key
 
 
-public_key, private_key = generate_keys()
-# print("Public Key:", public_key)
-# print("Private Key:", private_key)
-
-
 def sign(data, private_key):
     """
     Signe un message avec une clé privée SPHINCS+.
     """
-    signature = dilithium.sign(data, private_key)
+    with stage("dilithium.sign", len(data)):
+        signature = dilithium.sign(data, private_key)
     return signature
 
 
-data_signé = sign(b"Hello, World!", private_key)
-# print("data signé:", data_signé)
-
-
 def verify(signature, data, public_key):
     """
     Vérifie la signature d'un message avec une clé publique SPHINCS+.
     """
     try:
-        dilithium.verify(signature, data, public_key)
+        with stage("dilithium.verify", len(data)):
+            dilithium.verify(signature, data, public_key)
         return True
         print("Vérifié")
     except ValueError as e:
         return False
         print("Erreur:", e)
-
-
-print("Vérifié:", verify(data_signé, b"Hello, World!", public_key))
@@ -0,0 +1,181 @@
+from collections.abc import Sequence
+from contextlib import contextmanager
+import json
+import os
+from blockchain.blockchain import Blockchain
+from blockchain.verification import VerificationReport
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Plateforme sans verrou de fichier (Windows)
+
+LEDGER_FILENAME = "ledger.chain"
+SEGMENTS_SUFFIX = ".segments"
+
+
+class SegmentView(Sequence):
+    """
+    Vue des blocs `start` à `end` (inclus) d'une chaîne, précédés du bloc
+    auquel le premier est relié. Ce bloc occupe la position 0, comme un bloc
+    de genèse : la vue se lit et se vérifie comme la chaîne d'un diplôme
+    seul, sans décoder les autres blocs.
+    """
+
+    def __init__(self, chain, start, end):
+        if not 0 < start <= end < len(chain):
+            raise ValueError(f"Segment [{start}, {end}] hors de la chaîne.")
+        self.chain = chain
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start + 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Indice de bloc hors du segment.")
+        return self.chain[self.start - 1 + i]
+
+
+class Segment(Blockchain):
+    """
+    Diplôme stocké dans un registre partagé : ses blocs forment l'intervalle
+    [start, end] de la chaîne du registre.
+
+    La vérification ne porte que sur ces blocs et sur la preuve de chaînage
+    qui les relie au registre : le hash précédent du bloc `start` et celui
+    du bloc qui suit `end`. Les indices des blocs invalides sont ceux du
+    registre.
+
+    Avec `owner=True`, le segment a ouvert la chaîne du registre et la
+    libère à sa fermeture (`close`) ; sinon, elle reste à celui qui l'a
+    ouverte.
+    """
+
+    def __init__(self, ledger_chain, start, end, owner=False):
+        self.chain = SegmentView(ledger_chain, start, end)
+        self.owner = owner
+
+    def close(self):
+        if self.owner:
+            self.chain.chain.close()
+
+    def verify(self, workers=1, cache=None, checkpoint=None,
+               public_key=None):
+        report = super().verify(workers, cache, checkpoint, public_key)
+        view = self.chain
+        failed = [view.start - 1 + i for i in report.failed_indexes]
+        following = view.end + 1
+        if not failed and following < len(view.chain) and \
+                view.chain[following].previous_hash != view[-1].hash:
+            failed = [following]
+        return VerificationReport(failed, report.checkpoint)
+
+
+class Ledger:
+    """
+    Registre partagé : une seule chaîne en ajout seul (journal binaire),
+    avec un unique bloc de genèse, pour tous les diplômes. Ajouter un
+    diplôme n'écrit que ses blocs.
+
+    L'index des segments (`<registre>.segments`, une ligne JSON par
+    diplôme) associe chaque identifiant à l'intervalle de ses blocs. Il
+    n'est complété qu'une fois tous les blocs du diplôme écrits : les blocs
+    d'un ajout interrompu restent chaînés sans appartenir à aucun segment.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.segments_path = path + SEGMENTS_SUFFIX
+
+    @staticmethod
+    def is_ledger(path):
+        return os.path.exists(path + SEGMENTS_SUFFIX)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        # Verrou posé sur l'index des segments : un lecteur n'ouvre pas le
+        # registre pendant l'ajout d'un diplôme par un autre processus, dont
+        # les segments ne sont pas encore enregistrés
+        with open(self.segments_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(
+                    lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                )
+            yield
+
+    @contextmanager
+    def append(self):
+        """
+        Ouvre la chaîne du registre en écriture. Un seul processus à la
+        fois peut ajouter des blocs, et le registre ne peut pas être ouvert
+        en lecture pendant ce temps.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._locked(exclusive=True):
+            blockchain = Blockchain.open(self.path)
+            try:
+                yield blockchain
+            finally:
+                blockchain.close()
+
+    def add_segment(self, diploma_id, start, end):
+        """
+        Enregistre le segment [start, end] d'un diplôme. Un diplôme ajouté
+        de nouveau remplace son segment précédent.
+        """
+        record = json.dumps({"id": diploma_id, "start": start, "end": end})
+        with open(self.segments_path, "a") as f:
+            f.write(record + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def segments(self):
+        """
+        Retourne les segments du registre, par identifiant de diplôme.
+        """
+        segments = {}
+        if not os.path.exists(self.segments_path):
+            return segments
+        with open(self.segments_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Ligne tronquée par un arrêt brutal
+                segments[record["id"]] = (record["start"], record["end"])
+        return segments
+
+    def open_chain(self):
+        """
+        Chaîne du registre, projetée en mémoire (seul l'index d'offsets est
+        lu). Les blocs ajoutés ensuite ne font pas partie de la chaîne
+        ouverte.
+        """
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Le fichier {self.path} n'existe pas.")
+        with self._locked(exclusive=False):
+            return Blockchain.load_from_file(self.path, lazy=True).chain
+
+    def refresh(self, chain):
+        """
+        Complète une chaîne du registre ouverte par `open_chain` avec les
+        blocs ajoutés depuis (voir `LazyChain.refresh`).
+        """
+        with self._locked(exclusive=False):
+            chain.refresh()
+
+    def open_segment(self, start, end, chain=None):
+        """
+        Retourne le `Segment` [start, end], lu dans la chaîne du registre
+        (ou dans `chain`, déjà ouverte). Sans `chain`, la chaîne ouverte
+        est libérée par `Segment.close`.
+        """
+        if chain is not None:
+            return Segment(chain, start, end)
+        return Segment(self.open_chain(), start, end, owner=True)
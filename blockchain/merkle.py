@@ -0,0 +1,163 @@
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from blockchain.block import TYPE_FRAGMENT_HEADER
+
+# Début des données d'un bloc d'en-tête Merkle : il permet de reconnaître
+# ces blocs sans désérialiser les autres.
+HEADER_PREFIX = b'{"merkle_root": '
+
+
+def leaf_hash(data):
+    """
+    Hash d'une feuille : les données (chaîne) d'un bloc fragment.
+    Les préfixes 0x00 / 0x01 distinguent feuilles et nœuds internes.
+    """
+    return hashlib.sha256(b"\x00" + data.encode()).digest()
+
+
+def block_leaf_hash(block):
+    """
+    Hash de feuille d'un bloc, calculé sur ses données brutes (égal à
+    `leaf_hash(block.data)` sans construire la chaîne hexadécimale).
+    """
+    digest = hashlib.sha256(b"\x00")
+    for chunk in block.hex_chunks():
+        digest.update(chunk)
+    return digest.digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def hash_leaves(datas, workers=1, executor=None):
+    """
+    Calcule les hash des feuilles, en parallèle avec `workers > 1` ou sur
+    un pool de processus déjà ouvert (`executor`).
+    """
+    if executor is not None:
+        return list(executor.map(leaf_hash, datas, chunksize=16))
+    if workers <= 1:
+        return [leaf_hash(data) for data in datas]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(leaf_hash, datas, chunksize=16))
+
+
+def _levels(leaves):
+    """
+    Niveaux successifs de l'arbre, des feuilles à la racine. Un nœud sans
+    frère est remonté tel quel au niveau supérieur.
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [
+            node_hash(level[i], level[i + 1])
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def merkle_root(leaves):
+    """
+    Racine de l'arbre de Merkle des hash de feuilles `leaves`.
+    """
+    if not leaves:
+        return hashlib.sha256(b"").digest()
+    return _levels(leaves)[-1][0]
+
+
+def merkle_proof(leaves, index):
+    """
+    Preuve d'inclusion de la feuille `index` : liste de couples
+    (hash du frère, frère à gauche ?), de la feuille vers la racine.
+    """
+    proof = []
+    for level in _levels(leaves)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling], sibling < index))
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    """
+    Vérifie qu'une feuille appartient à l'arbre de racine `root`.
+    """
+    node = leaf
+    for sibling, sibling_is_left in proof:
+        node = node_hash(sibling, node) if sibling_is_left \
+            else node_hash(node, sibling)
+    return node == root
+
+
+def is_commitment_header(block):
+    """
+    Indique si un bloc est un en-tête d'engagement Merkle (un bloc typé
+    n'est lu que s'il est un en-tête de fragments).
+    """
+    if block.block_type not in (None, TYPE_FRAGMENT_HEADER):
+        return False
+    return block.is_hex and \
+        bytes(block.payload[:len(HEADER_PREFIX)]) == HEADER_PREFIX
+
+
+def read_commitment(block):
+    """
+    Lit la racine et le nombre de fragments engagés par un bloc d'en-tête.
+    """
+    header = json.loads(bytes(block.payload).decode())
+    return bytes.fromhex(header["merkle_root"]), header["fragments"]
+
+
+def find_commitment(chain, index):
+    """
+    Retrouve l'en-tête Merkle qui engage le bloc `index`.
+    Retourne (indice de l'en-tête, racine, nombre de fragments).
+    """
+    for i in range(index - 1, 0, -1):
+        block = chain[i]
+        if is_commitment_header(block):
+            root, count = read_commitment(block)
+            if index <= i + count:
+                return i, root, count
+            break
+    raise ValueError(f"Le bloc {index} n'est engagé par aucun en-tête.")
+
+
+def fragment_proof(chain, index):
+    """
+    Construit la preuve d'inclusion du bloc fragment `index`.
+    Retourne (indice de l'en-tête, racine, preuve).
+    """
+    header_index, root, count = find_commitment(chain, index)
+    leaves = [
+        block_leaf_hash(chain[i])
+        for i in range(header_index + 1, header_index + count + 1)
+    ]
+    return header_index, root, merkle_proof(leaves, index - header_index - 1)
+
+
+def verify_fragment(chain, index, proof, sig_public_key):
+    """
+    Vérifie un seul fragment sans parcourir la chaîne : signature de son
+    en-tête (une vérification) et preuve d'inclusion (O(log n) hash).
+    Lève `ValueError` si le bloc `index` n'est pas engagé par l'en-tête.
+    """
+    header_index, root, _ = proof
+    header = chain[header_index]
+    if not header.verify_block(sig_public_key):
+        return False
+    header_root, count = read_commitment(header)
+    if header_root != root:
+        return False
+    if not 0 <= index - header_index - 1 < count:
+        raise ValueError(
+            f"Le bloc {index} n'est pas engagé par l'en-tête {header_index}."
+        )
+    return verify_proof(block_leaf_hash(chain[index]), proof[2], root)
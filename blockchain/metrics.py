@@ -0,0 +1,239 @@
+import json
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+# Instrumentation des étapes coûteuses (KEM, AES, compression, encodage,
+# signatures, écritures disque). Désactivée par défaut : `stage` rend alors
+# un gestionnaire de contexte vide, sans mesure ni verrou.
+
+# Bornes supérieures (en secondes) des histogrammes de latence
+BUCKETS = (
+    1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0,
+)
+PREFIX = "diploma"
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+
+
+class StageMetrics:
+    """
+    Compteur, durée cumulée, octets traités et histogramme de latence d'une
+    étape.
+    """
+
+    __slots__ = ("count", "seconds", "bytes", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        # Une case par borne, plus une pour les durées au-delà
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds, nbytes=0):
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += nbytes
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+        self.count += other["count"]
+        self.seconds += other["seconds"]
+        self.bytes += other["bytes"]
+        for i, count in enumerate(other["buckets"]):
+            self.buckets[i] += count
+
+    def quantile(self, q):
+        """
+        Estimation d'un quantile : borne supérieure de la case qui le
+        contient (la durée maximale mesurable est la dernière borne).
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "bytes": self.bytes,
+            "buckets": list(self.buckets),
+        }
+
+
+class _Stage:
+    __slots__ = ("name", "nbytes", "start")
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, perf_counter() - self.start, self.nbytes)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    @property
+    def nbytes(self):
+        return 0
+
+    @nbytes.setter
+    def nbytes(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Remet toutes les mesures à zéro.
+    """
+    with _lock:
+        _stages.clear()
+
+
+def record(name, seconds, nbytes=0):
+    """
+    Enregistre une exécution de l'étape `name`.
+    """
+    with _lock:
+        metrics = _stages.get(name)
+        if metrics is None:
+            metrics = _stages[name] = StageMetrics()
+        metrics.add(seconds, nbytes)
+
+
+def stage(name, nbytes=0):
+    """
+    Mesure le bloc `with` comme une exécution de l'étape `name` portant sur
+    `nbytes` octets, si l'instrumentation est activée. Si la taille n'est
+    connue qu'après coup, le bloc peut la fixer (`with stage(...) as s:`
+    puis `s.nbytes = ...`).
+    """
+    if not _enabled:
+        return _NO_STAGE
+    return _Stage(name, nbytes)
+
+
+def snapshot():
+    """
+    Mesures courantes, sérialisables (par exemple pour les renvoyer d'un
+    processus du pool vers le processus principal, voir `merge`).
+    """
+    with _lock:
+        return {name: metrics.to_dict() for name, metrics in _stages.items()}
+
+
+def merge(measures):
+    """
+    Ajoute les mesures d'un autre processus (voir `snapshot`).
+    """
+    with _lock:
+        for name, measure in measures.items():
+            _stages.setdefault(name, StageMetrics()).merge(measure)
+
+
+def report():
+    """
+    Rapport JSON : pour chaque étape, nombre d'exécutions, durée totale et
+    moyenne, p50 et p99 estimés, octets et débit.
+    """
+    with _lock:
+        stages = dict(_stages)
+    result = {}
+    for name in sorted(stages, key=lambda n: -stages[n].seconds):
+        metrics = stages[name]
+        result[name] = {
+            **metrics.to_dict(),
+            "mean": metrics.seconds / metrics.count,
+            "p50": metrics.quantile(0.5),
+            "p99": metrics.quantile(0.99),
+            "mb_s": metrics.bytes / metrics.seconds / 1e6
+            if metrics.bytes and metrics.seconds else None,
+        }
+    return {"buckets": list(BUCKETS), "stages": result}
+
+
+def to_prometheus():
+    """
+    Mesures au format texte de Prometheus (histogramme de latence et
+    compteur d'octets par étape).
+    """
+    with _lock:
+        stages = {name: m.to_dict() for name, m in sorted(_stages.items())}
+    lines = [
+        f"# HELP {PREFIX}_stage_seconds Durée des étapes instrumentées.",
+        f"# TYPE {PREFIX}_stage_seconds histogram",
+    ]
+    for name, metrics in stages.items():
+        cumulated = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), metrics["buckets"]):
+            cumulated += count
+            lines.append(
+                f'{PREFIX}_stage_seconds_bucket{{stage="{name}",'
+                f'le="{bound}"}} {cumulated}'
+            )
+        lines.append(
+            f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} '
+            f'{metrics["seconds"]}'
+        )
+        lines.append(
+            f'{PREFIX}_stage_seconds_count{{stage="{name}"}} '
+            f'{metrics["count"]}'
+        )
+    lines += [
+        f"# HELP {PREFIX}_stage_bytes_total Octets traités par étape.",
+        f"# TYPE {PREFIX}_stage_bytes_total counter",
+    ]
+    for name, metrics in stages.items():
+        lines.append(
+            f'{PREFIX}_stage_bytes_total{{stage="{name}"}} '
+            f'{metrics["bytes"]}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path):
+    """
+    Écrit les mesures au format Prometheus (fichier `.prom`, pour le
+    collecteur textfile de node_exporter) ou en JSON.
+    """
+    with open(path, "w") as f:
+        if str(path).endswith(".prom"):
+            f.write(to_prometheus())
+        else:
+            json.dump(report(), f, indent=4)
@@ -0,0 +1,547 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections.abc import Sequence
+from blockchain.block import BLOCK_TYPES, Block
+from blockchain.metrics import stage
+
+MAGIC = b"DIPCHAIN"
+# Version 1 : clé publique complète dans chaque bloc.
+# Version 2 : chaque clé publique est stockée une fois dans le journal
+# (enregistrement de clé) et les blocs la désignent par son empreinte.
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HEADER = MAGIC + bytes([VERSION])
+HEADER_SIZE = len(HEADER)
+
+# Préfixe de longueur d'un enregistrement, puis indice et horodatage
+RECORD_LENGTH = struct.Struct("<I")
+RECORD_HEAD = struct.Struct("<qq")
+FIELD_HEAD = struct.Struct("<BI")
+
+# Nature d'un enregistrement (version 2), premier octet après la longueur
+RECORD_BLOCK = 0
+RECORD_KEY = 1
+RECORD_TYPED_BLOCK = 2  # Bloc suivi de l'octet de son type (voir `Block`)
+# Bit de poids fort d'une entrée d'index : enregistrement de clé
+KEY_FLAG = 1 << 63
+
+# Nature d'un champ encodé
+FIELD_NONE = 0
+FIELD_TEXT = 1  # Chaîne UTF-8
+FIELD_HEX = 2  # Chaîne hexadécimale stockée sous forme d'octets bruts
+FIELD_BYTES = 3  # Octets bruts
+FIELD_KEYREF = 4  # Empreinte d'une clé publique du journal
+KEY_REF_SIZE = 16
+
+
+def _encode_text(value):
+    """
+    Encode un champ texte ; les chaînes hexadécimales (données des blocs,
+    hash) sont stockées en octets bruts, soit moitié moins de place.
+    """
+    if value is None:
+        return FIELD_NONE, b""
+    if value and len(value) % 2 == 0:
+        try:
+            raw = bytes.fromhex(value)
+        except ValueError:
+            raw = None
+        if raw is not None and raw.hex() == value:
+            return FIELD_HEX, raw
+    return FIELD_TEXT, value.encode()
+
+
+def _encode_bytes(value):
+    if value is None:
+        return FIELD_NONE, b""
+    return FIELD_BYTES, bytes(value)
+
+
+def _decode_field(kind, raw):
+    if kind == FIELD_NONE:
+        return None
+    if kind == FIELD_TEXT:
+        return bytes(raw).decode()
+    if kind == FIELD_HEX:
+        return raw.hex()
+    if kind == FIELD_BYTES:
+        return bytes(raw)
+    raise ValueError(f"Type de champ inconnu : {kind}")
+
+
+def key_fingerprint(public_key):
+    """
+    Empreinte d'une clé publique dans un journal (version 2).
+    """
+    return hashlib.sha256(public_key).digest()[:KEY_REF_SIZE]
+
+
+def encode_block(block, version=VERSION):
+    """
+    Encode un bloc en un enregistrement binaire (sans préfixe de longueur).
+    En version 2, la clé publique est remplacée par son empreinte : elle
+    doit être enregistrée à part (voir `encode_key`). Le type d'un bloc
+    typé suit l'octet de nature de l'enregistrement ; en version 1, il est
+    ajouté en dernier champ (son nom, comme dans `to_dict`).
+    """
+    if version == 1:
+        parts = [RECORD_HEAD.pack(block.index, block.timestamp)]
+        public_key = _encode_bytes(block.public_key)
+    else:
+        parts = [
+            bytes([RECORD_BLOCK]) if block.block_type is None
+            else bytes([RECORD_TYPED_BLOCK, block.block_type]),
+            RECORD_HEAD.pack(block.index, block.timestamp),
+        ]
+        public_key = (FIELD_KEYREF, key_fingerprint(block.public_key)) \
+            if block.public_key else (FIELD_NONE, b"")
+    data = (FIELD_HEX, block.payload) if block.is_hex \
+        else (FIELD_TEXT, block.payload)
+    for kind, raw in (
+        data,
+        _encode_text(block.previous_hash),
+        _encode_text(block.hash),
+        _encode_bytes(block.signature),
+        public_key,
+    ):
+        parts.append(FIELD_HEAD.pack(kind, len(raw)))
+        parts.append(raw)
+    if version == 1 and block.block_type is not None:
+        name = BLOCK_TYPES[block.block_type].encode()
+        parts.append(FIELD_HEAD.pack(FIELD_TEXT, len(name)))
+        parts.append(name)
+    return b"".join(parts)
+
+
+def encode_key(public_key):
+    """
+    Encode un enregistrement de clé publique (version 2).
+    """
+    return bytes([RECORD_KEY]) + public_key
+
+
+def decode_block(buffer, keys, views=False):
+    """
+    Décode un enregistrement de bloc (version 2) directement en `Block`,
+    sans passer par un dictionnaire ni par l'hexadécimal de la signature.
+    `keys` associe les empreintes aux clés publiques du journal.
+
+    Avec `views`, les données et la signature restent des vues sur
+    l'enregistrement (sans copie, la signature n'est convertie qu'au
+    premier accès) : utile pour un bloc lu puis abandonné, mais chaque vue
+    retient tout l'enregistrement. Par défaut elles sont copiées en octets,
+    plus compact pour une chaîne chargée en mémoire.
+    """
+    view = memoryview(buffer)
+    block_type, offset = (view[1], 2) if view[0] == RECORD_TYPED_BLOCK \
+        else (None, 1)
+    index, timestamp = RECORD_HEAD.unpack_from(view, offset)
+    offset += RECORD_HEAD.size
+    fields = []
+    for _ in range(5):
+        kind, length = FIELD_HEAD.unpack_from(view, offset)
+        offset += FIELD_HEAD.size
+        raw = view[offset:offset + length]
+        if kind == FIELD_KEYREF:
+            try:
+                fields.append(keys[bytes(raw)])
+            except KeyError:
+                raise ValueError(
+                    f"Bloc {index} : clé publique absente du journal."
+                )
+        elif kind in (FIELD_HEX, FIELD_BYTES) and len(fields) in (0, 3):
+            # Données et signature : octets bruts (ou vues)
+            fields.append(raw if views else bytes(raw))
+        else:
+            fields.append(_decode_field(kind, raw))
+        offset += length
+    return Block.restore(index, timestamp, *fields, block_type)
+
+
+def decode(buffer, version, keys, views=False):
+    """
+    Décode un enregistrement de bloc d'un journal de version `version`.
+    """
+    if version == 1:
+        return Block.from_dict(decode_record(buffer))
+    return decode_block(buffer, keys, views)
+
+
+def decode_record(buffer):
+    """
+    Décode un enregistrement binaire (version 1) en dictionnaire au format
+    `to_dict`.
+    """
+    view = memoryview(buffer)
+    index, timestamp = RECORD_HEAD.unpack_from(view, 0)
+    offset = RECORD_HEAD.size
+    fields = []
+    for _ in range(5):
+        kind, length = FIELD_HEAD.unpack_from(view, offset)
+        offset += FIELD_HEAD.size
+        fields.append(_decode_field(kind, view[offset:offset + length]))
+        offset += length
+    data, previous_hash, block_hash, signature, public_key = fields
+    record = {
+        "index": index,
+        "timestamp": timestamp,
+        "data": data,
+        "previous_hash": previous_hash,
+        "hash": block_hash,
+        "signature": signature.hex() if signature else None,
+        "public_key": public_key.hex() if public_key else None,
+    }
+    if offset < len(view):
+        # Champ facultatif : type du bloc
+        kind, length = FIELD_HEAD.unpack_from(view, offset)
+        offset += FIELD_HEAD.size
+        record["type"] = _decode_field(kind, view[offset:offset + length])
+    return record
+
+
+class ChainStore:
+    """
+    Journal binaire en ajout seul : chaque bloc est un enregistrement
+    préfixé par sa longueur. Un index d'offsets (fichier `.idx`) permet de
+    lire n'importe quel bloc sans parcourir le journal.
+
+    Les nouveaux journaux utilisent la version 2 du format (clés publiques
+    stockées une fois) ; les journaux de version 1 restent lisibles et sont
+    complétés dans leur format.
+
+    Avec `writable=False`, le journal est seulement lu : il n'est ni créé,
+    ni réparé, et peut être ouvert pendant qu'un autre processus y ajoute
+    des blocs.
+    """
+
+    def __init__(self, path, writable=True):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.writable = writable
+        if writable and not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(HEADER)
+        self._file = open(path, "r+b" if writable else "rb")
+        header = self._file.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC \
+                or header[-1] not in SUPPORTED_VERSIONS:
+            self._file.close()
+            raise ValueError(f"{path} n'est pas un journal de blockchain.")
+        self.version = header[-1]
+        # Clés publiques du journal, par empreinte
+        self.keys = {}
+        self.offsets = self._load_index()
+
+    def _load_index(self):
+        """
+        Charge l'index d'offsets et le complète si le journal contient des
+        enregistrements non indexés (arrêt brutal entre les deux écritures).
+        Un enregistrement tronqué en fin de journal est supprimé, ainsi que
+        son entrée d'index. En lecture seule, les enregistrements non indexés
+        sont ignorés (ajout en cours) et rien n'est réparé sur le disque.
+
+        Les entrées marquées par `KEY_FLAG` désignent les enregistrements de
+        clé : les clés sont chargées et seuls les offsets des blocs sont
+        retournés.
+        """
+        entries = array("Q")
+        indexed = os.path.exists(self.index_path)
+        if indexed:
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+            entries.frombytes(raw[:len(raw) - len(raw) % entries.itemsize])
+
+        size = self._file.seek(0, os.SEEK_END)
+        position = HEADER_SIZE
+        if entries and entries[-1] & ~KEY_FLAG >= size:
+            # Index incohérent avec le journal : il est reconstruit
+            entries = array("Q")
+            indexed = False
+        repaired = not indexed
+        while entries:
+            last = entries[-1] & ~KEY_FLAG
+            end = self._record_end(last, size)
+            if end is not None:
+                position = end
+                break
+            # Enregistrement indexé mais tronqué : ses données n'avaient pas
+            # atteint le disque
+            entries.pop()
+            position = last
+            repaired = True
+
+        if self.writable or not indexed:
+            # Enregistrements écrits après la dernière entrée de l'index
+            while True:
+                end = self._record_end(position, size)
+                if end is None:
+                    break
+                self._file.seek(position + RECORD_LENGTH.size)
+                is_key = self.version > 1 and \
+                    self._file.read(1) == bytes([RECORD_KEY])
+                entries.append(position | KEY_FLAG if is_key else position)
+                position = end
+                repaired = True
+        if self.writable:
+            if position < size:
+                self._file.truncate(position)
+            if repaired:
+                with open(self.index_path, "wb") as f:
+                    entries.tofile(f)
+
+        # Nombre d'entrées lues : `LazyChain.refresh` reprend l'index ici
+        self.index_entries = len(entries)
+        offsets = array("Q")
+        for entry in entries:
+            if entry & KEY_FLAG:
+                self._load_key(entry & ~KEY_FLAG)
+            else:
+                offsets.append(entry)
+        return offsets
+
+    def _record_end(self, position, size):
+        # Fin de l'enregistrement commençant à `position`, ou None s'il
+        # dépasse la fin du journal (taille `size`)
+        if position + RECORD_LENGTH.size > size:
+            return None
+        self._file.seek(position)
+        length, = RECORD_LENGTH.unpack(self._file.read(RECORD_LENGTH.size))
+        end = position + RECORD_LENGTH.size + length
+        return end if end <= size else None
+
+    def _read_at(self, offset):
+        self._file.seek(offset)
+        length, = RECORD_LENGTH.unpack(self._file.read(RECORD_LENGTH.size))
+        return self._file.read(length)
+
+    def _load_key(self, offset):
+        public_key = self._read_at(offset)[1:]
+        self.keys[key_fingerprint(public_key)] = public_key
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, block):
+        """
+        Ajoute un bloc en fin de journal (coût indépendant de la taille de
+        la chaîne).
+        """
+        offset = self._file.seek(0, os.SEEK_END)
+        records, entries = [], []
+        if self.version > 1 and block.public_key:
+            fingerprint = key_fingerprint(block.public_key)
+            if fingerprint not in self.keys:
+                # Première utilisation de la clé : enregistrée une fois
+                key_record = encode_key(block.public_key)
+                records.append(RECORD_LENGTH.pack(len(key_record)))
+                records.append(key_record)
+                entries.append(offset | KEY_FLAG)
+                offset += RECORD_LENGTH.size + len(key_record)
+                self.keys[fingerprint] = bytes(block.public_key)
+        record = encode_block(block, self.version)
+        records.append(RECORD_LENGTH.pack(len(record)))
+        records.append(record)
+        entries.append(offset)
+        data = b"".join(records)
+        with stage("disk.write", len(data)):
+            self._file.write(data)
+            self._file.flush()
+            # Données sur le disque avant leur entrée d'index : une entrée ne
+            # désigne jamais un enregistrement incomplet
+            os.fsync(self._file.fileno())
+            with open(self.index_path, "ab") as f:
+                f.write(struct.pack(f"<{len(entries)}Q", *entries))
+        self.offsets.append(offset)
+
+    def read_record(self, i):
+        """
+        Lit l'enregistrement brut du bloc `i`.
+        """
+        return self._read_at(self.offsets[i])
+
+    def read_block(self, i):
+        """
+        Lit et reconstruit le bloc `i`.
+        """
+        return decode(self.read_record(i), self.version, self.keys)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.read_block(i)
+
+    def truncate(self):
+        """
+        Vide le journal, réécrit au format courant.
+        """
+        self._file.seek(0)
+        self._file.write(HEADER)
+        self._file.truncate(HEADER_SIZE)
+        self._file.flush()
+        with open(self.index_path, "wb"):
+            pass
+        self.version = VERSION
+        self.keys.clear()
+        del self.offsets[:]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LazyChain(Sequence):
+    """
+    Vue paresseuse d'un journal binaire : le fichier est projeté en mémoire
+    (mmap) et seul l'index d'offsets est lu à l'ouverture. Un bloc n'est
+    décodé que lorsque `chain[i]` est demandé.
+
+    Les blocs ajoutés avec `append` restent en mémoire jusqu'à la prochaine
+    sauvegarde, sauf en mode `writable` où ils sont écrits immédiatement
+    dans le journal : la mémoire utilisée ne dépend alors plus de la
+    longueur de la chaîne.
+
+    Une chaîne en lecture peut être partagée entre threads : la mise à jour
+    de la projection et `refresh` sont protégées par un verrou.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self._store = ChainStore(path, writable=writable)
+        self.offsets = self._store.offsets
+        self.version = self._store.version
+        self.keys = self._store.keys
+        self._index_entries = self._store.index_entries
+        if not writable:
+            self._store.close()
+            self._store = None
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._map()
+        self._pending = []
+
+    def _map(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) + len(self._pending)
+
+    def _read(self, i):
+        offset = self.offsets[i]
+        with self._lock:
+            if offset >= len(self._mmap):
+                # Bloc écrit depuis la projection : on la met à jour
+                self._map()
+            length, = RECORD_LENGTH.unpack_from(self._mmap, offset)
+            start = offset + RECORD_LENGTH.size
+            # Copie de l'enregistrement : il reste lisible après une
+            # nouvelle projection
+            record = self._mmap[start:start + length]
+        return decode(record, self.version, self.keys, views=True)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Indice de bloc hors de la chaîne.")
+        if i >= len(self.offsets):
+            return self._pending[i - len(self.offsets)]
+        return self._read(i)
+
+    def __iter__(self):
+        """
+        Parcourt les blocs par lectures séquentielles du fichier plutôt que
+        par la projection, pour ne pas garder tout le journal en mémoire.
+        """
+        count = len(self.offsets)
+        with open(self.path, "rb") as f:
+            for i in range(count):
+                f.seek(self.offsets[i])
+                length, = RECORD_LENGTH.unpack(f.read(RECORD_LENGTH.size))
+                yield decode(f.read(length), self.version, self.keys)
+        yield from self._pending
+
+    def append(self, block):
+        if self._store is not None:
+            self._store.append(block)
+        else:
+            self._pending.append(block)
+
+    def refresh(self):
+        """
+        Ajoute à une chaîne ouverte en lecture les blocs écrits dans le
+        journal depuis son ouverture : seule la fin de l'index d'offsets est
+        lue, et la projection n'est mise à jour qu'à la lecture d'un de ces
+        blocs. Retourne le nombre de blocs ajoutés.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        entries = array("Q")
+        with open(self.path + ".idx", "rb") as f:
+            f.seek(self._index_entries * entries.itemsize)
+            raw = f.read()
+        entries.frombytes(raw[:len(raw) - len(raw) % entries.itemsize])
+        count = len(self.offsets)
+        with open(self.path, "rb") as f:
+            for entry in entries:
+                if not entry & KEY_FLAG:
+                    self.offsets.append(entry)
+                    continue
+                f.seek(entry & ~KEY_FLAG)
+                length, = RECORD_LENGTH.unpack(f.read(RECORD_LENGTH.size))
+                public_key = f.read(length)[1:]
+                self.keys[key_fingerprint(public_key)] = public_key
+        self._index_entries += len(entries)
+        return len(self.offsets) - count
+
+    def close(self):
+        with self._lock:
+            self._mmap.close()
+        if self._store is not None:
+            self._store.close()
+
+
+def is_store_file(filename):
+    """
+    Indique si un fichier de blockchain utilise le journal binaire.
+    """
+    return filename.endswith(".chain")
+
+
+def json_to_store(json_path, store_path):
+    """
+    Convertit une blockchain sauvegardée en JSON vers le journal binaire.
+    """
+    with open(json_path, "r") as file:
+        chain_data = json.load(file)
+    for path in (store_path, store_path + ".idx"):
+        if os.path.exists(path):
+            os.remove(path)
+    with ChainStore(store_path) as store:
+        for block in chain_data:
+            store.append(Block.from_dict(block))
+
+
+def store_to_json(store_path, json_path):
+    """
+    Exporte un journal binaire vers le format JSON historique.
+    """
+    with ChainStore(store_path, writable=False) as store:
+        chain_data = [block.to_dict() for block in store]
+    with open(json_path, "w") as file:
+        json.dump(chain_data, file, indent=4)
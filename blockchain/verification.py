@@ -0,0 +1,322 @@
+import hashlib
+import sqlite3
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from itertools import islice
+from blockchain.block import TYPE_FRAGMENT
+from blockchain.dilithium import verify
+from blockchain.merkle import (
+    block_leaf_hash,
+    is_commitment_header,
+    merkle_root,
+    read_commitment,
+)
+
+
+class VerificationReport:
+    """
+    Résultat de la vérification d'une chaîne.
+
+    `failed_indexes` contient les indices des blocs invalides trouvés avant
+    l'arrêt de la vérification (qui s'arrête au premier échec).
+    `checkpoint` est le couple (indice, hash) du dernier bloc d'une chaîne
+    valide, à fournir au prochain audit.
+    """
+
+    def __init__(self, failed_indexes=(), checkpoint=None):
+        self.failed_indexes = sorted(failed_indexes)
+        self.checkpoint = checkpoint if not failed_indexes else None
+
+    @property
+    def valid(self):
+        return not self.failed_indexes
+
+    def __bool__(self):
+        return self.valid
+
+    def __repr__(self):
+        return f"VerificationReport(failed_indexes={self.failed_indexes})"
+
+
+def _scan_chain(chain, checkpoint=None):
+    """
+    Parcourt la chaîne une fois : chaînage, hash, point de contrôle et
+    engagements Merkle. Retourne l'indice du premier bloc invalide (ou
+    None) et les intervalles (début, fin) de blocs engagés par un en-tête
+    Merkle, dont la signature n'est pas requise.
+    """
+    committed = []
+    # En-tête en cours : (indice, racine, nombre de fragments), feuilles
+    header, leaves = None, []
+    previous_block = None
+    for i, block in enumerate(chain):
+        if previous_block is not None:
+            if block.previous_hash != previous_block.hash:
+                return i, committed
+            if block.hash != block.calculate_hash():
+                return i, committed
+        if checkpoint is not None and i == checkpoint[0] and \
+                block.hash != checkpoint[1]:
+            return i, committed
+        if header is not None:
+            if block.block_type not in (None, TYPE_FRAGMENT):
+                # Le type d'un bloc engagé n'est couvert par aucune
+                # signature : seul le type fragment est admis
+                return i, committed
+            leaves.append(block_leaf_hash(block))
+            if len(leaves) == header[2]:
+                if merkle_root(leaves) != header[1]:
+                    return header[0], committed
+                committed.append((header[0] + 1, i))
+                header, leaves = None, []
+        elif i and is_commitment_header(block):
+            try:
+                root, count = read_commitment(block)
+            except (ValueError, KeyError):
+                return i, committed
+            if count:
+                header = (i, root, count)
+        previous_block = block
+    if header is not None:
+        # Fichier tronqué : tous ses fragments ne sont pas dans la chaîne
+        return header[0], committed
+    if checkpoint is not None and checkpoint[0] >= len(chain):
+        return len(chain) - 1, committed
+    return None, committed
+
+
+def check_linkage(chain, checkpoint=None):
+    """
+    Vérifie le chaînage et les hash de tous les blocs (sans signatures),
+    ainsi que la racine de chaque engagement Merkle.
+    Avec un `checkpoint` (indice, hash), vérifie aussi que le bloc de cet
+    indice a toujours le hash enregistré : les blocs qui le précèdent n'ont
+    donc pas changé depuis.
+    Retourne l'indice du premier bloc invalide, ou None.
+    """
+    return _scan_chain(chain, checkpoint)[0]
+
+
+def _verify_signatures(tasks):
+    """
+    Vérifie un lot de signatures dans un processus du pool.
+    Chaque tâche est un tuple (indice, hash, signature, clé publique).
+    """
+    failed = []
+    for index, block_hash, signature, public_key in tasks:
+        if not signature or not public_key:
+            failed.append(index)
+        elif not verify(signature, block_hash, public_key):
+            failed.append(index)
+    return failed
+
+
+def _signature_task(index, block, public_key=None):
+    return (
+        index, block.hash.encode(), block.signature,
+        public_key if public_key is not None else block.public_key,
+    )
+
+
+def fingerprint(public_key):
+    """
+    Empreinte SHA-256 d'une clé publique.
+    """
+    return hashlib.sha256(public_key).hexdigest()
+
+
+class VerificationCache:
+    """
+    Cache des vérifications de signature réussies, indexé par
+    (hash du bloc, empreinte de la signature, empreinte de la clé
+    publique). Une signature Dilithium valide pour ce triplet le reste :
+    un bloc déjà vérifié n'a plus besoin de l'être.
+
+    Le cache mémoire est limité à `maxsize` entrées (éviction LRU). Avec
+    `path`, les entrées sont aussi conservées dans une base SQLite, pour
+    que les audits suivants ne vérifient que les nouveaux blocs.
+
+    Le cache mémoire peut être partagé entre threads (la connexion SQLite,
+    elle, reste propre au thread qui a créé le cache).
+    """
+
+    def __init__(self, maxsize=100_000, path=None):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS verified (key TEXT PRIMARY KEY)"
+            )
+
+    @staticmethod
+    def key(block, public_key=None):
+        public_key = public_key if public_key is not None \
+            else block.public_key
+        if not block.signature or not public_key:
+            return None
+        return ":".join((
+            block.hash,
+            hashlib.sha256(block.signature).hexdigest(),
+            fingerprint(public_key),
+        ))
+
+    def __contains__(self, key):
+        if key is None:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True
+        if self._db is not None and self._db.execute(
+            "SELECT 1 FROM verified WHERE key = ?", (key,)
+        ).fetchone():
+            self._remember(key)
+            return True
+        return False
+
+    def _remember(self, key):
+        with self._lock:
+            self._entries[key] = True
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def add(self, keys):
+        """
+        Enregistre des vérifications réussies.
+        """
+        keys = [key for key in keys if key is not None]
+        for key in keys:
+            self._remember(key)
+        if self._db is not None and keys:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO verified (key) VALUES (?)",
+                    [(key,) for key in keys],
+                )
+
+    def verify_block(self, block, public_key):
+        """
+        Équivalent de `block.verify_block(public_key)`, sans refaire une
+        vérification déjà réussie.
+        """
+        key = self.key(block, public_key)
+        if key in self:
+            return True
+        if block.verify_block(public_key):
+            self.add([key])
+            return True
+        return False
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+def verify_chain(chain, workers=1, chunk_size=64, cache=None,
+                 checkpoint=None, public_key=None):
+    """
+    Vérifie une chaîne de blocs.
+
+    Le chaînage et les hash sont contrôlés d'abord, dans le processus
+    courant. Les signatures Dilithium sont ensuite vérifiées par lots de
+    `chunk_size` blocs, répartis sur `workers` processus. La vérification
+    s'arrête au premier lot contenant un bloc invalide.
+
+    Avec un `VerificationCache`, les blocs déjà vérifiés sont sautés et les
+    nouvelles vérifications réussies y sont ajoutées.
+
+    Avec un `checkpoint` (indice, hash) issu d'un audit précédent, toute la
+    chaîne est rehachée mais seules les signatures des blocs ajoutés depuis
+    sont vérifiées.
+
+    Les fragments engagés par un en-tête Merkle (voir `blockchain.merkle`)
+    peuvent ne pas être signés : la racine est recalculée et seule la
+    signature de l'en-tête est vérifiée.
+
+    Avec `public_key`, chaque signature est vérifiée avec cette clé (celle
+    de l'archive) plutôt qu'avec la clé publique enregistrée dans le bloc :
+    une chaîne signée de nouveau avec une autre clé est invalide.
+    """
+    bad_link, committed = _scan_chain(chain, checkpoint)
+    if bad_link is not None:
+        return VerificationReport([bad_link])
+    tip = (len(chain) - 1, chain[-1].hash) if len(chain) else None
+    # Le bloc de genèse n'est pas signé
+    start = checkpoint[0] + 1 if checkpoint is not None else 1
+
+    firsts = [first for first, _ in committed]
+
+    def is_committed(index):
+        # Les intervalles sont triés et disjoints
+        position = bisect_right(firsts, index) - 1
+        return position >= 0 and index <= committed[position][1]
+
+    def tasks():
+        for i, block in enumerate(islice(chain, start, None), start):
+            if not block.signature and is_committed(i):
+                continue
+            key = VerificationCache.key(block, public_key) \
+                if cache is not None else None
+            if key is None or key not in cache:
+                yield _signature_task(i, block, public_key), key
+
+    def record(chunk, failed):
+        if cache is not None:
+            failed = set(failed)
+            cache.add(key for (i, *_), key in chunk if i not in failed)
+
+    if workers <= 1:
+        for task, key in tasks():
+            if _verify_signatures([task]):
+                return VerificationReport([task[0]])
+            record([(task, key)], [])
+        return VerificationReport(checkpoint=tip)
+
+    # Les lots sont soumis au fil du parcours, avec un nombre borné de lots
+    # en attente, pour ne pas charger toute la chaîne en mémoire.
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def collect(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                chunk = pending.pop(future)
+                result = future.result()
+                record(chunk, result)
+                failed.extend(result)
+
+        chunk = []
+        for item in tasks():
+            chunk.append(item)
+            if len(chunk) < chunk_size:
+                continue
+            future = executor.submit(
+                _verify_signatures, [task for task, _ in chunk]
+            )
+            pending[future] = chunk
+            chunk = []
+            if len(pending) >= 2 * workers:
+                collect(FIRST_COMPLETED)
+                if failed:
+                    break
+        if chunk and not failed:
+            future = executor.submit(
+                _verify_signatures, [task for task, _ in chunk]
+            )
+            pending[future] = chunk
+        while pending and not failed:
+            collect(FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+    return VerificationReport(failed, tip)
@@ -2,24 +2,109 @@ from rich.console import Console
 from rich.table import Table
 from rich.prompt import Prompt
 from rich.panel import Panel
-from rich.progress import Progress
+from rich.progress import (
+    BarColumn,
+    MofNCompleteColumn,
+    Progress,
+    TextColumn,
+    TimeRemainingColumn,
+)
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import cache
+import argparse
+import csv
+import hashlib
 import os
 import json
-from blockchain.blockchain import Blockchain, Block
-from blockchain.dilithium import KeyManager
-from data_manager.chiffrement import generate_kem_keys
+import sys
+import time
+from blockchain import metrics
+from blockchain.block import (
+    TYPE_FRAGMENT,
+    TYPE_FRAGMENT_HEADER,
+    TYPE_GENESIS,
+    TYPE_METADATA,
+)
+from blockchain.blockchain import Blockchain
+from blockchain.ledger import Ledger
+from data_manager.archive import (
+    append_diploma,
+    close_ledgers,
+    ingest_diploma,
+    iter_chain_files,
+    ledger_chain,
+    migrate_to_shards,
+    open_diploma,
+)
+from data_manager.audit import audit_archive
+from data_manager.fragment_store import (
+    FRAGMENTS_DIRECTORY,
+    HEADER_FILENAME,
+    open_fragment_store,
+)
+from data_manager.index import DiplomaIndex
+from data_manager.keystore import init_worker, load_keys
 from data_manager.fragmentation import (
-    add_file_to_blockchain,
-    extract_file_from_blockchain
+    block_type_of,
+    extract_file_from_blockchain,
 )
 
-# Initialiser Rich et les variables globales
+# Initialiser Rich
 console = Console()
-blockchain = Blockchain()
-key_manager = KeyManager()
-sig_public_key = key_manager.get_public_key()
-sig_private_key = key_manager.get_private_key()
-kem_public_key, kem_private_key = generate_kem_keys()
+
+
+KEYSTORE_DIRECTORY = "keystore"
+VERIFICATION_CACHE = "verified.sqlite"
+
+
+@cache
+def get_keys():
+    """
+    Charge les clés de signature et de chiffrement de la keystore au
+    premier usage (et non à l'import du module). Elles sont générées une
+    seule fois, à la première utilisation de la keystore.
+    """
+    return load_keys(KEYSTORE_DIRECTORY)
+
+
+def list_blockchain_files(directory="db_blockchains"):
+    """
+    Liste les chemins des blockchains (JSON ou journal binaire) du dossier
+    "db_blockchains". La liste vient de l'index, qui sert de manifeste :
+    le dossier et ses sous-dossiers ne sont pas parcourus.
+    """
+    if not os.path.exists(directory):
+        return []
+    with open_index(directory) as index:
+        return index.paths()
+
+
+def open_index(directory="db_blockchains"):
+    """
+    Ouvre l'index des diplômes, en le reconstruisant depuis les fichiers
+    de blockchain s'il n'existe pas encore.
+    """
+    index = DiplomaIndex(directory)
+    if index.created:
+        index.rebuild(iter_chain_files(directory))
+    return index
+
+
+def get_fragment_store(directory="db_blockchains", create=False):
+    """
+    Ouvre le magasin de fragments dédupliqués du dossier, ou retourne None
+    s'il n'existe pas (et que `create` est faux).
+    """
+    store_directory = os.path.join(directory, FRAGMENTS_DIRECTORY)
+    if not create and not os.path.exists(
+        os.path.join(store_directory, HEADER_FILENAME)
+    ):
+        return None
+    keys = get_keys()
+    return open_fragment_store(
+        store_directory, keys.kem_public_key, keys.kem_private_key,
+        keys.kem_key_id
+    )
 
 
 def save_blockchain(blockchain, filename):
@@ -35,9 +120,22 @@ def save_blockchain(blockchain, filename):
     )
 
 
-def add_diploma_with_rich():
+def diploma_label(entry):
+    """
+    Nom affiché d'un diplôme de l'index ou d'un résultat d'audit : son
+    fichier, ou le registre suivi de son identifiant.
+    """
+    name = os.path.basename(entry["path"])
+    if entry.get("segment_start") is None and "segment" not in entry:
+        return name
+    return f"{name} [{entry['id']}]"
+
+
+def add_diploma_with_rich(ledger=False):
     """
-    Ajouter un diplôme avec une interface utilisateur Rich.
+    Ajouter un diplôme avec une interface utilisateur Rich. Avec
+    `ledger=True`, le diplôme est ajouté au registre partagé plutôt que
+    dans sa propre blockchain.
     """
     console.print("[bold cyan]Ajout d'un diplôme à la blockchain[/bold cyan]")
 
@@ -66,35 +164,35 @@ def add_diploma_with_rich():
         "[green]Entrez la date d'obtention (format : YYYY-MM-DD)[/green]"
     )
 
-    console.print("[yellow]Ajout des métadonnées à la blockchain...[/yellow]")
-    metadata_block_data = json.dumps(metadata).encode()
-    metadata_block = Block(
-        index=len(blockchain.chain),
-        data=metadata_block_data.hex(),
-        previous_hash=blockchain.chain[-1].hash,
-        private_key=sig_private_key,
-        public_key=sig_public_key
-    )
-    blockchain.add_block(metadata_block)
+    keys = get_keys()
 
-    # Étape 2 : Ajout des fragments du fichier PDF
-    console.print("[yellow]Ajout du fichier à la blockchain...[/yellow]")
+    # Une nouvelle chaîne (ou un nouveau segment du registre) par diplôme :
+    # aucun bloc d'un diplôme précédent n'est repris
+    console.print(
+        "[yellow]Ajout des métadonnées et du fichier à la "
+        "blockchain...[/yellow]"
+    )
     with Progress() as progress:
         task = progress.add_task("[cyan]Ajout des fragments...", total=100)
-
-        add_file_to_blockchain(
-            file_path,
-            blockchain,
-            kem_public_key,
-            sig_private_key,
-            sig_public_key
-        )
+        if ledger:
+            diploma_id, filename, segment = append_diploma(
+                file_path, metadata, keys.kem_public_key,
+                keys.sig_private_key, keys.sig_public_key,
+                kem_key_id=keys.kem_key_id
+            )
+        else:
+            diploma_id, filename = ingest_diploma(
+                file_path, metadata, keys.kem_public_key,
+                keys.sig_private_key, keys.sig_public_key,
+                kem_key_id=keys.kem_key_id
+            )
         progress.update(task, completed=100)
 
-    # Étape 3 : Sauvegarde de la blockchain
-    diploma_count = len(os.listdir('db_blockchains')) + 1
-    filename = f"db_blockchains/diploma_{diploma_count}.json"
-    blockchain.save_to_file(filename)
+    with open_index() as index:
+        if ledger:
+            index.add_segment(diploma_id, filename, *segment)
+        else:
+            index.add_chain(filename, diploma_id)
     console.print(
         f"[bold green]Diplôme ajouté avec succès à la blockchain et "
         f"sauvegardé dans {filename} ![/bold green]"
@@ -111,29 +209,30 @@ def extract_diploma_with_rich():
         "[bold cyan]Extraction d'un diplôme de la blockchain[/bold cyan]"
     )
 
-    # Vérifie si le dossier "blockchains" existe
-    if not os.path.exists("db_blockchains") or \
-            not os.listdir("db_blockchains"):
+    # Liste les diplômes disponibles (fichiers ou segments du registre)
+    blockchains = []
+    if os.path.exists("db_blockchains"):
+        with open_index() as index:
+            blockchains = index.chains()
+    if not blockchains:
         console.print(
             "[bold red]Aucune blockchain de diplôme n'est disponible pour "
             "extraction.[/bold red]"
         )
         return
 
-    # Liste les fichiers de blockchain disponibles
-    blockchains = os.listdir("db_blockchains")
     console.print(
         "\n[bold yellow]Diplômes disponibles pour extraction :[/bold yellow]"
     )
-    for idx, filename in enumerate(blockchains, start=1):
-        console.print(f"[green]{idx}. {filename}[/green]")
+    for idx, entry in enumerate(blockchains, start=1):
+        console.print(f"[green]{idx}. {diploma_label(entry)}[/green]")
 
     # Demande à l'utilisateur de choisir un fichier blockchain
     choice = Prompt.ask(
         "[green]Entrez le numéro du diplôme à extraire[/green]",
         choices=[str(i) for i in range(1, len(blockchains) + 1)],
     )
-    selected_file = blockchains[int(choice) - 1]
+    selected = blockchains[int(choice) - 1]
 
     # Demande le chemin de sortie pour le fichier reconstruit
     output_path = Prompt.ask(
@@ -143,21 +242,26 @@ def extract_diploma_with_rich():
     )
 
     try:
-        # Charge la blockchain sélectionnée
-        blockchain = Blockchain.load_from_file(
-            f"db_blockchains/{selected_file}"
-        )
+        # Ouvre la blockchain sélectionnée sans la charger : les blocs sont
+        # lus un à un (seul son segment pour un diplôme du registre)
+        blockchain = open_diploma(selected)
 
         # Extraction avec barre de progression
-        with Progress() as progress:
-            task = progress.add_task(
-                "[cyan]Reconstruction du fichier...",
-                total=len(blockchain.chain) - 1
-            )
-            extract_file_from_blockchain(
-                blockchain, output_path, kem_private_key, sig_public_key
-            )
-            progress.update(task, completed=100)
+        try:
+            with Progress() as progress:
+                task = progress.add_task(
+                    "[cyan]Reconstruction du fichier...",
+                    total=len(blockchain.chain) - 1
+                )
+                keys = get_keys()
+                extract_file_from_blockchain(
+                    blockchain, output_path, keys.kem_private_key,
+                    keys.sig_public_key, keys.kem_key_id,
+                    fragment_store=get_fragment_store()
+                )
+                progress.update(task, completed=100)
+        finally:
+            blockchain.close()
 
         # Affiche un message de succès
         console.print(
@@ -171,12 +275,20 @@ def extract_diploma_with_rich():
         )
 
 
+BLOCK_LABELS = {
+    TYPE_GENESIS: "Genèse",
+    TYPE_METADATA: "Métadonnées",
+    TYPE_FRAGMENT_HEADER: "En-tête",
+    TYPE_FRAGMENT: "Fragment",
+}
+
+
 def show_all_blockchains():
     """
     Affiche toutes les blockchains (une par diplôme).
     """
-    if not os.path.exists("db_blockchains") or \
-            len(os.listdir("db_blockchains")) == 0:
+    paths = list_blockchain_files()
+    if not paths:
         console.print("[bold red]Aucune blockchain disponible ![/bold red]")
         return
 
@@ -184,10 +296,16 @@ def show_all_blockchains():
         "[bold cyan]Contenu de toutes les blockchains disponibles[/bold cyan]"
     )
 
-    for filename in os.listdir("db_blockchains"):
-        file_path = os.path.join("db_blockchains", filename)
-        with open(file_path, "r") as file:
-            chain_data = json.load(file)
+    for file_path in paths:
+        filename = os.path.basename(file_path)
+        if Ledger.is_ledger(file_path):
+            chain = Ledger(file_path).open_chain()
+            close = chain.close
+        else:
+            # Journal projeté en mémoire, ou liste de blocs (fichier JSON) :
+            # `Blockchain.close` traite les deux cas
+            blockchain = Blockchain.load_from_file(file_path, lazy=True)
+            chain, close = blockchain.chain, blockchain.close
 
         table = Table(title=f"Blockchain de {filename}")
         table.add_column("Index", justify="center", style="cyan", no_wrap=True)
@@ -196,44 +314,67 @@ def show_all_blockchains():
         table.add_column("Data", style="green")
         table.add_column("Type", style="yellow")
 
-        for block in chain_data:
-            block_type = "Genèse" if block["index"] == 0 else (
-                "Métadonnées" if block["data"].startswith("{") else "Fragment"
-            )
-            table.add_row(
-                str(block["index"]),
-                block["hash"][:8] + "...",
-                block["previous_hash"][:8] + "...",
-                block["data"][:40] + "..." if len(block["data"]) > 40
-                else block["data"],
-                block_type
-            )
+        try:
+            for block in chain:
+                # Aperçu des données sans convertir tout le bloc en
+                # hexadécimal
+                data = bytes(block.payload[:21]).hex() if block.is_hex \
+                    else block.data
+                table.add_row(
+                    str(block.index),
+                    block.hash[:8] + "...",
+                    block.previous_hash[:8] + "...",
+                    data[:40] + "..." if len(data) > 40 else data,
+                    BLOCK_LABELS[block_type_of(block)]
+                )
+        finally:
+            close()
 
         console.print(table)
 
 
+DATE_FIELD = "Date d'obtention"
+
+
+def print_diplomas(entries):
+    for entry in entries:
+        metadata = entry["metadata"]
+        console.print(
+            f"[yellow]{diploma_label(entry)} :[/yellow]\n"
+            f"  [green]Nom :[/green] {metadata['Nom']}\n"
+            f"  [green]Diplôme :[/green] {metadata['Diplôme']}\n"
+            f"  [green]Date d'obtention :[/green] "
+            f"{metadata.get(DATE_FIELD, '')}\n"
+        )
+
+
 def list_diplomas():
     """
     Liste tous les diplômes présents (une blockchain = un diplôme).
     """
     console.print("[bold cyan]Liste des diplômes[/bold cyan]")
-    if not os.path.exists("db_blockchains") or \
-            len(os.listdir("db_blockchains")) == 0:
+    # Les métadonnées viennent de l'index : aucune blockchain n'est lue
+    with open_index() as index:
+        entries = index.search()
+    if not entries:
         console.print("[bold red]Aucun diplôme trouvé ![/bold red]")
         return
+    print_diplomas(entries)
 
-    for filename in os.listdir("db_blockchains"):
-        filepath = os.path.join("db_blockchains", filename)
-        diploma_blockchain = Blockchain.load_from_file(filepath)
-        # Le bloc 1 contient les métadonnées
-        metadata_block = diploma_blockchain.chain[1]
-        metadata = json.loads(bytes.fromhex(metadata_block.data).decode())
 
-        console.print(
-            f"[yellow]{filename} :[/yellow]\n"
-            f"  [green]Nom :[/green] {metadata['Nom']}\n"
-            f"  [green]Diplôme :[/green] {metadata['Diplôme']}\n"
-        )
+def search_diplomas():
+    """
+    Recherche un diplôme par nom d'étudiant, titre ou date d'obtention.
+    """
+    query = Prompt.ask(
+        "[green]Entrez un nom, un titre de diplôme ou une date[/green]"
+    )
+    with open_index() as index:
+        entries = index.search(query=query)
+    if not entries:
+        console.print("[bold red]Aucun diplôme trouvé ![/bold red]")
+        return
+    print_diplomas(entries)
 
 
 def verify_all_blockchains():
@@ -241,23 +382,308 @@ def verify_all_blockchains():
     Vérifie l'intégrité de toutes les blockchains.
     """
     console.print("[bold cyan]Vérification des blockchains[/bold cyan]")
-    if not os.path.exists("db_blockchains") or \
-            len(os.listdir("db_blockchains")) == 0:
+    if not list_blockchain_files():
         console.print("[bold red]Aucune blockchain à vérifier ![/bold red]")
         return
+    audit_archive_command(verbose=True)
+
+
+# Nombre de points de contrôle écrits dans l'index par transaction
+CHECKPOINT_BATCH = 1000
 
-    for filename in os.listdir("db_blockchains"):
-        filepath = os.path.join("db_blockchains", filename)
-        diploma_blockchain = Blockchain.load_from_file(filepath)
-        console.print(f"[bold yellow]Vérification de {filename}[/bold yellow]")
 
-        if not diploma_blockchain.is_chain_valid():
-            console.print(f"[bold red]{filename} est invalide ![/bold red]")
+def audit_archive_command(directory="db_blockchains", workers=None,
+                          report_path=None, memory_limit=None,
+                          verbose=False):
+    """
+    Audite toutes les blockchains du dossier, réparties sur `workers`
+    processus (un par cœur par défaut), et retourne le résumé de l'audit.
+
+    Les résultats sont écrits au fil de l'eau dans un rapport JSONL
+    (`report_path`, par défaut "audit.jsonl" dans le dossier) : une ligne
+    par chaîne (validité, premier bloc invalide, durée), puis une ligne de
+    résumé. Les signatures déjà vérifiées lors d'un audit précédent sont
+    sautées, et chaque chaîne n'est revérifiée qu'à partir de son point de
+    contrôle ; ceux des chaînes valides sont mis à jour dans l'index.
+    `memory_limit` (en octets) borne la mémoire des processus d'audit.
+    Les signatures sont vérifiées avec la clé de la keystore.
+    """
+    workers = workers or os.cpu_count() or 1
+    report_path = report_path or os.path.join(directory, "audit.jsonl")
+    valid, invalid, checkpoints = 0, [], []
+    start = time.monotonic()
+    with open_index(directory) as index, open(report_path, "w") as report, \
+            Progress(
+                TextColumn("[cyan]{task.description}"),
+                BarColumn(),
+                MofNCompleteColumn(),
+                TextColumn("{task.fields[rate]:.1f} chaînes/s"),
+                TimeRemainingColumn(),
+                console=console,
+            ) as progress:
+        # Chaînes listées par l'index : un diplôme dont le fichier a
+        # disparu est signalé en erreur
+        entries = index.chains()
+        task = progress.add_task("Audit", total=len(entries), rate=0.0)
+        for completed, result in enumerate(audit_archive(
+            entries, workers, index.checkpoints(),
+            os.path.join(directory, VERIFICATION_CACHE), memory_limit,
+            get_keys().sig_public_key
+        ), start=1):
+            report.write(json.dumps(result) + "\n")
+            report.flush()
+            filename = diploma_label(result)
+            if result["valid"]:
+                valid += 1
+                if result["checkpoint"] is not None:
+                    checkpoints.append((result["id"], result["checkpoint"]))
+                if len(checkpoints) >= CHECKPOINT_BATCH:
+                    index.set_checkpoints(checkpoints)
+                    checkpoints = []
+                if verbose:
+                    progress.console.print(
+                        f"[bold green]{filename} est valide ![/bold green]"
+                    )
+            else:
+                invalid.append(result)
+                reason = result.get("error") or \
+                    f"premier bloc en échec : {result['first_bad_index']}"
+                progress.console.print(
+                    f"[bold red]{filename} est invalide ! "
+                    f"({reason})[/bold red]"
+                )
+            progress.update(
+                task, advance=1,
+                rate=completed / max(time.monotonic() - start, 1e-9)
+            )
+        if checkpoints:
+            index.set_checkpoints(checkpoints)
+        summary = {
+            "chains": len(entries),
+            "valid": valid,
+            "invalid": len(invalid),
+            "invalid_ids": [result["id"] for result in invalid],
+            "workers": workers,
+            "seconds": time.monotonic() - start,
+        }
+        report.write(json.dumps({"summary": summary}) + "\n")
+
+    console.print(
+        f"[bold {'red' if invalid else 'green'}]{valid} chaînes valides, "
+        f"{len(invalid)} invalides en {summary['seconds']:.1f} s "
+        f"(rapport : {report_path}).[/bold {'red' if invalid else 'green'}]"
+    )
+    return summary
+
+
+MANIFEST_FIELDS = ["pdf", "Nom", "Diplôme", "Date d'obtention"]
+# Journal des entrées importées, commun aux manifestes d'un dossier
+BATCH_JOURNAL = "batch.journal"
+
+
+def load_manifest(manifest_path):
+    """
+    Lit un manifeste d'import (CSV avec en-tête, ou JSONL) dont chaque
+    entrée donne le chemin du PDF ("pdf") et les métadonnées du diplôme.
+    """
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        if manifest_path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
         else:
-            console.print(f"[bold green]{filename} est valide ![/bold green]")
+            entries = list(csv.DictReader(f))
+    for line, entry in enumerate(entries, start=1):
+        missing = [field for field in MANIFEST_FIELDS if field not in entry]
+        if missing:
+            raise ValueError(
+                f"Entrée {line} du manifeste incomplète : {missing}"
+            )
+    return entries
+
+
+def entry_key(entry):
+    """
+    Empreinte du contenu d'une entrée du manifeste : identifiant du diplôme
+    importé et clé du journal d'import.
+    """
+    content = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _batch_ingest(entry, diploma_id, directory, keystore_directory,
+                  dedup=False, profile=False, ledger=False, chunking=False):
+    # Clés chargées une fois par processus par l'initialiseur du pool
+    keys = load_keys(keystore_directory)
+    if profile:
+        # Mesures propres à ce diplôme, renvoyées au processus principal
+        metrics.enable()
+        metrics.reset()
+    metadata = {field: entry[field] for field in MANIFEST_FIELDS[1:]}
+    fragment_store = open_fragment_store(
+        os.path.join(directory, FRAGMENTS_DIRECTORY), keys.kem_public_key,
+        keys.kem_private_key, keys.kem_key_id
+    ) if dedup else None
+    segment = None
+    if ledger:
+        diploma_id, path, segment = append_diploma(
+            entry["pdf"], metadata, keys.kem_public_key,
+            keys.sig_private_key, keys.sig_public_key,
+            directory=directory, diploma_id=diploma_id,
+            kem_key_id=keys.kem_key_id, fragment_store=fragment_store,
+            chunking=chunking
+        )
+    else:
+        diploma_id, path = ingest_diploma(
+            entry["pdf"], metadata, keys.kem_public_key,
+            keys.sig_private_key, keys.sig_public_key,
+            directory=directory, diploma_id=diploma_id,
+            kem_key_id=keys.kem_key_id, fragment_store=fragment_store,
+            chunking=chunking
+        )
+    return (diploma_id, path, segment,
+            metrics.snapshot() if profile else None)
+
+
+def batch_import(manifest_path, workers=1, directory="db_blockchains",
+                 dedup=False, ledger=False, chunking=False):
+    """
+    Importe sans interaction tous les diplômes d'un manifeste, répartis sur
+    un pool de processus.
+
+    Chaque diplôme importé est noté dans le journal du dossier : relancer
+    la commande après un arrêt, ou après correction de quelques entrées, ne
+    traite que les entrées absentes du journal. L'identifiant d'un diplôme
+    est dérivé du contenu de son entrée, si bien qu'une entrée interrompue
+    est réécrite sous le même nom plutôt que dupliquée.
+
+    Avec `dedup=True`, les fragments communs à plusieurs diplômes ne sont
+    stockés qu'une fois, dans le magasin de fragments du dossier.
+    `chunking=True` découpe les PDF selon leur contenu plutôt qu'en
+    fragments de taille fixe : plus lent, mais un contenu commun décalé est
+    aussi dédupliqué.
+
+    Avec `ledger=True`, les diplômes sont ajoutés au registre partagé : les
+    processus y écrivent chacun leur tour.
+    """
+    entries = load_manifest(manifest_path)
+    os.makedirs(directory, exist_ok=True)
+    journal_path = os.path.join(directory, BATCH_JOURNAL)
+
+    done = set()
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as journal:
+            for record in journal:
+                if record.strip():
+                    done.add(json.loads(record)["key"])
+
+    tasks = []
+    for line, entry in enumerate(entries, start=1):
+        key = entry_key(entry)
+        if key not in done:
+            # Une entrée répétée n'est importée qu'une fois
+            done.add(key)
+            tasks.append((line, entry, key))
+    console.print(
+        f"[bold cyan]Import de {len(tasks)} diplômes "
+        f"({len(entries) - len(tasks)} déjà importés)[/bold cyan]"
+    )
+
+    get_keys()  # Clés chargées (ou créées) avant le démarrage du pool
+    if dedup:
+        # Magasin créé avant le pool : une seule session KEM
+        get_fragment_store(directory, create=True)
+    errors = []
+    # Registre gardé ouvert pour indexer les segments : seule la fin de son
+    # index d'offsets est relue après chaque diplôme
+    ledgers = {}
+    start = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(KEYSTORE_DIRECTORY,),
+    ) as executor, open(journal_path, "a") as journal, \
+            open_index(directory) as index, Progress(
+        TextColumn("[cyan]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TextColumn("{task.fields[rate]:.1f} diplômes/s"),
+        TimeRemainingColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Import", total=len(tasks), rate=0.0)
+        futures = {
+            executor.submit(
+                _batch_ingest, entry, key, directory, KEYSTORE_DIRECTORY,
+                dedup, metrics.is_enabled(), ledger, chunking
+            ): (line, key)
+            for line, entry, key in tasks
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            line, key = futures[future]
+            try:
+                diploma_id, path, segment, measures = future.result()
+            except Exception as e:
+                errors.append(f"Entrée {line} du manifeste : {e}")
+            else:
+                if measures:
+                    metrics.merge(measures)
+                if segment is not None:
+                    index.add_segment(
+                        diploma_id, path, *segment,
+                        chain=ledger_chain(path, segment[1], ledgers)
+                    )
+                else:
+                    index.add_chain(path, diploma_id)
+                journal.write(json.dumps(
+                    {"key": key, "line": line, "id": diploma_id,
+                     "path": path, "segment": segment}
+                ) + "\n")
+                journal.flush()
+            progress.update(
+                task, advance=1,
+                rate=completed / max(time.monotonic() - start, 1e-9)
+            )
+    close_ledgers(ledgers)
+
+    for error in errors:
+        console.print(f"[bold red]Erreur : {error}[/bold red]")
+    console.print(
+        f"[bold green]{len(tasks) - len(errors)} diplômes importés, "
+        f"{len(errors)} en erreur.[/bold green]"
+    )
+    return len(tasks) - len(errors), errors
 
 
-def main_menu():
+def print_profile(output=None):
+    """
+    Affiche la répartition du temps par étape de la dernière opération
+    (voir `blockchain.metrics`), l'écrit dans `output` (Prometheus ou
+    JSON) si demandé, puis remet les mesures à zéro.
+    """
+    stages = metrics.report()["stages"]
+    if output:
+        metrics.write_report(output)
+    metrics.reset()
+    if not stages:
+        return
+    table = Table(title="Profil de l'opération")
+    table.add_column("Étape", no_wrap=True)
+    for column in ["Appels", "Total (ms)", "Moyenne (ms)", "p99 (ms)",
+                   "Octets", "Mo/s"]:
+        table.add_column(column, justify="right")
+    for name, stage in stages.items():
+        table.add_row(
+            name,
+            str(stage["count"]),
+            f"{stage['seconds'] * 1000:.1f}",
+            f"{stage['mean'] * 1000:.3f}",
+            f"≤ {stage['p99'] * 1000:g}",
+            str(stage["bytes"]),
+            f"{stage['mb_s']:.1f}" if stage["mb_s"] else "",
+        )
+    console.print(table)
+
+
+def main_menu(profile=False, metrics_output=None, ledger=False):
     """
     Menu principal
     """
@@ -268,15 +694,16 @@ def main_menu():
                             "3. Afficher les blockchains\n"
                             "4. Vérifier les blockchains \n"
                             "5. Afficher la liste des diplomes\n"
-                            "6. Quitter", title="Blockchain de Diplômes"))
+                            "6. Rechercher un diplôme\n"
+                            "7. Quitter", title="Blockchain de Diplômes"))
         choice = Prompt.ask(
             "[green]Choisissez une option[/green]",
-            choices=["1", "2", "3", "4", "5", "6"],
-            default="6"
+            choices=["1", "2", "3", "4", "5", "6", "7"],
+            default="7"
         )
 
         if choice == "1":
-            add_diploma_with_rich()
+            add_diploma_with_rich(ledger)
         elif choice == "2":
             extract_diploma_with_rich()
         elif choice == "3":
@@ -286,10 +713,130 @@ def main_menu():
         elif choice == "5":
             list_diplomas()
         elif choice == "6":
+            search_diplomas()
+        elif choice == "7":
             console.print("[bold green]Au revoir ![/bold green]")
             break
+        if profile:
+            print_profile(metrics_output)
+
+
+def main(argv=None):
+    """
+    Point d'entrée : menu interactif, ou commande non interactive.
+    """
+    parser = argparse.ArgumentParser(description="Blockchain de diplômes")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Afficher le temps passé par étape après chaque opération"
+    )
+    parser.add_argument(
+        "--metrics", metavar="FICHIER",
+        help="Écrire les mesures de chaque opération (.prom pour "
+             "Prometheus, JSON sinon) ; implique --profile"
+    )
+    parser.add_argument(
+        "--ledger", action="store_true",
+        help="Ajouter les nouveaux diplômes au registre partagé "
+             "(db_blockchains/ledger.chain) plutôt que dans un fichier "
+             "chacun"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser(
+        "batch", help="Importer les diplômes d'un manifeste CSV ou JSONL"
+    )
+    batch.add_argument("manifest", help="Chemin du manifeste")
+    batch.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Nombre de processus d'import"
+    )
+    batch.add_argument(
+        "--dedup", action="store_true",
+        help="Dédupliquer les fragments communs à plusieurs diplômes"
+    )
+    batch.add_argument(
+        "--chunking", action="store_true",
+        help="Découper les PDF selon leur contenu (plus lent)"
+    )
+    subparsers.add_parser(
+        "reindex", help="Reconstruire l'index des diplômes depuis le disque"
+    )
+    subparsers.add_parser(
+        "migrate", help="Répartir les blockchains d'un dossier à plat dans "
+                        "des sous-dossiers"
+    )
+    audit = subparsers.add_parser(
+        "audit", help="Vérifier toutes les blockchains de l'archive"
+    )
+    audit.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Nombre de processus d'audit"
+    )
+    audit.add_argument(
+        "--report", help="Rapport JSONL (db_blockchains/audit.jsonl par "
+                         "défaut)"
+    )
+    audit.add_argument(
+        "--memory-limit", type=int, metavar="Mo",
+        help="Mémoire maximale de l'ensemble des processus d'audit"
+    )
+    serve = subparsers.add_parser(
+        "serve", help="Lancer le service HTTP de vérification des diplômes"
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument(
+        "--workers", type=int, default=8,
+        help="Nombre de threads traitant les requêtes"
+    )
+    args = parser.parse_args(argv)
+    profile = args.profile or bool(args.metrics)
+    if profile:
+        metrics.enable()
+
+    if args.command == "batch":
+        batch_import(
+            args.manifest, args.workers, dedup=args.dedup, ledger=args.ledger,
+            chunking=args.chunking
+        )
+    elif args.command == "reindex":
+        with DiplomaIndex("db_blockchains") as index:
+            index.rebuild(iter_chain_files("db_blockchains"))
+            console.print(
+                f"[bold green]{len(index)} diplômes indexés.[/bold green]"
+            )
+    elif args.command == "migrate":
+        with open_index() as index:
+            moved = migrate_to_shards("db_blockchains", index)
+        console.print(
+            f"[bold green]{moved} blockchains déplacées dans leur "
+            f"sous-dossier.[/bold green]"
+        )
+    elif args.command == "audit":
+        summary = audit_archive_command(
+            workers=args.workers, report_path=args.report,
+            memory_limit=args.memory_limit * 1024 * 1024
+            if args.memory_limit else None
+        )
+        if profile:
+            print_profile(args.metrics)
+        return 1 if summary["invalid"] else 0
+    elif args.command == "serve":
+        # Flask n'est importé que pour le service
+        from api_diplomas import serve as serve_api
+
+        serve_api(
+            args.host, args.port, args.workers,
+            keystore_directory=KEYSTORE_DIRECTORY
+        )
+        return
+    else:
+        main_menu(profile, args.metrics, args.ledger)
+        return
+    if profile:
+        print_profile(args.metrics)
 
 
 # Exécution du programme
 if __name__ == "__main__":
-    main_menu()
+    sys.exit(main())
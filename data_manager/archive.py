@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import uuid
+from blockchain.block import TYPE_METADATA, Block
+from blockchain.blockchain import Blockchain
+from blockchain.ledger import LEDGER_FILENAME, Ledger
+from data_manager.fragmentation import (
+    IngestOptions,
+    add_file_to_blockchain,
+)
+from data_manager.index import diploma_id_from_path
+
+DB_DIRECTORY = "db_blockchains"
+# Sous-dossiers de 256 entrées (2 chiffres hexadécimaux de l'empreinte de
+# l'identifiant) : chaque dossier garde quelques milliers de fichiers même
+# avec un million de diplômes
+SHARD_WIDTH = 2
+CHAIN_SUFFIXES = (".json", ".chain")
+
+
+def new_diploma_id():
+    """
+    Génère un identifiant de diplôme unique (sans dépendre du nombre de
+    fichiers déjà présents dans le dossier).
+    """
+    return uuid.uuid4().hex
+
+
+def shard(diploma_id):
+    """
+    Sous-dossier d'un diplôme : début de l'empreinte SHA-256 de son
+    identifiant, uniformément réparti quelle que soit la forme de celui-ci.
+    """
+    return hashlib.sha256(diploma_id.encode()).hexdigest()[:SHARD_WIDTH]
+
+
+def diploma_path(diploma_id, directory=DB_DIRECTORY):
+    """
+    Chemin du journal binaire d'un diplôme, dans son sous-dossier.
+    """
+    return os.path.join(
+        directory, shard(diploma_id), f"diploma_{diploma_id}.chain"
+    )
+
+
+def _is_shard(name):
+    return len(name) == SHARD_WIDTH and all(
+        c in "0123456789abcdef" for c in name
+    )
+
+
+def iter_chain_files(directory=DB_DIRECTORY, flat=True):
+    """
+    Parcourt les fichiers de blockchain du dossier : ceux des sous-dossiers
+    et, avec `flat=True`, ceux de l'ancienne organisation à plat. Seules la
+    reconstruction de l'index et la migration ont besoin de ce parcours ;
+    les commandes lisent la liste des diplômes dans l'index.
+    """
+    if not os.path.isdir(directory):
+        return
+    with os.scandir(directory) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir() and _is_shard(entry.name):
+            with os.scandir(entry.path) as files:
+                yield from sorted(
+                    file.path for file in files
+                    if file.name.endswith(CHAIN_SUFFIXES)
+                )
+        elif flat and entry.is_file() and \
+                entry.name.endswith(CHAIN_SUFFIXES):
+            yield entry.path
+
+
+def migrate_to_shards(directory=DB_DIRECTORY, index=None):
+    """
+    Déplace les blockchains de l'ancienne organisation à plat vers leurs
+    sous-dossiers, et met à jour leur chemin dans l'index `index` (les
+    points de contrôle d'audit sont conservés). Le journal `.idx` est
+    déplacé avant sa chaîne : relancer la migration après un arrêt reprend
+    là où elle s'était arrêtée. Retourne le nombre de fichiers déplacés.
+    """
+    moved = []
+    # Chemins normalisés : "db_blockchains/" désigne le même dossier
+    top = os.path.normpath(directory)
+    for path in list(iter_chain_files(directory)):
+        if os.path.normpath(os.path.dirname(path)) != top or \
+                Ledger.is_ledger(path):
+            continue
+        diploma_id = diploma_id_from_path(path)
+        target = os.path.join(
+            directory, shard(diploma_id), os.path.basename(path)
+        )
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(path + ".idx"):
+            os.replace(path + ".idx", target + ".idx")
+        os.replace(path, target)
+        moved.append((diploma_id, target))
+    if index is not None:
+        index.relocate(moved)
+    return len(moved)
+
+
+def add_metadata_block(blockchain, metadata, sig_private_key,
+                       sig_public_key):
+    """
+    Ajoute le bloc de métadonnées (Nom, Diplôme, Date d'obtention).
+    """
+    metadata_block_data = json.dumps(metadata).encode()
+    blockchain.add_block(Block(
+        index=len(blockchain.chain),
+        data=metadata_block_data.hex(),
+        previous_hash=blockchain.chain[-1].hash,
+        private_key=sig_private_key,
+        public_key=sig_public_key,
+        block_type=TYPE_METADATA
+    ))
+
+
+def _add_diploma_blocks(blockchain, file_path, metadata, kem_public_key,
+                        sig_private_key, sig_public_key, kem_key_id, merkle,
+                        fragment_store, chunking):
+    add_metadata_block(blockchain, metadata, sig_private_key, sig_public_key)
+    add_file_to_blockchain(
+        file_path, blockchain, kem_public_key, sig_private_key,
+        sig_public_key, IngestOptions(
+            session=True, kem_key_id=kem_key_id, merkle=merkle,
+            chunking=chunking, fragment_store=fragment_store
+        )
+    )
+
+
+def ingest_diploma(file_path, metadata, kem_public_key, sig_private_key,
+                   sig_public_key, directory=DB_DIRECTORY, diploma_id=None,
+                   kem_key_id=None, merkle=False, fragment_store=None,
+                   chunking=False):
+    """
+    Crée la blockchain d'un diplôme (métadonnées puis fragments du PDF) et
+    l'enregistre dans `directory`.
+
+    La chaîne est écrite dans un fichier temporaire puis renommée : un arrêt
+    brutal ne laisse jamais de diplôme partiel sous son nom définitif, et
+    recommencer avec le même `diploma_id` remplace le fichier.
+    Avec `merkle=True`, les fragments sont engagés par une racine de Merkle
+    signée une seule fois (voir `add_file_to_blockchain`). Avec un
+    `FragmentStore`, les fragments sont dédupliqués entre diplômes, et leurs
+    références engagées par un seul en-tête Merkle signé. `chunking=True`
+    découpe le PDF selon son contenu (plus lent, voir
+    `data_manager.chunking`) : un contenu commun décalé est aussi dédupliqué.
+    Retourne l'identifiant et le chemin du diplôme.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
+    diploma_id = diploma_id or new_diploma_id()
+    path = diploma_path(diploma_id, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    for stale in (tmp_path, tmp_path + ".idx"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    blockchain = Blockchain.open(tmp_path)
+    try:
+        _add_diploma_blocks(
+            blockchain, file_path, metadata, kem_public_key,
+            sig_private_key, sig_public_key, kem_key_id, merkle,
+            fragment_store, chunking
+        )
+    finally:
+        blockchain.close()
+
+    # L'index d'abord : le journal renommé en dernier valide l'ensemble
+    os.replace(tmp_path + ".idx", path + ".idx")
+    os.replace(tmp_path, path)
+    return diploma_id, path
+
+
+def ledger_path(directory=DB_DIRECTORY):
+    """
+    Chemin du registre partagé du dossier.
+    """
+    return os.path.join(directory, LEDGER_FILENAME)
+
+
+def append_diploma(file_path, metadata, kem_public_key, sig_private_key,
+                   sig_public_key, directory=DB_DIRECTORY, diploma_id=None,
+                   kem_key_id=None, merkle=False, fragment_store=None,
+                   chunking=False):
+    """
+    Ajoute un diplôme (métadonnées puis fragments du PDF) à la fin du
+    registre partagé du dossier, au lieu de créer sa propre blockchain :
+    seuls ses blocs sont écrits, reliés au dernier bloc du registre (voir
+    `ingest_diploma` pour les paramètres).
+    Retourne l'identifiant du diplôme, le chemin du registre et le segment
+    (premier et dernier indices) de ses blocs.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
+    diploma_id = diploma_id or new_diploma_id()
+    ledger = Ledger(ledger_path(directory))
+    with ledger.append() as blockchain:
+        start = len(blockchain.chain)
+        _add_diploma_blocks(
+            blockchain, file_path, metadata, kem_public_key,
+            sig_private_key, sig_public_key, kem_key_id, merkle,
+            fragment_store, chunking
+        )
+        end = len(blockchain.chain) - 1
+        ledger.add_segment(diploma_id, start, end)
+    return diploma_id, ledger.path, (start, end)
+
+
+def ledger_chain(path, end, ledgers):
+    """
+    Chaîne du registre `path`, contenant au moins le bloc `end`, gardée
+    ouverte dans `ledgers` (dictionnaire chemin → chaîne) : l'index
+    d'offsets n'est lu qu'une fois, puis seulement complété des blocs
+    ajoutés depuis.
+    """
+    ledger = Ledger(path)
+    chain = ledgers.get(path)
+    if chain is None:
+        chain = ledgers[path] = ledger.open_chain()
+    elif len(chain) <= end:
+        # Registre ouvert avant l'ajout du segment
+        ledger.refresh(chain)
+    return chain
+
+
+def close_ledgers(ledgers):
+    """
+    Libère les chaînes de registre gardées ouvertes dans `ledgers`.
+    """
+    for chain in ledgers.values():
+        chain.close()
+    ledgers.clear()
+
+
+def open_diploma(entry, ledgers=None, lazy=True):
+    """
+    Ouvre la blockchain d'un diplôme de l'index : son propre fichier, ou
+    son segment du registre partagé. `ledgers` garde les registres ouverts
+    d'un appel à l'autre (voir `ledger_chain`) ; sans lui, la chaîne du
+    registre est libérée par `close` comme celle d'un fichier. `lazy`
+    s'applique aux fichiers d'un seul diplôme.
+    """
+    start, end = entry.get("segment_start"), entry.get("segment_end")
+    if start is None:
+        return Blockchain.load_from_file(entry["path"], lazy=lazy)
+    ledger = Ledger(entry["path"])
+    if ledgers is None:
+        return ledger.open_segment(start, end)
+    return ledger.open_segment(
+        start, end, ledger_chain(ledger.path, end, ledgers)
+    )
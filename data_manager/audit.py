@@ -0,0 +1,143 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from time import perf_counter
+from blockchain.verification import VerificationCache
+from data_manager.archive import close_ledgers, open_diploma
+
+# État des processus du pool d'audit, fixé une fois par processus
+_worker_state = {}
+
+
+def _init_audit_worker(cache_path, memory_limit, public_key):
+    if memory_limit:
+        try:
+            import resource
+        except ImportError:
+            pass  # Plateforme sans limite de ressources (Windows)
+        else:
+            # Mémoire allouée (hors projection des journaux) : un diplôme
+            # trop gros échoue seul au lieu d'épuiser la machine
+            resource.setrlimit(
+                resource.RLIMIT_DATA, (memory_limit, memory_limit)
+            )
+    _worker_state["cache"] = VerificationCache(path=cache_path) \
+        if cache_path else None
+    _worker_state["ledgers"] = {}
+    _worker_state["public_key"] = public_key
+
+
+def audit_chain(entry, checkpoint=None, cache=None, ledgers=None,
+                public_key=None):
+    """
+    Vérifie la blockchain d'un diplôme de l'index (voir
+    `DiplomaIndex.chains`) et retourne son résultat d'audit : validité,
+    premier bloc invalide, nombre de blocs, point de contrôle et durée.
+    Une chaîne illisible est signalée invalide avec l'erreur rencontrée.
+
+    Le journal est projeté en mémoire : un seul bloc est décodé à la fois,
+    quelle que soit la taille du diplôme. Un diplôme du registre partagé
+    n'est vérifié que sur son segment ; `ledgers` garde le registre ouvert
+    d'un diplôme à l'autre (voir `open_diploma`). Avec `public_key` (clé
+    de signature de l'archive), un bloc signé avec une autre clé est
+    invalide.
+    """
+    start = perf_counter()
+    result = {"id": entry["id"], "path": entry["path"]}
+    if entry.get("segment_start") is not None:
+        result["segment"] = [entry["segment_start"], entry["segment_end"]]
+    try:
+        blockchain = open_diploma(entry, ledgers)
+        try:
+            report = blockchain.verify(
+                cache=cache, checkpoint=checkpoint, public_key=public_key
+            )
+            # Un segment est précédé du bloc qui le relie au registre
+            result["blocks"] = len(blockchain.chain) - ("segment" in result)
+        finally:
+            blockchain.close()
+        result.update(
+            valid=report.valid,
+            first_bad_index=report.failed_indexes[0]
+            if report.failed_indexes else None,
+            checkpoint=report.checkpoint,
+        )
+    except Exception as e:
+        result.update(
+            valid=False, first_bad_index=None,
+            error=f"{type(e).__name__}: {e}"
+        )
+    result["seconds"] = perf_counter() - start
+    return result
+
+
+def _audit_task(task):
+    entry, checkpoint = task
+    return audit_chain(
+        entry, checkpoint, _worker_state["cache"], _worker_state["ledgers"],
+        _worker_state["public_key"]
+    )
+
+
+def audit_archive(entries, workers=1, checkpoints=None, cache_path=None,
+                  memory_limit=None, public_key=None):
+    """
+    Vérifie les blockchains des diplômes `entries` (voir
+    `DiplomaIndex.chains`) et produit leurs résultats (voir `audit_chain`)
+    au fur et à mesure qu'ils se terminent.
+
+    Avec `workers > 1`, les fichiers sont répartis sur un pool de
+    processus ; au plus `2 * workers` chaînes sont en cours à la fois.
+    `memory_limit` (en octets) borne la mémoire allouée par l'ensemble des
+    processus du pool. `checkpoints` associe les identifiants de diplôme
+    aux points de contrôle du dernier audit (voir
+    `DiplomaIndex.checkpoints`) : seules les signatures des blocs ajoutés
+    depuis sont vérifiées. `cache_path` est la base SQLite du
+    `VerificationCache` partagé. `public_key` est la clé de signature de
+    l'archive (voir `audit_chain`).
+    """
+    checkpoints = checkpoints or {}
+    tasks = ((entry, checkpoints.get(entry["id"])) for entry in entries)
+    if workers <= 1:
+        cache = VerificationCache(path=cache_path) if cache_path else None
+        ledgers = {}
+        try:
+            for entry, checkpoint in tasks:
+                yield audit_chain(
+                    entry, checkpoint, cache, ledgers, public_key
+                )
+        finally:
+            close_ledgers(ledgers)
+            if cache is not None:
+                cache.close()
+        return
+
+    def result(future, entry):
+        try:
+            return future.result()
+        except Exception as e:
+            # Processus du pool arrêté (mémoire épuisée, signal...)
+            return {
+                "id": entry["id"], "path": entry["path"],
+                "valid": False, "first_bad_index": None,
+                "error": f"{type(e).__name__}: {e}", "seconds": None,
+            }
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_audit_worker,
+        initargs=(cache_path, memory_limit // workers
+                  if memory_limit else None, public_key),
+    ) as executor:
+        pending = {}
+        for task in tasks:
+            pending[executor.submit(_audit_task, task)] = task[0]
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield result(future, pending.pop(future))
+        for future in as_completed(list(pending)):
+            yield result(future, pending.pop(future))
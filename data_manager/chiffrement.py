@@ -1,6 +1,9 @@
 from pqc.kem import mceliece6960119 as kemalg
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
 import base64
+from blockchain.metrics import stage
 
 
 def generate_kem_keys():
@@ -10,11 +13,76 @@ def generate_kem_keys():
     return kemalg.keypair()
 
 
-def encrypt_fragment(fragment, public_key):
+class KemSession:
+    """
+    Session de chiffrement couvrant un fichier entier : une seule
+    encapsulation McEliece, dont le secret partagé sert à dériver une clé
+    AES et un nonce propres à chaque fragment.
+    """
+
+    SALT = b"diploma-fragment-session"
+
+    def __init__(self, shared_secret, kem_ct):
+        self.shared_secret = shared_secret
+        self.kem_ct = kem_ct
+
+    @classmethod
+    def open(cls, public_key):
+        """
+        Ouvre une nouvelle session (une seule encapsulation).
+        """
+        assert isinstance(public_key, bytes), \
+            "La clé publique doit être en bytes"
+        with stage("kem.encap"):
+            shared_secret, kem_ct = kemalg.encap(public_key)
+        return cls(shared_secret, kem_ct)
+
+    @classmethod
+    def from_header(cls, header, private_key):
+        """
+        Reconstruit une session à partir de son bloc d'en-tête
+        (une seule décapsulation).
+        """
+        kem_ct = base64.b64decode(header["kem_session"])
+        with stage("kem.decap"):
+            shared_secret = kemalg.decap(kem_ct, private_key)
+        return cls(shared_secret, kem_ct)
+
+    def to_header(self):
+        """
+        Données à stocker une fois dans le bloc d'en-tête du fichier.
+        """
+        return {"kem_session": base64.b64encode(self.kem_ct).decode()}
+
+    def derive(self, index):
+        """
+        Dérive la clé AES et le nonce du fragment `index` (HKDF-SHA256).
+        """
+        with stage("kdf.derive"):
+            material = HKDF(
+                self.shared_secret, 32, self.SALT, SHA256,
+                context=str(index).encode()
+            )
+        return material[:16], material[16:]
+
+
+def is_session_header(data):
+    """
+    Indique si un dictionnaire désérialisé est un en-tête de session.
+    """
+    return isinstance(data, dict) and "kem_session" in data
+
+
+def seal_fragment(fragment, public_key):
+    """
+    Chiffre un fragment avec sa propre encapsulation McEliece et retourne
+    les champs en octets bruts (ciphertext, nonce, tag, KEM ciphertext).
+    """
     # Étape 1 : Key encapsulation
     assert isinstance(fragment, bytes), "Le fragment doit être en bytes"
     assert isinstance(public_key, bytes), "La clé publique doit être en bytes"
-    shared_secret, kem_ct = kemalg.encap(public_key)
+    with stage("kem.encap"):
+        shared_secret, kem_ct = kemalg.encap(public_key)
 
     # Étape 2 : Utilisation du shared_secret comme clé AES
     # (prend les 16 premiers octets)
@@ -23,35 +91,93 @@ def encrypt_fragment(fragment, public_key):
     nonce = cipher.nonce
 
     # Étape 3 : Chiffrement du fragment
-    ciphertext, tag = cipher.encrypt_and_digest(fragment)
+    with stage("aes.encrypt", len(fragment)):
+        ciphertext, tag = cipher.encrypt_and_digest(fragment)
+    return {
+        "ciphertext": ciphertext,
+        "nonce": nonce,
+        "tag": tag,
+        "kem_ct": kem_ct,
+    }
+
 
+def encrypt_fragment(fragment, public_key):
+    """
+    Chiffre un fragment (voir `seal_fragment`), champs encodés en base64.
+    """
     # Retourne le ciphertext, le nonce, le tag et le KEM ciphertext
+    return {
+        name: base64.b64encode(value).decode()
+        for name, value in seal_fragment(fragment, public_key).items()
+    }
+
+
+def seal_fragment_with_session(fragment, session, index):
+    """
+    Chiffre un fragment avec la clé dérivée d'une session de fichier et
+    retourne le ciphertext et le tag en octets bruts.
+    """
+    assert isinstance(fragment, bytes), "Le fragment doit être en bytes"
+    aes_key, nonce = session.derive(index)
+    cipher = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+    with stage("aes.encrypt", len(fragment)):
+        return cipher.encrypt_and_digest(fragment)
+
+
+def encrypt_fragment_with_session(fragment, session, index):
+    """
+    Chiffre un fragment avec la clé dérivée d'une session de fichier.
+    Ni nonce ni KEM ciphertext ne sont stockés : seul l'indice du fragment
+    est conservé pour refaire la dérivation.
+    """
+    ciphertext, tag = seal_fragment_with_session(fragment, session, index)
     return {
         "ciphertext": base64.b64encode(ciphertext).decode(),
-        "nonce": base64.b64encode(nonce).decode(),
         "tag": base64.b64encode(tag).decode(),
-        "kem_ct": base64.b64encode(kem_ct).decode(),
+        "fragment": index,
     }
 
 
-def decrypt_fragment(encrypted_data, private_key):
+def _raw(value):
+    # Champ en octets bruts (enveloppe binaire) ou en base64 (JSON)
+    return value if isinstance(value, bytes) else base64.b64decode(value)
+
+
+def decrypt_fragment(encrypted_data, private_key, session=None):
+    """
+    Déchiffre un fragment. Les fragments au format historique portent leur
+    propre `kem_ct` ; les autres sont déchiffrés avec la `session` du
+    fichier. Les champs sont en base64 (JSON) ou en octets bruts
+    (enveloppe binaire, voir `data_manager.envelope`).
+    """
     try:
         # Étape 1 : Récupération des données chiffrées
-        ciphertext = base64.b64decode(encrypted_data["ciphertext"])
-        nonce = base64.b64decode(encrypted_data["nonce"])
-        tag = base64.b64decode(encrypted_data["tag"])
-        kem_ct = base64.b64decode(encrypted_data["kem_ct"])
+        ciphertext = _raw(encrypted_data["ciphertext"])
+        tag = _raw(encrypted_data["tag"])
+
+        if "kem_ct" in encrypted_data:
+            nonce = _raw(encrypted_data["nonce"])
+            kem_ct = _raw(encrypted_data["kem_ct"])
+
+            # Étape 2 : Key de-encapsulation
+            with stage("kem.decap"):
+                shared_secret = kemalg.decap(kem_ct, private_key)
 
-        # Étape 2 : Key de-encapsulation
-        shared_secret = kemalg.decap(kem_ct, private_key)
+            # Étape 3 : Utilisation du shared_secret comme clé AES
+            # (prend les 16 premiers octets)
+            aes_key = shared_secret[:16]
+        else:
+            if session is None:
+                raise ValueError(
+                    "Fragment de session sans en-tête de session."
+                )
+            aes_key, nonce = session.derive(encrypted_data["fragment"])
 
-        # Étape 3 : Utilisation du shared_secret comme clé AES
-        # (prend les 16 premiers octets)
-        aes_key = shared_secret[:16]
         cipher = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
 
         # Étape 4 : Déchiffrement
-        return cipher.decrypt_and_verify(ciphertext, tag)
+        with stage("aes.decrypt", len(ciphertext)):
+            return cipher.decrypt_and_verify(ciphertext, tag)
     except KeyError as e:
         raise ValueError(f"Clé manquante dans les données chiffrées : {e}")
     except Exception as e:
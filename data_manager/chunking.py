@@ -0,0 +1,114 @@
+import hashlib
+
+# Tailles par défaut des fragments du découpage par contenu
+MIN_SIZE = 2 * 1024
+AVG_SIZE = 8 * 1024
+MAX_SIZE = 64 * 1024
+
+# Taille des lectures dans le fichier
+READ_SIZE = 1024 * 1024
+
+# Table "gear" : une valeur pseudo-aléatoire de 64 bits par octet, fixe pour
+# qu'un même contenu soit toujours découpé de la même façon.
+GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big")
+    for i in range(256)
+]
+MASK_64 = (1 << 64) - 1
+
+
+def _masks(avg_size):
+    """
+    Masques du découpage normalisé : plus de bits à zéro exigés avant la
+    taille moyenne, moins après, pour resserrer les tailles autour de la
+    moyenne. Les bits de poids fort dépendent des 64 derniers octets lus.
+    """
+    bits = max(avg_size.bit_length() - 1, 2)
+    strict = ((1 << (bits + 1)) - 1) << (64 - bits - 1)
+    loose = ((1 << (bits - 1)) - 1) << (64 - bits + 1)
+    return strict, loose
+
+
+def _cut_point(data, start, end, min_size, avg_size, max_size, masks):
+    """
+    Position de la prochaine coupure dans `data[start:end]` (hash roulant
+    "gear"). Les `min_size` premiers octets ne sont pas hachés.
+    """
+    if end - start <= min_size:
+        return end
+    end = min(end, start + max_size)
+    normal = min(end, start + avg_size)
+    strict, loose = masks
+    gear = GEAR
+    h = 0
+    i = start + min_size
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        i += 1
+        if not h & strict:
+            return i
+    while i < end:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        i += 1
+        if not h & loose:
+            return i
+    return end
+
+
+def _check_sizes(min_size, avg_size, max_size):
+    if not 0 < min_size <= avg_size <= max_size:
+        raise ValueError(
+            "Tailles de fragment invalides : il faut "
+            "0 < min_size <= avg_size <= max_size."
+        )
+
+
+def chunk_data(data, min_size=MIN_SIZE, avg_size=AVG_SIZE,
+               max_size=MAX_SIZE):
+    """
+    Découpe des données en mémoire selon leur contenu.
+    """
+    _check_sizes(min_size, avg_size, max_size)
+    masks = _masks(avg_size)
+    chunks = []
+    start = 0
+    while start < len(data):
+        cut = _cut_point(
+            data, start, len(data), min_size, avg_size, max_size, masks
+        )
+        chunks.append(data[start:cut])
+        start = cut
+    return chunks
+
+
+def iter_chunks(file_path, min_size=MIN_SIZE, avg_size=AVG_SIZE,
+                max_size=MAX_SIZE):
+    """
+    Découpe un fichier selon son contenu (hash roulant), sans le charger
+    entièrement.
+
+    Les coupures dépendent des octets qui les précèdent, et non de leur
+    position : un contenu commun à plusieurs fichiers (modèle, logo,
+    polices) donne les mêmes fragments, même décalé.
+    """
+    _check_sizes(min_size, avg_size, max_size)
+    masks = _masks(avg_size)
+    buffer = b""
+    start = 0
+    with open(file_path, "rb") as f:
+        eof = False
+        while True:
+            if not eof and len(buffer) - start < max_size:
+                block = f.read(READ_SIZE)
+                eof = not block
+                buffer = buffer[start:] + block
+                start = 0
+                continue
+            if start >= len(buffer):
+                return
+            cut = _cut_point(
+                buffer, start, len(buffer), min_size, avg_size, max_size,
+                masks
+            )
+            yield buffer[start:cut]
+            start = cut
@@ -1,23 +1,99 @@
+import bz2
+import lzma
 import zlib
+from blockchain.metrics import stage
 
+# Registre des codecs : nom -> (étiquette de 3 octets, compression,
+# décompression). L'étiquette préfixe les données compressées, ce qui permet
+# de retrouver le codec utilisé à la décompression.
+CODECS = {}
+TAGS = {}
 
-def compress_data(data):
+# Taille des échantillons utilisés par le mode "auto"
+SAMPLE_SIZE = 16 * 1024
+# Gain minimal (ratio compressé / original) en dessous duquel on compresse
+AUTO_THRESHOLD = 0.9
+
+
+def register_codec(name, tag, compress, decompress):
     """
-    Compresse les données en utilisant zlib.
+    Enregistre un codec de compression sous un nom et une étiquette.
     """
-    compressed = zlib.compress(data)
-    if len(compressed) >= len(data):
-        return b"NOC" + data
-    return b"CMP" + compressed
+    assert len(tag) == 3, "L'étiquette d'un codec fait 3 octets"
+    CODECS[name] = (tag, compress, decompress)
+    TAGS[tag] = name
 
 
-def decompress_data(data):
+register_codec("none", b"NOC", lambda data: data, lambda data: data)
+register_codec("zlib", b"CMP", zlib.compress, zlib.decompress)
+for level in range(1, 10):
+    register_codec(
+        f"zlib-{level}", f"ZL{level}".encode(),
+        lambda data, level=level: zlib.compress(data, level),
+        zlib.decompress
+    )
+register_codec("lzma", b"LZM", lzma.compress, lzma.decompress)
+register_codec("bz2", b"BZ2", bz2.compress, bz2.decompress)
+
+
+def choose_codec(data):
     """
-    Décompresse les données en utilisant zlib.
+    Mode "auto" : compresse quelques échantillons des données (début,
+    milieu, fin) et ne retient zlib que si le gain est suffisant. Les
+    données déjà compressées ou chiffrées ne paient ainsi pas la compression
+    complète.
     """
-    if data[:3] == b"CMP":  # Données compressées
-        return zlib.decompress(data[3:])
-    elif data[:3] == b"NOC":  # Données non compressées
-        return data[3:]
+    if len(data) <= 3 * SAMPLE_SIZE:
+        sample = data
     else:
+        middle = len(data) // 2
+        sample = b"".join((
+            data[:SAMPLE_SIZE],
+            data[middle:middle + SAMPLE_SIZE],
+            data[-SAMPLE_SIZE:],
+        ))
+    if not sample:
+        return "none"
+    with stage("compress.sample", len(sample)):
+        compressed = zlib.compress(sample, 1)
+    if len(compressed) >= len(sample) * AUTO_THRESHOLD:
+        return "none"
+    return "zlib"
+
+
+def compress_data(data, codec="zlib"):
+    """
+    Compresse les données avec le codec demandé (zlib par défaut, "auto"
+    pour le choisir d'après un échantillon). Si la compression ne fait pas
+    gagner de place, les données sont stockées telles quelles.
+    """
+    if codec == "auto":
+        codec = choose_codec(data)
+    if codec not in CODECS:
+        raise ValueError(f"Codec de compression inconnu : {codec}")
+    tag, compress, _ = CODECS[codec]
+    with stage(f"compress.{codec}", len(data)):
+        compressed = compress(data)
+    if codec == "none" or len(compressed) >= len(data):
+        return b"NOC" + data
+    return tag + compressed
+
+
+def codec_of(data):
+    """
+    Retourne le nom du codec utilisé pour des données compressées.
+    """
+    try:
+        return TAGS[bytes(data[:3])]
+    except KeyError:
         raise ValueError("Format de données non reconnu.")
+
+
+def decompress_data(data):
+    """
+    Décompresse les données avec le codec indiqué par leur étiquette.
+    """
+    codec = codec_of(data)
+    _, _, decompress = CODECS[codec]
+    with stage(f"decompress.{codec}", len(data)):
+        return decompress(data[3:])
@@ -0,0 +1,77 @@
+import struct
+
+# Enveloppe binaire d'un fragment chiffré : remplace le JSON de champs
+# base64, soit environ 1,4 fois moins de place, sans (dé)sérialisation JSON.
+MAGIC = b"DFE"
+VERSION = 1
+FIELD_HEAD = struct.Struct("<BI")
+INDEX = struct.Struct("<q")
+
+# Champs de l'enveloppe : numéro -> (nom, type)
+FIELDS = {
+    1: ("ciphertext", bytes),
+    2: ("tag", bytes),
+    3: ("nonce", bytes),
+    4: ("kem_ct", bytes),
+    5: ("fragment", int),
+    6: ("codec", str),
+    7: ("key_id", str),
+}
+NUMBERS = {name: number for number, (name, _) in FIELDS.items()}
+
+
+def is_envelope(raw):
+    """
+    Indique si les données d'un bloc sont une enveloppe binaire.
+    """
+    return raw[:len(MAGIC)] == MAGIC
+
+
+def pack_fragment(fields):
+    """
+    Sérialise les champs d'un fragment chiffré (octets bruts, indice,
+    codec, identifiant de clé) en enveloppe binaire versionnée.
+    """
+    parts = [MAGIC, bytes([VERSION])]
+    for name, value in fields.items():
+        kind = FIELDS[NUMBERS[name]][1]
+        if kind is int:
+            raw = INDEX.pack(value)
+        elif kind is str:
+            raw = value.encode()
+        else:
+            raw = bytes(value)
+        parts.append(FIELD_HEAD.pack(NUMBERS[name], len(raw)))
+        parts.append(raw)
+    return b"".join(parts)
+
+
+def unpack_fragment(raw):
+    """
+    Relit une enveloppe binaire en dictionnaire de champs.
+    """
+    if not is_envelope(raw):
+        raise ValueError("Enveloppe de fragment non reconnue.")
+    if raw[len(MAGIC)] != VERSION:
+        raise ValueError(
+            f"Version d'enveloppe non prise en charge : {raw[len(MAGIC)]}"
+        )
+    view = memoryview(raw)
+    offset = len(MAGIC) + 1
+    fields = {}
+    while offset < len(view):
+        number, length = FIELD_HEAD.unpack_from(view, offset)
+        offset += FIELD_HEAD.size
+        value = view[offset:offset + length]
+        offset += length
+        if number not in FIELDS:
+            # Champ d'une version ultérieure : ignoré
+            continue
+        name, kind = FIELDS[number]
+        if kind is int:
+            fields[name], = INDEX.unpack(value)
+        elif kind is str:
+            fields[name] = bytes(value).decode()
+        else:
+            fields[name] = bytes(value)
+    return fields
@@ -0,0 +1,152 @@
+import hashlib
+import hmac
+import json
+import os
+from Crypto.Cipher import AES
+from data_manager.chiffrement import KemSession
+from data_manager.compression import compress_data, decompress_data
+
+FRAGMENTS_DIRECTORY = "fragments"
+HEADER_FILENAME = "store.json"
+TAG_SIZE = 16
+
+# Magasins déjà ouverts dans ce processus, par dossier
+_opened = {}
+
+
+class FragmentStore:
+    """
+    Magasin de fragments adressés par leur contenu, partagé par tous les
+    diplômes d'un dossier : un fragment présent dans plusieurs fichiers
+    (modèle, logo, polices) n'est compressé, chiffré et stocké qu'une fois,
+    et les blocs le désignent par son empreinte.
+
+    Le magasin a sa propre session KEM (une encapsulation, stockée dans
+    `store.json`). L'empreinte d'un fragment est un HMAC de son contenu
+    avec une clé dérivée de la session, pour ne pas révéler dans les blocs
+    le hash des données en clair ; la clé AES de chaque fragment est
+    dérivée de son empreinte.
+    """
+
+    def __init__(self, directory, session, key_id=None):
+        self.directory = directory
+        self.session = session
+        self.key_id = key_id
+        self._mac_key = b"".join(session.derive("fragment-digest"))
+        # Fragments écrits / déjà présents depuis l'ouverture
+        self.stored = 0
+        self.reused = 0
+
+    @classmethod
+    def open(cls, directory, kem_public_key, kem_private_key, key_id=None):
+        """
+        Ouvre le magasin de `directory`, en le créant (nouvelle session KEM)
+        s'il n'existe pas.
+        """
+        os.makedirs(directory, exist_ok=True)
+        header_path = os.path.join(directory, HEADER_FILENAME)
+        if not os.path.exists(header_path):
+            session = KemSession.open(kem_public_key)
+            header = session.to_header()
+            if key_id:
+                header["key_id"] = key_id
+            tmp_path = f"{header_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(header, f)
+            try:
+                # Sans écrasement : un autre processus a pu créer le magasin
+                os.link(tmp_path, header_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+
+        with open(header_path, "r") as f:
+            header = json.load(f)
+        recorded = header.get("key_id")
+        if key_id and recorded and recorded != key_id:
+            raise ValueError(
+                f"Magasin de fragments chiffré avec la clé {recorded}, "
+                f"clé disponible : {key_id}."
+            )
+        return cls(
+            directory, KemSession.from_header(header, kem_private_key),
+            recorded
+        )
+
+    def digest(self, data):
+        return hmac.new(self._mac_key, data, hashlib.sha256).hexdigest()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def __contains__(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def put(self, data, codec="auto"):
+        """
+        Ajoute un fragment s'il n'est pas déjà présent et retourne son
+        empreinte.
+        """
+        digest = self.digest(data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            self.reused += 1
+            return digest
+        aes_key, nonce = self.session.derive(f"fragment:{digest}")
+        cipher = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+        ciphertext, tag = cipher.encrypt_and_digest(
+            compress_data(data, codec)
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(tag + ciphertext)
+        # Même contenu pour une même empreinte : le renommage est sûr même
+        # si un autre processus écrit le même fragment
+        os.replace(tmp_path, path)
+        self.stored += 1
+        return digest
+
+    def get(self, digest):
+        """
+        Relit, déchiffre et vérifie un fragment.
+        """
+        try:
+            with open(self._path(digest), "rb") as f:
+                sealed = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Fragment {digest} absent du magasin.")
+        aes_key, nonce = self.session.derive(f"fragment:{digest}")
+        cipher = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+        data = decompress_data(cipher.decrypt_and_verify(
+            sealed[TAG_SIZE:], sealed[:TAG_SIZE]
+        ))
+        if not hmac.compare_digest(self.digest(data), digest):
+            raise ValueError(f"Fragment {digest} corrompu.")
+        return data
+
+    def size(self):
+        """
+        Taille totale des fragments stockés, en octets.
+        """
+        total = 0
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename != HEADER_FILENAME:
+                    total += os.path.getsize(os.path.join(root, filename))
+        return total
+
+
+def open_fragment_store(directory, kem_public_key, kem_private_key,
+                        key_id=None):
+    """
+    Ouvre un magasin de fragments une seule fois par processus (une seule
+    décapsulation McEliece).
+    """
+    directory = os.path.abspath(directory)
+    if directory not in _opened:
+        _opened[directory] = FragmentStore.open(
+            directory, kem_public_key, kem_private_key, key_id
+        )
+    return _opened[directory]
@@ -1,53 +1,509 @@
 import os
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from rich.console import Console
-from blockchain.block import Block
-from data_manager.compression import compress_data, decompress_data
-from data_manager.chiffrement import encrypt_fragment, decrypt_fragment
+from blockchain.block import (
+    TYPE_FRAGMENT,
+    TYPE_FRAGMENT_HEADER,
+    TYPE_GENESIS,
+    TYPE_METADATA,
+    Block,
+)
+from blockchain.dilithium import sign
+from blockchain.merkle import hash_leaves, merkle_root
+from blockchain.metrics import stage
+from blockchain.verification import VerificationCache
+from data_manager.chunking import iter_chunks
+from data_manager.compression import (
+    codec_of,
+    compress_data,
+    decompress_data,
+)
+from data_manager.chiffrement import (
+    KemSession,
+    seal_fragment,
+    seal_fragment_with_session,
+    decrypt_fragment,
+    is_session_header,
+)
+from data_manager.envelope import is_envelope, pack_fragment, unpack_fragment
 
 console = Console()
 
+# Champs d'un bloc de métadonnées, qui l'identifient dans une chaîne
+# antérieure aux types de bloc
+METADATA_FIELDS = ("Nom", "Diplôme", "Date d'obtention")
 
-def fragment_file(file_path, fragment_size_percentage=10):
+# Bornes par défaut de la taille des fragments
+MIN_FRAGMENT_SIZE = 4 * 1024
+MAX_FRAGMENT_SIZE = 4 * 1024 * 1024
+
+# Coût estimé d'un bloc (signature puis vérification Dilithium, en secondes)
+# et d'un octet de fragment (compression, chiffrement, sérialisation), voir
+# benchmarks/fragment_sizes.py
+BLOCK_COST = 1.5e-3
+BYTE_COST = 9e-9
+# Octets ajoutés à chaque bloc (signature et clé publique Dilithium)
+BLOCK_OVERHEAD = 7.5 * 1024
+
+
+class FragmentPolicy:
+    """
+    Politique de taille des fragments d'un fichier :
+
+    - `size` : taille cible absolue, en octets ;
+    - `percentage` : taille proportionnelle à celle du fichier (ancien
+      comportement, 10 %) ;
+    - à défaut, mode adaptatif : la taille est choisie pour que le coût
+      fixe d'un bloc (signature, vérification, octets de signature et de
+      clé publique) ne dépasse pas `target_overhead` du coût de son
+      fragment.
+
+    La taille obtenue est toujours bornée par `min_size` et `max_size`
+    (mémoire d'un fragment) et vaut au moins 1 octet : un petit fichier
+    donne toujours au moins un fragment.
+    """
+
+    def __init__(self, size=None, percentage=None,
+                 min_size=MIN_FRAGMENT_SIZE, max_size=MAX_FRAGMENT_SIZE,
+                 target_overhead=0.05, block_cost=BLOCK_COST,
+                 byte_cost=BYTE_COST):
+        if min_size > max_size:
+            raise ValueError("min_size doit être inférieure à max_size.")
+        self.size = size
+        self.percentage = percentage
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_overhead = target_overhead
+        self.block_cost = block_cost
+        self.byte_cost = byte_cost
+
+    def adaptive_size(self):
+        """
+        Taille à partir de laquelle le coût fixe d'un bloc, en temps comme
+        en octets stockés, ne dépasse pas `target_overhead`.
+        """
+        return int(max(
+            self.block_cost / (self.byte_cost * self.target_overhead),
+            BLOCK_OVERHEAD / self.target_overhead,
+        ))
+
+    def fragment_size(self, file_size):
+        """
+        Taille des fragments d'un fichier de `file_size` octets.
+        """
+        if self.size is not None:
+            size = self.size
+        elif self.percentage is not None:
+            size = file_size * self.percentage // 100
+        else:
+            size = self.adaptive_size()
+        return max(min(max(size, self.min_size), self.max_size), 1)
+
+
+DEFAULT_POLICY = FragmentPolicy()
+
+
+def _policy(fragment_size_percentage=None, fragment_size=None, policy=None):
+    if policy is not None:
+        return policy
+    if fragment_size is not None:
+        # Taille explicite : ni bornée par le minimum, ni par le maximum
+        # par défaut
+        return FragmentPolicy(
+            size=fragment_size, min_size=1,
+            max_size=max(fragment_size, MAX_FRAGMENT_SIZE)
+        )
+    if fragment_size_percentage is not None:
+        return FragmentPolicy(percentage=fragment_size_percentage)
+    return DEFAULT_POLICY
+
+
+def iter_fragments(file_path, fragment_size_percentage=None,
+                   fragment_size=None, policy=None):
     """
-    Divise un fichier en fragments de taille proportionnelle.
+    Lit un fichier fragment par fragment, sans le charger entièrement.
+
+    La taille des fragments est donnée par une `FragmentPolicy` (mode
+    adaptatif par défaut) ; `fragment_size` fixe une taille absolue en
+    octets et `fragment_size_percentage` une taille proportionnelle à celle
+    du fichier.
     """
-    file_size = os.path.getsize(file_path)
-    fragment_size = file_size * fragment_size_percentage // 100
+    policy = _policy(fragment_size_percentage, fragment_size, policy)
+    fragment_size = policy.fragment_size(os.path.getsize(file_path))
 
-    fragments = []
     with open(file_path, "rb") as f:
-        while chunk := f.read(fragment_size):
-            fragments.append(chunk)
+        while True:
+            with stage("file.read") as measure:
+                chunk = f.read(fragment_size)
+                measure.nbytes = len(chunk)
+            if not chunk:
+                break
+            yield chunk
 
-    return fragments
 
+def fragment_file(file_path, fragment_size_percentage=None,
+                  fragment_size=None, policy=None):
+    """
+    Divise un fichier en fragments (voir `iter_fragments`).
+    """
+    return list(iter_fragments(
+        file_path, fragment_size_percentage, fragment_size, policy
+    ))
 
-def add_file_to_blockchain(file_path, blockchain, kem_public_key,
-                           sig_private_key, sig_public_key):
+
+def prepare_fragment(fragment, index, kem_public_key, session=None,
+                     codec="auto", key_id=None, fragment_store=None):
+    """
+    Prépare les données d'un bloc fragment : compression, puis chiffrement,
+    puis sérialisation dans une enveloppe binaire (voir
+    `data_manager.envelope`). Le codec utilisé, et l'identifiant de la clé
+    de chiffrement hors mode session, sont enregistrés dans le bloc.
+
+    Avec un `FragmentStore`, le fragment est stocké (une seule fois) dans
+    le magasin et le bloc ne contient que son empreinte.
     """
-    Divise, compresse et ajoute les fragments d'un fichier à la blockchain
-    avec signature et chiffrement.
+    if fragment_store is not None:
+        digest = fragment_store.put(fragment, codec)
+        return json.dumps({"chunk": digest}).encode().hex()
+    compressed_fragment = compress_data(fragment, codec)
+    if session:
+        ciphertext, tag = seal_fragment_with_session(
+            compressed_fragment, session, index
+        )
+        fields = {"ciphertext": ciphertext, "tag": tag, "fragment": index}
+    else:
+        fields = seal_fragment(compressed_fragment, kem_public_key)
+    fields["codec"] = codec_of(compressed_fragment)
+    if key_id and not session:
+        fields["key_id"] = key_id
+    with stage("envelope.pack", len(fields["ciphertext"])):
+        return pack_fragment(fields).hex()
+
+
+# État des processus du pool d'ajout parallèle, fixé une fois par processus
+# pour ne pas renvoyer les clés (la clé McEliece dépasse 1 Mo) à chaque tâche.
+_worker_state = {}
+
+
+def _init_ingest_worker(kem_public_key, session, codec, sig_private_key,
+                        key_id, fragment_store):
+    _worker_state.update(
+        kem_public_key=kem_public_key,
+        session=session,
+        codec=codec,
+        sig_private_key=sig_private_key,
+        key_id=key_id,
+        fragment_store=fragment_store,
+    )
+
+
+def _prepare_task(task):
+    index, fragment = task
+    return prepare_fragment(
+        fragment, index, _worker_state["kem_public_key"],
+        _worker_state["session"], _worker_state["codec"],
+        _worker_state["key_id"], _worker_state["fragment_store"]
+    )
+
+
+def _sign_task(block_hash):
+    return sign(block_hash.encode(), _worker_state["sig_private_key"])
+
+
+def _ordered_map(executor, fn, items, window):
+    """
+    Équivalent de `executor.map` qui ne soumet que `window` tâches à
+    l'avance, pour garder une mémoire bornée, et rend les résultats dans
+    l'ordre.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _signed_blocks(executor, blocks, window):
+    """
+    Signe en parallèle des blocs dont les hash sont déjà chaînés.
+    """
+    pending = deque()
+    for block in blocks:
+        pending.append((block, executor.submit(_sign_task, block.hash)))
+        if len(pending) >= window:
+            block, future = pending.popleft()
+            block.signature = future.result()
+            yield block
+    while pending:
+        block, future = pending.popleft()
+        block.signature = future.result()
+        yield block
+
+
+class IngestOptions:
     """
-    fragments = fragment_file(file_path)  # Divise le fichier en fragments
-    for i, fragment in enumerate(fragments):
-        encrypted_fragment = encrypt_fragment(fragment, kem_public_key)
-        # Convertit le dictionnaire chiffré en une chaîne JSON pour stockage
-        encrypted_fragment_serialized = json.dumps(encrypted_fragment)
-        encrypted_fragment_bytes = encrypted_fragment_serialized.encode()
-        compressed_fragment = compress_data(encrypted_fragment_bytes)
+    Options d'ajout d'un fichier à la blockchain (`add_file_to_blockchain`) :
 
+    - `policy` ou `fragment_size` : taille des fragments (voir
+      `FragmentPolicy`) ; `chunking` : découpage selon le contenu (`True`
+      ou triplet `(min, moyenne, max)`, voir `data_manager.chunking`) ;
+    - `codec` : compression des fragments (voir `data_manager.compression`) ;
+    - `session` : `True` (ou une `KemSession` ouverte) pour une seule
+      encapsulation McEliece par fichier ; `kem_key_id` : clé de
+      chiffrement enregistrée (voir `data_manager.keystore.key_id`) ;
+    - `merkle` : fragments engagés par un seul en-tête signé (voir
+      `blockchain.merkle`) plutôt que signés un par un ;
+    - `fragment_store` : fragments stockés une seule fois dans un
+      `FragmentStore`, toujours engagés par un en-tête Merkle ;
+    - `workers`, `parallel_signing` : pool de processus pour la compression,
+      le chiffrement et la signature ; `timestamp` : horodatage des blocs.
+    """
+
+    def __init__(self, session=False, fragment_size=None, policy=None,
+                 chunking=None, codec="auto", kem_key_id=None, merkle=False,
+                 fragment_store=None, workers=1, parallel_signing=False,
+                 timestamp=None):
+        self.session = session
+        self.fragment_size = fragment_size
+        self.policy = policy
+        self.chunking = chunking
+        self.codec = codec
+        self.kem_key_id = kem_key_id
+        self.merkle = merkle
+        self.fragment_store = fragment_store
+        self.workers = workers
+        self.parallel_signing = parallel_signing
+        self.timestamp = timestamp
+
+
+def add_file_to_blockchain(file_path, blockchain, kem_public_key,
+                           sig_private_key, sig_public_key, options=None):
+    """
+    Divise un fichier en fragments, les compresse, les chiffre et les ajoute
+    à la blockchain avec signature, selon `options` (voir `IngestOptions`).
+    """
+    options = options or IngestOptions()
+    session, merkle = options.session, options.merkle
+    codec, kem_key_id = options.codec, options.kem_key_id
+    fragment_store, workers = options.fragment_store, options.workers
+    timestamp = options.timestamp
+    if fragment_store is not None:
+        # Blocs de quelques dizaines d'octets : les signer un par un
+        # coûterait plus que le fragment économisé
+        session = None
+        merkle = True
+    if session is True:
+        session = KemSession.open(kem_public_key)
+    header = {}
+    if session:
+        header.update(session.to_header())
+        if kem_key_id:
+            header["key_id"] = kem_key_id
+    if header and not merkle:
         blockchain.add_block(Block(
             index=len(blockchain.chain),
-            data=compressed_fragment.hex(),
+            timestamp=timestamp,
+            data=json.dumps(header).encode().hex(),
             previous_hash=blockchain.chain[-1].hash,
             private_key=sig_private_key,
-            public_key=sig_public_key
+            public_key=sig_public_key,
+            block_type=TYPE_FRAGMENT_HEADER
+        ))
+
+    # Divise le fichier en fragments, lus au fil de l'eau : avec une
+    # blockchain ouverte par `Blockchain.open`, la mémoire utilisée ne
+    # dépend pas de la taille du fichier (sauf en mode Merkle, où la racine
+    # doit précéder les fragments)
+    if options.chunking:
+        chunking = options.chunking
+        sizes = chunking if isinstance(chunking, tuple) else ()
+        fragments = enumerate(iter_chunks(file_path, *sizes))
+    else:
+        fragments = enumerate(iter_fragments(
+            file_path, fragment_size=options.fragment_size,
+            policy=options.policy
         ))
 
+    if workers <= 1:
+        payloads = (
+            prepare_fragment(
+                fragment, i, kem_public_key, session, codec, kem_key_id,
+                fragment_store
+            )
+            for i, fragment in fragments
+        )
+        if merkle:
+            _add_committed_fragments(
+                blockchain, list(payloads), header, sig_private_key,
+                sig_public_key, timestamp
+            )
+            return
+        for payload in payloads:
+            blockchain.add_block(Block(
+                index=len(blockchain.chain),
+                timestamp=timestamp,
+                data=payload,
+                previous_hash=blockchain.chain[-1].hash,
+                private_key=sig_private_key,
+                public_key=sig_public_key,
+                block_type=TYPE_FRAGMENT
+            ))
+        return
+
+    # Fragments préparés dans le pool, blocs chaînés dans l'ordre : pour une
+    # même session et un même `timestamp`, la chaîne est celle du mode
+    # séquentiel
+    window = 2 * workers
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_ingest_worker,
+        initargs=(
+            kem_public_key, session or None, codec, sig_private_key,
+            kem_key_id, fragment_store
+        ),
+    ) as executor:
+        payloads = _ordered_map(executor, _prepare_task, fragments, window)
+
+        if merkle:
+            _add_committed_fragments(
+                blockchain, list(payloads), header, sig_private_key,
+                sig_public_key, timestamp, executor
+            )
+            return
+
+        if not options.parallel_signing:
+            for payload in payloads:
+                blockchain.add_block(Block(
+                    index=len(blockchain.chain),
+                    timestamp=timestamp,
+                    data=payload,
+                    previous_hash=blockchain.chain[-1].hash,
+                    private_key=sig_private_key,
+                    public_key=sig_public_key,
+                    block_type=TYPE_FRAGMENT
+                ))
+            return
+
+        def unsigned_blocks():
+            # Le chaînage ne dépend pas des signatures : les hash sont
+            # calculés dans l'ordre, les signatures en parallèle.
+            index = len(blockchain.chain)
+            previous_hash = blockchain.chain[-1].hash
+            for payload in payloads:
+                block = Block(
+                    index=index,
+                    timestamp=timestamp,
+                    data=payload,
+                    previous_hash=previous_hash,
+                    public_key=sig_public_key,
+                    block_type=TYPE_FRAGMENT
+                )
+                index += 1
+                previous_hash = block.hash
+                yield block
+
+        for block in _signed_blocks(executor, unsigned_blocks(), window):
+            blockchain.add_block(block)
+
+
+def _add_committed_fragments(blockchain, payloads, header, sig_private_key,
+                             sig_public_key, timestamp, executor=None):
+    """
+    Ajoute l'en-tête Merkle signé (racine, nombre de fragments, et en-tête
+    de session éventuel) puis les fragments, sans signature.
+    """
+    root = merkle_root(hash_leaves(payloads, executor=executor))
+    header = {
+        "merkle_root": root.hex(), "fragments": len(payloads), **header
+    }
+    blockchain.add_block(Block(
+        index=len(blockchain.chain),
+        timestamp=timestamp,
+        data=json.dumps(header).encode().hex(),
+        previous_hash=blockchain.chain[-1].hash,
+        private_key=sig_private_key,
+        public_key=sig_public_key,
+        block_type=TYPE_FRAGMENT_HEADER
+    ))
+    for payload in payloads:
+        blockchain.add_block(Block(
+            index=len(blockchain.chain),
+            timestamp=timestamp,
+            data=payload,
+            previous_hash=blockchain.chain[-1].hash,
+            block_type=TYPE_FRAGMENT
+        ), signed=False)
+
+
+def read_block(block):
+    """
+    Retourne le type d'un bloc (voir `blockchain.block.BLOCK_TYPES`), ses
+    données en octets et leur désérialisation JSON (None pour une enveloppe
+    binaire ou un fragment au format historique).
+
+    Le type enregistré d'un bloc typé suffit : seuls les en-têtes et les
+    fragments JSON sont désérialisés, sans essai infructueux. Pour un bloc
+    sans type (chaînes antérieures), le type est déduit du contenu.
+    """
+    block_type = block.block_type
+    if block_type == TYPE_GENESIS or \
+            (block_type is None and block.index == 0):
+        return TYPE_GENESIS, bytes(block.payload), None
+    payload = bytes(block.payload) \
+        if block.is_hex else bytes.fromhex(block.data)
+    if block_type == TYPE_METADATA or is_envelope(payload):
+        return block_type or TYPE_FRAGMENT, payload, None
+    try:
+        data = json.loads(payload.decode())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        if block_type is not None and block_type != TYPE_FRAGMENT:
+            raise
+        return TYPE_FRAGMENT, payload, None
+    if block_type is None:
+        block_type = _legacy_block_type(data)
+    return block_type, payload, data
+
+
+def _legacy_block_type(data):
+    if not isinstance(data, dict):
+        return TYPE_FRAGMENT
+    if all(key in data for key in METADATA_FIELDS):
+        return TYPE_METADATA
+    if "merkle_root" in data or is_session_header(data):
+        return TYPE_FRAGMENT_HEADER
+    return TYPE_FRAGMENT
+
+
+def block_type_of(block):
+    """
+    Type d'un bloc : son type enregistré, ou celui déduit de son contenu
+    pour un bloc sans type (chaînes antérieures).
+    """
+    if block.block_type is not None:
+        return block.block_type
+    if not block.is_hex:
+        # Texte brut : seul le bloc de genèse en contient
+        return TYPE_GENESIS if block.index == 0 else TYPE_FRAGMENT
+    return read_block(block)[0]
+
+
+def _check_key_id(data, kem_key_id):
+    recorded = data.get("key_id") if isinstance(data, dict) else None
+    if kem_key_id and recorded and recorded != kem_key_id:
+        raise ValueError(
+            f"Fichier chiffré avec la clé {recorded}, "
+            f"clé disponible : {kem_key_id}."
+        )
+
 
 def extract_file_from_blockchain(blockchain, file_path, kem_private_key,
-                                 sig_public_key):
+                                 sig_public_key, kem_key_id=None,
+                                 cache=None, fragment_store=None):
     """
     Extrait les fragments de la blockchain et reconstitue un fichier.
 
@@ -57,50 +513,138 @@ def extract_file_from_blockchain(blockchain, file_path, kem_private_key,
         kem_private_key (bytes): La clé privée pour déchiffrer les fragments.
         sig_public_key (bytes): La clé publique pour vérifier les
         signatures des blocs.
+        kem_key_id (str): Identifiant de `kem_private_key` ; s'il est
+        fourni, un fichier chiffré avec une autre clé est signalé
+        explicitement.
+        cache (VerificationCache): Cache des vérifications de signature ;
+        à défaut, un cache propre à l'extraction évite de vérifier deux
+        fois un même bloc.
+        fragment_store (FragmentStore): Magasin des fragments dédupliqués,
+        requis si les blocs ne contiennent que des empreintes.
+
+    Les blocs sont parcourus un par un et chaque fragment déchiffré est
+    écrit directement dans le fichier de sortie : avec une blockchain
+    chargée par `Blockchain.load_from_file(..., lazy=True)`, la chaîne
+    n'est jamais entièrement en mémoire.
     """
     with open(file_path, "wb") as f:
-        # Vérifie si la blockchain est valide
-        if not blockchain.is_chain_valid():
-            raise ValueError("La blockchain est invalide.")
-
-        for block in blockchain.chain[1:]:  # On saute le bloc de genèse
-            # Étape 1 : Vérification de la signature du bloc
-            if not block.verify_block(sig_public_key):
-                raise ValueError(
-                    f"Bloc {block.index} invalide (signature incorrecte)."
-                )
+        for fragment in iter_file_from_blockchain(
+            blockchain, kem_private_key, sig_public_key, kem_key_id,
+            cache, fragment_store
+        ):
+            with stage("file.write", len(fragment)):
+                f.write(fragment)
+
 
-            try:
-                # Étape 2 : Décompression et désérialisation
-                compressed_fragment = bytes.fromhex(block.data)
-                decrypted_fragment = None
-
-                try:
-                    # Vérifie si les données sont des métadonnées
-                    data = json.loads(compressed_fragment.decode())
-                    if all(
-                        key in data
-                        for key in ["Nom", "Diplôme", "Date d'obtention"]
-                    ):
-                        console.print(
-                            f"[yellow]Bloc {block.index} : "
-                            f"Métadonnées détectées, "
-                            f"ignorées pour la reconstruction "
-                            f"du fichier.[/yellow]"
-                        )
-                        continue
-                except (json.JSONDecodeError, UnicodeDecodeError):
-
-                    encrypted_data_bytes = decompress_data(compressed_fragment)
-                    encrypted_data = json.loads(encrypted_data_bytes.decode())
-                    decrypted_fragment = decrypt_fragment(
-                        encrypted_data, kem_private_key
+def iter_file_from_blockchain(blockchain, kem_private_key, sig_public_key,
+                              kem_key_id=None, cache=None,
+                              fragment_store=None, sessions=None,
+                              quiet=False):
+    """
+    Générateur des fragments déchiffrés du fichier, dans l'ordre (voir
+    `extract_file_from_blockchain` pour les paramètres) : permet de
+    transmettre le fichier au fil de l'eau sans l'écrire sur disque. La
+    chaîne est vérifiée avant le premier fragment.
+
+    `sessions` est un dictionnaire optionnel des sessions KEM déjà
+    décapsulées, indexées par leur en-tête : un service qui extrait
+    plusieurs fois le même fichier ne refait pas la décapsulation. Avec
+    `quiet=True`, rien n'est affiché (blocs de métadonnées ignorés).
+    """
+    if cache is None:
+        cache = VerificationCache()
+    # Vérifie si la blockchain est valide
+    if not blockchain.is_chain_valid(cache=cache, public_key=sig_public_key):
+        raise ValueError("La blockchain est invalide.")
+
+    # Session KEM du fichier en cours, fixée par son bloc d'en-tête
+    session = None
+    # Dernier bloc engagé par l'en-tête Merkle en cours : ces fragments
+    # sont couverts par la signature de l'en-tête, vérifiée avec la
+    # racine par `is_chain_valid`
+    committed_until = 0
+
+    # On saute le bloc de genèse
+    for block in islice(blockchain.chain, 1, None):
+        # Étape 1 : Vérification de la signature du bloc
+        committed = not block.signature and block.index <= committed_until
+        if not committed and not cache.verify_block(block, sig_public_key):
+            raise ValueError(
+                f"Bloc {block.index} invalide (signature incorrecte)."
+            )
+
+        try:
+            # Étape 2 : Nature du bloc, puis décompression et
+            # désérialisation selon cette nature
+            block_type, payload, data = read_block(block)
+            if block_type == TYPE_METADATA:
+                if not quiet:
+                    console.print(
+                        f"[yellow]Bloc {block.index} : "
+                        f"Métadonnées détectées, "
+                        f"ignorées pour la reconstruction "
+                        f"du fichier.[/yellow]"
                     )
+                continue
+            if block_type == TYPE_GENESIS:
+                continue
+            decrypted_fragment = None
 
-                if decrypted_fragment:
-                    f.write(decrypted_fragment)
+            if data is not None:
+                _check_key_id(data, kem_key_id)
+            if block_type == TYPE_FRAGMENT_HEADER:
+                if "merkle_root" in data:
+                    committed_until = block.index + data["fragments"]
+                if is_session_header(data):
+                    # Une seule décapsulation pour tout le fichier
+                    session = _open_session(data, kem_private_key, sessions)
+                continue
 
-            except Exception as e:
-                raise ValueError(
-                    f"Erreur lors du traitement du bloc {block.index} : {e}"
+            if data is None and is_envelope(payload):
+                # Enveloppe binaire : fragment compressé puis chiffré
+                with stage("envelope.unpack", len(payload)):
+                    data = unpack_fragment(payload)
+                _check_key_id(data, kem_key_id)
+                yield decompress_data(
+                    decrypt_fragment(data, kem_private_key, session)
                 )
+                continue
+
+            if data is None:
+                # Format historique : fragment chiffré puis compressé
+                encrypted_data_bytes = decompress_data(payload)
+                encrypted_data = json.loads(encrypted_data_bytes.decode())
+                decrypted_fragment = decrypt_fragment(
+                    encrypted_data, kem_private_key, session
+                )
+            elif "chunk" in data:
+                # Fragment dédupliqué, lu dans le magasin
+                if fragment_store is None:
+                    raise ValueError(
+                        "Fragment stocké dans un magasin de "
+                        "fragments non fourni."
+                    )
+                decrypted_fragment = fragment_store.get(data["chunk"])
+            elif "ciphertext" in data:
+                # Fragment compressé avant chiffrement
+                decrypted_fragment = decompress_data(
+                    decrypt_fragment(data, kem_private_key, session)
+                )
+
+            if decrypted_fragment:
+                yield decrypted_fragment
+
+        except Exception as e:
+            raise ValueError(
+                f"Erreur lors du traitement du bloc {block.index} : {e}"
+            )
+
+
+def _open_session(header, kem_private_key, sessions=None):
+    if sessions is None:
+        return KemSession.from_header(header, kem_private_key)
+    session = sessions.get(header["kem_session"])
+    if session is None:
+        session = KemSession.from_header(header, kem_private_key)
+        sessions[header["kem_session"]] = session
+    return session
@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+from time import time
+from blockchain.blockchain import Blockchain
+from blockchain.ledger import Ledger
+
+INDEX_FILENAME = "index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diplomas (
+    id TEXT PRIMARY KEY,
+    nom TEXT,
+    diplome TEXT,
+    date_obtention TEXT,
+    metadata TEXT NOT NULL,
+    path TEXT NOT NULL,
+    block_count INTEGER NOT NULL,
+    tip_hash TEXT NOT NULL,
+    last_verified REAL,
+    verified_index INTEGER,
+    verified_hash TEXT,
+    segment_start INTEGER,
+    segment_end INTEGER
+);
+CREATE INDEX IF NOT EXISTS diplomas_nom ON diplomas (nom);
+CREATE INDEX IF NOT EXISTS diplomas_diplome ON diplomas (diplome);
+CREATE INDEX IF NOT EXISTS diplomas_date ON diplomas (date_obtention);
+"""
+
+# Colonnes ajoutées après la création du schéma, pour les index existants
+MIGRATIONS = {
+    "verified_index": "ALTER TABLE diplomas ADD COLUMN verified_index "
+                      "INTEGER",
+    "verified_hash": "ALTER TABLE diplomas ADD COLUMN verified_hash TEXT",
+    "segment_start": "ALTER TABLE diplomas ADD COLUMN segment_start "
+                     "INTEGER",
+    "segment_end": "ALTER TABLE diplomas ADD COLUMN segment_end INTEGER",
+}
+
+
+def diploma_id_from_path(path):
+    """
+    Retrouve l'identifiant d'un diplôme à partir du nom de son fichier
+    (`diploma_<id>.chain` ou `diploma_<id>.json`).
+    """
+    name = os.path.basename(path)
+    stem = name.rsplit(".", 1)[0]
+    return stem[len("diploma_"):] if stem.startswith("diploma_") else stem
+
+
+def read_metadata(blockchain):
+    """
+    Lit les métadonnées du diplôme, stockées dans le bloc 1.
+    """
+    return json.loads(bytes(blockchain.chain[1].payload).decode())
+
+
+class DiplomaIndex:
+    """
+    Index SQLite persistant des diplômes d'un dossier : métadonnées, chemin
+    du fichier, nombre de blocs, hash du dernier bloc et date de dernière
+    vérification. Lister ou rechercher des diplômes ne lit plus les
+    blockchains.
+
+    L'index garde aussi le point de contrôle du dernier audit réussi de
+    chaque chaîne (indice et hash du dernier bloc vérifié).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, INDEX_FILENAME)
+        self.created = not os.path.exists(self.path)
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+        columns = {
+            row["name"]
+            for row in self._db.execute("PRAGMA table_info(diplomas)")
+        }
+        with self._db:
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    self._db.execute(statement)
+
+    def add(self, diploma_id, metadata, path, block_count, tip_hash,
+            segment=None):
+        """
+        Ajoute ou met à jour un diplôme dans l'index. `segment` est
+        l'intervalle (premier, dernier) de ses blocs quand le diplôme est
+        stocké dans un registre partagé.
+        """
+        start, end = segment if segment is not None else (None, None)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO diplomas (id, nom, diplome, "
+                "date_obtention, metadata, path, block_count, tip_hash, "
+                "segment_start, segment_end) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    diploma_id,
+                    metadata.get("Nom"),
+                    metadata.get("Diplôme"),
+                    metadata.get("Date d'obtention"),
+                    json.dumps(metadata),
+                    path,
+                    block_count,
+                    tip_hash,
+                    start,
+                    end,
+                ),
+            )
+
+    def add_segment(self, diploma_id, path, start, end, chain=None):
+        """
+        Indexe un diplôme du registre partagé `path`, dont les blocs forment
+        le segment [start, end]. `chain` est la chaîne du registre si elle
+        est déjà ouverte.
+        """
+        segment = Ledger(path).open_segment(start, end, chain)
+        try:
+            self.add(
+                diploma_id, read_metadata(segment), path, end - start + 1,
+                segment.chain[-1].hash, segment=(start, end)
+            )
+        finally:
+            segment.close()
+
+    def add_chain(self, path, diploma_id=None):
+        """
+        Indexe une blockchain de diplôme. Seuls le bloc de métadonnées et
+        le dernier bloc sont décodés. Pour un registre partagé, chacun de
+        ses segments est indexé.
+        """
+        if Ledger.is_ledger(path):
+            ledger = Ledger(path)
+            chain = ledger.open_chain()
+            try:
+                for segment_id, (start, end) in ledger.segments().items():
+                    self.add_segment(segment_id, path, start, end, chain)
+            finally:
+                chain.close()
+            return
+        blockchain = Blockchain.load_from_file(path, lazy=True)
+        try:
+            self.add(
+                diploma_id or diploma_id_from_path(path),
+                read_metadata(blockchain),
+                path,
+                len(blockchain.chain),
+                blockchain.chain[-1].hash,
+            )
+        finally:
+            blockchain.close()
+
+    def mark_verified(self, diploma_id, when=None):
+        """
+        Enregistre la date de la dernière vérification réussie.
+        """
+        with self._db:
+            self._db.execute(
+                "UPDATE diplomas SET last_verified = ? WHERE id = ?",
+                (when if when is not None else time(), diploma_id),
+            )
+
+    def get_checkpoint(self, diploma_id):
+        """
+        Retourne le point de contrôle (indice, hash) du dernier audit
+        réussi, ou None.
+        """
+        row = self._db.execute(
+            "SELECT verified_index, verified_hash FROM diplomas "
+            "WHERE id = ?", (diploma_id,)
+        ).fetchone()
+        if row is None or row["verified_index"] is None:
+            return None
+        return row["verified_index"], row["verified_hash"]
+
+    def checkpoints(self):
+        """
+        Retourne les points de contrôle de tous les diplômes audités, par
+        identifiant, en une seule requête.
+        """
+        return {
+            row["id"]: (row["verified_index"], row["verified_hash"])
+            for row in self._db.execute(
+                "SELECT id, verified_index, verified_hash FROM diplomas "
+                "WHERE verified_index IS NOT NULL"
+            )
+        }
+
+    def set_checkpoint(self, diploma_id, checkpoint, when=None):
+        """
+        Enregistre le point de contrôle d'un audit réussi.
+        """
+        self.set_checkpoints([(diploma_id, checkpoint)], when)
+
+    def set_checkpoints(self, checkpoints, when=None):
+        """
+        Enregistre les points de contrôle de plusieurs audits réussis, donnés
+        en couples (identifiant, (indice, hash)), en une transaction.
+        """
+        when = when if when is not None else time()
+        with self._db:
+            self._db.executemany(
+                "UPDATE diplomas SET verified_index = ?, verified_hash = ?, "
+                "last_verified = ? WHERE id = ?",
+                [
+                    (index, block_hash, when, diploma_id)
+                    for diploma_id, (index, block_hash) in checkpoints
+                ],
+            )
+
+    def relocate(self, moves):
+        """
+        Met à jour le chemin des diplômes déplacés, donnés en couples
+        (identifiant, nouveau chemin), sans perdre leurs points de
+        contrôle. Les diplômes absents de l'index y sont ajoutés.
+        """
+        moves = list(moves)
+        with self._db:
+            self._db.executemany(
+                "UPDATE diplomas SET path = ? WHERE id = ?",
+                [(path, diploma_id) for diploma_id, path in moves],
+            )
+        known = {row["id"] for row in self._db.execute(
+            "SELECT id FROM diplomas"
+        )}
+        for diploma_id, path in moves:
+            if diploma_id not in known:
+                self.add_chain(path, diploma_id)
+
+    def paths(self):
+        """
+        Retourne les chemins de toutes les blockchains indexées (un registre
+        partagé une seule fois), triés : l'index sert de manifeste, sans
+        parcourir le dossier.
+        """
+        return [
+            row["path"] for row in self._db.execute(
+                "SELECT DISTINCT path FROM diplomas ORDER BY path"
+            )
+        ]
+
+    def chains(self):
+        """
+        Retourne, pour chaque diplôme, son identifiant, son chemin et son
+        segment éventuel, triés par fichier puis par position dans le
+        registre.
+        """
+        return [
+            dict(row) for row in self._db.execute(
+                "SELECT id, path, segment_start, segment_end FROM diplomas "
+                "ORDER BY path, segment_start"
+            )
+        ]
+
+    def get(self, diploma_id):
+        row = self._db.execute(
+            "SELECT * FROM diplomas WHERE id = ?", (diploma_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def search(self, nom=None, diplome=None, date=None, query=None):
+        """
+        Recherche des diplômes par nom d'étudiant, titre du diplôme ou date
+        (sous-chaîne, sans tenir compte de la casse). `query` cherche dans
+        les trois champs à la fois. Sans critère, retourne tout l'index.
+        """
+        clauses, params = [], []
+        for column, value in (
+            ("nom", nom), ("diplome", diplome), ("date_obtention", date)
+        ):
+            if value:
+                clauses.append(f"{column} LIKE ?")
+                params.append(f"%{value}%")
+        if query:
+            clauses.append(
+                "(nom LIKE ? OR diplome LIKE ? OR date_obtention LIKE ?)"
+            )
+            params.extend([f"%{query}%"] * 3)
+        sql = "SELECT * FROM diplomas"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY nom, id"
+        return [self._to_dict(row) for row in self._db.execute(sql, params)]
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM diplomas").fetchone()[0]
+
+    def rebuild(self, paths):
+        """
+        Reconstruit l'index à partir des fichiers de blockchain.
+        """
+        with self._db:
+            self._db.execute("DELETE FROM diplomas")
+        for path in paths:
+            self.add_chain(path)
+
+    @staticmethod
+    def _to_dict(row):
+        entry = dict(row)
+        entry["metadata"] = json.loads(entry["metadata"])
+        return entry
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
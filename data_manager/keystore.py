@@ -0,0 +1,150 @@
+import hashlib
+import os
+from Crypto.Cipher import AES
+from Crypto.Protocol.KDF import scrypt
+from Crypto.Random import get_random_bytes
+from blockchain.dilithium import generate_keys
+from data_manager.chiffrement import generate_kem_keys
+
+KEYSTORE_DIRECTORY = "keystore"
+PASSPHRASE_ENV = "DIPLOMA_KEYSTORE_PASSPHRASE"
+
+MAGIC = b"DIPKEY"
+VERSION = 1
+MODE_CLEAR = 0
+MODE_SCRYPT_GCM = 1
+SCRYPT_N = 2 ** 15
+
+# Paires de clés de la keystore : nom -> fonction de génération
+KEYPAIRS = {
+    "sig": generate_keys,
+    "kem": generate_kem_keys,
+}
+
+# Clés déjà chargées dans ce processus, par dossier de keystore
+_loaded = {}
+
+
+def key_id(public_key):
+    """
+    Identifiant court d'une clé : empreinte SHA-256 de la clé publique.
+    """
+    return hashlib.sha256(public_key).hexdigest()[:16]
+
+
+def _seal(private_key, passphrase):
+    """
+    Sérialise une clé privée, chiffrée par la phrase de passe si elle est
+    fournie (scrypt puis AES-GCM).
+    """
+    if not passphrase:
+        return MAGIC + bytes([VERSION, MODE_CLEAR]) + private_key
+    salt = get_random_bytes(16)
+    key = scrypt(passphrase.encode(), salt, 32, N=SCRYPT_N, r=8, p=1)
+    cipher = AES.new(key, AES.MODE_GCM)
+    ciphertext, tag = cipher.encrypt_and_digest(private_key)
+    return b"".join((
+        MAGIC, bytes([VERSION, MODE_SCRYPT_GCM]),
+        salt, cipher.nonce, tag, ciphertext,
+    ))
+
+
+def _unseal(sealed, passphrase):
+    if sealed[:len(MAGIC)] != MAGIC or sealed[len(MAGIC)] != VERSION:
+        raise ValueError("Fichier de clé privée non reconnu.")
+    mode = sealed[len(MAGIC) + 1]
+    body = sealed[len(MAGIC) + 2:]
+    if mode == MODE_CLEAR:
+        return body
+    if not passphrase:
+        raise ValueError("Cette clé privée est protégée par une phrase de "
+                         "passe.")
+    salt, nonce, tag, ciphertext = body[:16], body[16:32], body[32:48], \
+        body[48:]
+    key = scrypt(passphrase.encode(), salt, 32, N=SCRYPT_N, r=8, p=1)
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    try:
+        return cipher.decrypt_and_verify(ciphertext, tag)
+    except ValueError:
+        raise ValueError("Phrase de passe incorrecte.")
+
+
+class KeySet:
+    """
+    Clés de signature (Dilithium) et de chiffrement (McEliece) de
+    l'établissement, avec leurs identifiants.
+    """
+
+    def __init__(self, sig_public_key, sig_private_key, kem_public_key,
+                 kem_private_key):
+        self.sig_public_key = sig_public_key
+        self.sig_private_key = sig_private_key
+        self.kem_public_key = kem_public_key
+        self.kem_private_key = kem_private_key
+        self.sig_key_id = key_id(sig_public_key)
+        self.kem_key_id = key_id(kem_public_key)
+
+
+class KeyStore:
+    """
+    Keystore sur disque : pour chaque paire, la clé publique (`<nom>.pub`)
+    et la clé privée (`<nom>.key`), éventuellement chiffrée par une phrase
+    de passe. Les paires manquantes sont générées une seule fois.
+    """
+
+    def __init__(self, directory=KEYSTORE_DIRECTORY, passphrase=None):
+        self.directory = directory
+        self.passphrase = passphrase
+
+    def _paths(self, name):
+        return (
+            os.path.join(self.directory, f"{name}.pub"),
+            os.path.join(self.directory, f"{name}.key"),
+        )
+
+    def load_keypair(self, name):
+        """
+        Charge une paire de clés, en la générant si elle n'existe pas.
+        """
+        public_path, private_path = self._paths(name)
+        if not os.path.exists(private_path):
+            os.makedirs(self.directory, exist_ok=True)
+            public_key, private_key = KEYPAIRS[name]()
+            with open(public_path, "wb") as f:
+                f.write(public_key)
+            fd = os.open(
+                private_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+            )
+            with os.fdopen(fd, "wb") as f:
+                f.write(_seal(private_key, self.passphrase))
+            return public_key, private_key
+
+        with open(public_path, "rb") as f:
+            public_key = f.read()
+        with open(private_path, "rb") as f:
+            private_key = _unseal(f.read(), self.passphrase)
+        return public_key, private_key
+
+    def load(self):
+        return KeySet(*self.load_keypair("sig"), *self.load_keypair("kem"))
+
+
+def load_keys(directory=KEYSTORE_DIRECTORY, passphrase=None):
+    """
+    Charge les clés de la keystore une seule fois par processus. Les
+    processus créés par fork héritent des clés déjà chargées ; les autres
+    les relisent sur disque une fois, sans les recevoir sérialisées.
+    """
+    directory = os.path.abspath(directory)
+    if directory not in _loaded:
+        if passphrase is None:
+            passphrase = os.environ.get(PASSPHRASE_ENV)
+        _loaded[directory] = KeyStore(directory, passphrase).load()
+    return _loaded[directory]
+
+
+def init_worker(directory=KEYSTORE_DIRECTORY, passphrase=None):
+    """
+    Initialiseur de pool de processus : charge les clés dans le processus.
+    """
+    load_keys(directory, passphrase)
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+import pytest
+from api_diplomas import PooledWSGIServer, create_app
+from blockchain.dilithium import KeyManager
+from blockchain.storage import ChainStore, LazyChain
+from data_manager.archive import ingest_diploma
+from data_manager.audit import audit_archive
+from data_manager.index import DiplomaIndex
+from data_manager.keystore import load_keys
+
+
+@pytest.fixture
+def app(tmp_path):
+    directory = str(tmp_path / "db")
+    keystore = str(tmp_path / "keystore")
+    keys = load_keys(keystore)
+    for name in ["Alice Martin", "Bob Durand"]:
+        ingest_diploma(
+            "tests/pdf_test.pdf",
+            {"Nom": name, "Diplôme": "Master Informatique",
+             "Date d'obtention": "2024-06-30"},
+            keys.kem_public_key, keys.sig_private_key, keys.sig_public_key,
+            directory=directory, diploma_id=name.split()[0].lower(),
+            kem_key_id=keys.kem_key_id
+        )
+    return create_app(directory, keystore)
+
+
+def test_list_metadata_and_verify(app):
+    client = app.test_client()
+
+    diplomas = client.get("/diplomas").get_json()["diplomas"]
+    assert [d["id"] for d in diplomas] == ["alice", "bob"]
+    assert "path" not in diplomas[0]
+    found = client.get("/diplomas?q=durand").get_json()["diplomas"]
+    assert [d["id"] for d in found] == ["bob"]
+
+    entry = client.get("/diplomas/alice").get_json()
+    assert entry["metadata"]["Nom"] == "Alice Martin"
+    assert client.get("/diplomas/inconnu").status_code == 404
+
+    report = client.get("/diplomas/alice/verify").get_json()
+    assert report["valid"] is True
+    assert report["failed_indexes"] == []
+    # Point de contrôle enregistré dans l'index
+    assert client.get("/diplomas/alice").get_json()["last_verified"]
+
+    # Chaîne gardée ouverte entre les requêtes
+    service = app.config["SERVICE"]
+    with service.blockchain(service.entry("alice")) as blockchain:
+        assert isinstance(blockchain.chain, LazyChain)
+    client.get("/diplomas/alice/verify")
+    with service.blockchain(service.entry("alice")) as again:
+        assert again is blockchain
+
+
+def test_evicted_chain_closed_after_last_reader(app, monkeypatch):
+    service = app.config["SERVICE"]
+    service._chains.maxsize = 1
+    closed = []
+    monkeypatch.setattr(
+        LazyChain, "close", lambda self: closed.append(self)
+    )
+    with service.blockchain(service.entry("alice")) as alice:
+        # Alice évincée par Bob, mais encore lue : pas encore fermée
+        with service.blockchain(service.entry("bob")):
+            assert closed == []
+            assert alice.chain[0].index == 0
+        assert closed == []
+    assert closed == [alice.chain]
+
+
+def test_verify_rejects_foreign_signing_key(app):
+    service = app.config["SERVICE"]
+    keys = service.keys
+
+    # Chaîne cohérente, mais signée avec une autre clé que celle de
+    # l'archive (clé publique enregistrée dans chaque bloc)
+    key_manager = KeyManager()
+    _, path = ingest_diploma(
+        "tests/pdf_test.pdf",
+        {"Nom": "Mallory", "Diplôme": "Master Informatique",
+         "Date d'obtention": "2024-06-30"},
+        keys.kem_public_key, key_manager.get_private_key(),
+        key_manager.get_public_key(), directory=service.directory,
+        diploma_id="mallory", kem_key_id=keys.kem_key_id
+    )
+    with DiplomaIndex(service.directory) as index:
+        index.add_chain(path, "mallory")
+        entries = index.chains()
+
+    client = app.test_client()
+    report = client.get("/diplomas/mallory/verify").get_json()
+    assert report["valid"] is False
+    assert report["failed_indexes"] == [1]
+    assert client.get("/diplomas/alice/verify").get_json()["valid"] is True
+
+    results = {
+        result["id"]: result["valid"]
+        for result in audit_archive(entries, public_key=keys.sig_public_key)
+    }
+    assert results == {"alice": True, "bob": True, "mallory": False}
+
+
+def test_stream_pdf(app, monkeypatch):
+    client = app.test_client()
+    with open("tests/pdf_test.pdf", "rb") as f:
+        original = f.read()
+
+    decapsulations = []
+    from data_manager import chiffrement
+    from_header = chiffrement.KemSession.from_header.__func__
+
+    def counting(cls, header, private_key):
+        decapsulations.append(header)
+        return from_header(cls, header, private_key)
+
+    monkeypatch.setattr(
+        chiffrement.KemSession, "from_header", classmethod(counting)
+    )
+    for _ in range(2):
+        response = client.get("/diplomas/bob/pdf")
+        assert response.status_code == 200
+        assert response.mimetype == "application/pdf"
+        assert response.get_data() == original
+    # Une seule décapsulation pour les deux extractions
+    assert len(decapsulations) == 1
+
+    # Chaîne altérée sur le disque : erreur avant l'envoi du PDF
+    path = app.config["SERVICE"].entry("bob")["path"]
+    with ChainStore(path) as store:
+        offset = store.offsets[2] + 200
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)[0]
+        f.seek(offset)
+        f.write(bytes([byte ^ 0xFF]))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    response = client.get("/diplomas/bob/pdf")
+    assert response.status_code == 409
+    assert "invalide" in response.get_json()["error"]
+
+
+def test_pooled_server_serves_concurrent_clients(app):
+    server = PooledWSGIServer("127.0.0.1", 0, app, workers=4, log=False)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}/diplomas/alice/verify"
+
+        def fetch(_):
+            with urlopen(url, timeout=30) as response:
+                return json.load(response)["valid"]
+
+        with ThreadPoolExecutor(8) as executor:
+            assert all(executor.map(fetch, range(16)))
+    finally:
+        server.shutdown()
+        server.server_close()
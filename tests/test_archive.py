@@ -0,0 +1,356 @@
+import json
+import os
+import pytest
+import cli_diplomas
+from blockchain.blockchain import Blockchain
+from data_manager import archive
+from data_manager import fragmentation
+from data_manager.archive import ingest_diploma
+from data_manager.fragment_store import FragmentStore
+from data_manager.index import DiplomaIndex
+from data_manager.keystore import load_keys
+
+
+@pytest.fixture(autouse=True)
+def keystore(tmp_path, monkeypatch):
+    # Keystore temporaire, pour ne pas écrire de clés dans le dépôt
+    monkeypatch.setattr(
+        cli_diplomas, "KEYSTORE_DIRECTORY", str(tmp_path / "keystore")
+    )
+    cli_diplomas.get_keys.cache_clear()
+    yield
+    cli_diplomas.get_keys.cache_clear()
+
+
+def _write_manifest(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    with open(manifest, "w", encoding="utf-8") as f:
+        for name in ["Alice Martin", "Bob Durand"]:
+            f.write(json.dumps({
+                "pdf": "tests/pdf_test.pdf",
+                "Nom": name,
+                "Diplôme": "Master Informatique",
+                "Date d'obtention": "2024-06-30",
+            }) + "\n")
+    return str(manifest)
+
+
+def test_batch_import_is_resumable(tmp_path):
+    manifest = _write_manifest(tmp_path)
+    directory = str(tmp_path / "db")
+
+    imported, errors = cli_diplomas.batch_import(manifest, 1, directory)
+    assert (imported, errors) == (2, [])
+
+    # Un sous-dossier par empreinte d'identifiant
+    chains = sorted((tmp_path / "db").rglob("*.chain"))
+    assert len(chains) == 2
+    assert all(len(path.parent.name) == 2 for path in chains)
+    names = set()
+    for path in chains:
+        blockchain = Blockchain.load_from_file(str(path), lazy=True)
+        assert blockchain.is_chain_valid() is True
+        names.add(json.loads(bytes.fromhex(blockchain.chain[1].data))["Nom"])
+    assert names == {"Alice Martin", "Bob Durand"}
+
+    # Les diplômes importés sont indexés au fil de l'import
+    with DiplomaIndex(directory) as index:
+        assert len(index) == 2
+        assert [e["nom"] for e in index.search(nom="alice")] == \
+            ["Alice Martin"]
+
+    # Une relance ne réimporte que les entrées absentes du journal
+    journal = tmp_path / "db" / cli_diplomas.BATCH_JOURNAL
+    records = journal.read_text().splitlines()
+    journal.write_text(records[0] + "\n")
+    imported, errors = cli_diplomas.batch_import(manifest, 1, directory)
+    assert (imported, errors) == (1, [])
+    assert sorted((tmp_path / "db").rglob("*.chain")) == chains
+
+
+def test_batch_import_resumes_after_fixing_an_entry(tmp_path):
+    manifest = _write_manifest(tmp_path)
+    directory = str(tmp_path / "db")
+    with open(manifest, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "pdf": "tests/absent.pdf", "Nom": "Carole Petit",
+            "Diplôme": "Licence", "Date d'obtention": "2024-06-30",
+        }) + "\n")
+
+    imported, errors = cli_diplomas.batch_import(manifest, 1, directory)
+    assert imported == 2
+    assert len(errors) == 1 and errors[0].startswith("Entrée 3 ")
+    chains = sorted((tmp_path / "db").rglob("*.chain"))
+
+    # Entrée corrigée : seule elle est importée, les autres gardent leur
+    # identifiant
+    with open(manifest, encoding="utf-8") as f:
+        content = f.read().replace("tests/absent.pdf", "tests/pdf_test.pdf")
+    with open(manifest, "w", encoding="utf-8") as f:
+        f.write(content)
+    imported, errors = cli_diplomas.batch_import(manifest, 1, directory)
+    assert (imported, errors) == (1, [])
+    after = sorted((tmp_path / "db").rglob("*.chain"))
+    assert len(after) == 3 and set(chains) <= set(after)
+
+
+def test_dedup_uses_fixed_size_fragments_by_default(tmp_path, monkeypatch):
+    keys = load_keys(str(tmp_path / "keystore"))
+    store = FragmentStore.open(
+        str(tmp_path / "fragments"), keys.kem_public_key,
+        keys.kem_private_key
+    )
+    # Découpage par contenu seulement sur demande
+    monkeypatch.setattr(fragmentation, "iter_chunks", None)
+    for name in ["alice", "bob"]:
+        ingest_diploma(
+            "tests/pdf_test.pdf", {"Nom": name}, keys.kem_public_key,
+            keys.sig_private_key, keys.sig_public_key,
+            directory=str(tmp_path / "db"), diploma_id=name,
+            fragment_store=store
+        )
+    # Le même PDF n'est stocké qu'une fois
+    assert store.stored and store.reused == store.stored
+
+
+def test_batch_import_ledger_opened_once(tmp_path, monkeypatch):
+    from blockchain.ledger import Ledger
+
+    opened = []
+    open_chain = Ledger.open_chain
+
+    def counting_open_chain(ledger):
+        opened.append(ledger.path)
+        return open_chain(ledger)
+
+    monkeypatch.setattr(Ledger, "open_chain", counting_open_chain)
+    directory = str(tmp_path / "db_blockchains")
+    imported, errors = cli_diplomas.batch_import(
+        _write_manifest(tmp_path), 1, directory, ledger=True
+    )
+    assert (imported, errors) == (2, [])
+    # Un seul registre ouvert pour indexer tous les segments
+    assert len(opened) == 1
+    with DiplomaIndex(directory) as index:
+        assert sorted(e["metadata"]["Nom"] for e in index.search()) == \
+            ["Alice Martin", "Bob Durand"]
+
+
+def test_diploma_index_search_and_rebuild(tmp_path):
+    directory = str(tmp_path / "db")
+    keys = cli_diplomas.get_keys()
+    paths = []
+    for name, title, date in [
+        ("Alice Martin", "Master Informatique", "2024-06-30"),
+        ("Bob Durand", "Licence Physique", "2023-07-01"),
+    ]:
+        diploma_id, path = ingest_diploma(
+            "tests/pdf_test.pdf",
+            {"Nom": name, "Diplôme": title, "Date d'obtention": date},
+            keys.kem_public_key, keys.sig_private_key, keys.sig_public_key,
+            directory=directory
+        )
+        paths.append(path)
+
+    with DiplomaIndex(directory) as index:
+        assert index.created is True
+        index.rebuild(paths)
+        assert len(index) == 2
+
+        entry = index.search(diplome="physique")[0]
+        assert entry["nom"] == "Bob Durand"
+        assert entry["path"] == paths[1]
+        assert entry["block_count"] == len(
+            Blockchain.load_from_file(paths[1]).chain
+        )
+        assert [e["nom"] for e in index.search(query="2024")] == \
+            ["Alice Martin"]
+        assert index.search(nom="Charlie") == []
+
+        index.mark_verified(entry["id"], when=1234.0)
+        assert index.get(entry["id"])["last_verified"] == 1234.0
+
+        assert index.get_checkpoint(entry["id"]) is None
+        index.set_checkpoint(entry["id"], (3, "ab" * 32), when=1235.0)
+        assert index.get_checkpoint(entry["id"]) == (3, "ab" * 32)
+        assert index.get(entry["id"])["last_verified"] == 1235.0
+
+    # L'index persiste d'une ouverture à l'autre
+    with DiplomaIndex(directory) as index:
+        assert index.created is False
+        assert len(index) == 2
+
+
+def test_batch_import_profile(tmp_path):
+    from blockchain import metrics
+
+    manifest = _write_manifest(tmp_path)
+    metrics.enable()
+    try:
+        cli_diplomas.batch_import(manifest, 1, str(tmp_path / "db"))
+        # Mesures des processus du pool rapatriées dans le processus
+        # principal
+        stages = metrics.report()["stages"]
+        assert stages["kem.encap"]["count"] == 2
+        assert stages["dilithium.sign"]["count"] >= 4
+        assert stages["disk.write"]["bytes"] > 0
+
+        output = tmp_path / "metrics.prom"
+        cli_diplomas.print_profile(str(output))
+        assert 'diploma_stage_seconds_count{stage="kem.encap"} 2' in \
+            output.read_text()
+        assert metrics.snapshot() == {}
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+
+def test_archive_audit(tmp_path, monkeypatch):
+    from blockchain.storage import ChainStore
+
+    manifest = _write_manifest(tmp_path)
+    directory = str(tmp_path / "db_blockchains")
+    cli_diplomas.batch_import(manifest, 1, directory)
+    chains = sorted((tmp_path / "db_blockchains").rglob("*.chain"))
+
+    # Un diplôme indexé dont le fichier a disparu
+    keys = cli_diplomas.get_keys()
+    _, missing = ingest_diploma(
+        "tests/pdf_test.pdf", {"Nom": "Charlie"}, keys.kem_public_key,
+        keys.sig_private_key, keys.sig_public_key, directory=directory,
+        diploma_id="absent"
+    )
+    with DiplomaIndex(directory) as index:
+        index.add_chain(missing)
+    os.remove(missing)
+
+    # Un fragment altéré dans la première chaîne
+    store = ChainStore(str(chains[0]))
+    offset = store.offsets[3] + 200
+    with open(chains[0], "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    report_path = tmp_path / "audit.jsonl"
+    summary = cli_diplomas.audit_archive_command(
+        directory, workers=2, report_path=str(report_path)
+    )
+    assert (summary["chains"], summary["valid"], summary["invalid"]) == \
+        (3, 1, 2)
+
+    lines = [
+        json.loads(line) for line in report_path.read_text().splitlines()
+    ]
+    assert lines[-1] == {"summary": summary}
+    results = {result["path"]: result for result in lines[:-1]}
+    assert results[str(chains[0])]["valid"] is False
+    assert results[str(chains[0])]["first_bad_index"] == 3
+    assert results[str(chains[1])]["valid"] is True
+    assert results[str(chains[1])]["first_bad_index"] is None
+    assert results[str(chains[1])]["seconds"] > 0
+    assert "FileNotFoundError" in results[missing]["error"]
+
+    # Point de contrôle enregistré pour la seule chaîne valide
+    with DiplomaIndex(directory) as index:
+        checkpoints = index.checkpoints()
+    assert list(checkpoints) == [results[str(chains[1])]["id"]]
+    assert list(checkpoints.values())[0] == \
+        tuple(results[str(chains[1])]["checkpoint"])
+
+    # Audit séquentiel en ligne de commande : code de sortie non nul
+    monkeypatch.chdir(tmp_path)
+    assert cli_diplomas.main(
+        ["audit", "--workers", "1", "--report", str(report_path)]
+    ) == 1
+    lines = report_path.read_text().splitlines()
+    assert json.loads(lines[-1])["summary"]["invalid"] == 2
+
+
+def test_show_all_blockchains_reads_json_chains(tmp_path, monkeypatch,
+                                                capsys):
+    from blockchain.storage import store_to_json
+
+    pdf = os.path.abspath("tests/pdf_test.pdf")
+    monkeypatch.chdir(tmp_path)
+    keys = cli_diplomas.get_keys()
+    for diploma_id in ["alice", "bob"]:
+        _, path = ingest_diploma(
+            pdf, {"Nom": diploma_id},
+            keys.kem_public_key, keys.sig_private_key, keys.sig_public_key,
+            diploma_id=diploma_id
+        )
+    # Ancien format : la blockchain de Bob est un fichier JSON
+    json_path = path[:-len(".chain")] + ".json"
+    store_to_json(path, json_path)
+    os.remove(path)
+    os.remove(path + ".idx")
+
+    cli_diplomas.show_all_blockchains()
+    output = capsys.readouterr().out
+    assert "diploma_alice.chain" in output
+    assert "diploma_bob.json" in output
+    assert "Métadonnées" in output
+
+
+def test_migrate_flat_layout(tmp_path):
+    directory = str(tmp_path / "db")
+    keys = cli_diplomas.get_keys()
+    flat = []
+    for diploma_id in ["alice", "bob"]:
+        _, path = ingest_diploma(
+            "tests/pdf_test.pdf", {"Nom": diploma_id}, keys.kem_public_key,
+            keys.sig_private_key, keys.sig_public_key, directory=directory,
+            diploma_id=diploma_id
+        )
+        # Ancienne organisation : tous les fichiers dans le même dossier
+        flat_path = os.path.join(directory, os.path.basename(path))
+        os.replace(path + ".idx", flat_path + ".idx")
+        os.replace(path, flat_path)
+        flat.append(flat_path)
+
+    with cli_diplomas.open_index(directory) as index:
+        # Index reconstruit depuis le dossier à plat ; Bob n'est pas indexé
+        assert sorted(index.paths()) == flat
+        index.set_checkpoint("alice", (3, "ab" * 32))
+        index.rebuild(flat[:1])
+        index.set_checkpoint("alice", (3, "ab" * 32))
+
+        # Dossier donné avec une barre finale : même dossier
+        assert archive.migrate_to_shards(directory + os.sep, index) == 2
+        assert archive.migrate_to_shards(directory, index) == 0
+        paths = index.paths()
+        assert sorted(paths) == sorted(
+            archive.diploma_path(diploma_id, directory)
+            for diploma_id in ["alice", "bob"]
+        )
+        assert index.get_checkpoint("alice") == (3, "ab" * 32)
+        assert index.get("bob")["metadata"] == {"Nom": "bob"}
+
+    assert sorted(archive.iter_chain_files(directory)) == sorted(paths)
+    for path in paths:
+        assert Blockchain.load_from_file(path, lazy=True).is_chain_valid()
+
+
+@pytest.mark.parametrize("ledger", [False, True])
+def test_interactive_additions_do_not_accumulate(tmp_path, monkeypatch,
+                                                 ledger):
+    pdf = os.path.abspath("tests/pdf_test.pdf")
+    monkeypatch.chdir(tmp_path)
+    for name in ["Alice Martin", "Bob Durand"]:
+        answers = iter([pdf, name, "Master", "2024-06-30"])
+        monkeypatch.setattr(
+            cli_diplomas.Prompt, "ask", lambda *a, **k: next(answers)
+        )
+        cli_diplomas.add_diploma_with_rich(ledger)
+
+    with DiplomaIndex("db_blockchains") as index:
+        entries = index.search()
+    assert [e["nom"] for e in entries] == ["Alice Martin", "Bob Durand"]
+    # Le second diplôme ne reprend pas les blocs du premier
+    assert entries[0]["block_count"] == entries[1]["block_count"]
+    if ledger:
+        assert entries[1]["segment_start"] == entries[0]["segment_end"] + 1
+    for entry in entries:
+        assert cli_diplomas.open_diploma(entry).is_chain_valid()
@@ -1,5 +1,6 @@
+import pickle
 import pytest
-from blockchain.block import Block
+from blockchain.block import TYPE_FRAGMENT, TYPE_METADATA, Block
 from blockchain.blockchain import Blockchain
 from blockchain.dilithium import KeyManager
 
@@ -52,6 +53,76 @@ def test_block_data_immutability():
     assert block.verify_block(public_key) is True
 
 
+def test_compact_block_representation():
+    key_manager = KeyManager()
+    public_key = key_manager.get_public_key()
+    private_key = key_manager.get_private_key()
+
+    data = bytes(range(256)).hex()
+    block = Block(
+        index=1, data=data, previous_hash="0",
+        private_key=private_key, public_key=public_key
+    )
+    # Pas de __dict__, données hexadécimales conservées en octets bruts
+    assert not hasattr(block, "__dict__")
+    assert block.is_hex and block.payload == bytes(range(256))
+    assert block.data == data
+    assert b"".join(block.hex_chunks()) == data.encode()
+
+    # Le hash n'est recalculé que si un champ haché change
+    assert block.calculate_hash() is block.hash
+    block.previous_hash = "1"
+    assert block.calculate_hash() != block.hash
+
+    # Signature restaurée depuis une vue : convertie au premier accès
+    restored = Block.restore(
+        1, block.timestamp, memoryview(block.payload), "0", block.hash,
+        memoryview(block.signature), public_key
+    )
+    assert restored.signature == block.signature
+    assert restored.verify_block(public_key)
+
+    copy = pickle.loads(pickle.dumps(restored))
+    assert copy.to_dict() == restored.to_dict()
+    assert Block.from_dict(restored.to_dict()).to_dict() == copy.to_dict()
+
+
+def test_typed_block():
+    key_manager = KeyManager()
+    public_key = key_manager.get_public_key()
+    private_key = key_manager.get_private_key()
+
+    fields = dict(index=1, timestamp=1000, data="00ff", previous_hash="0")
+    untyped = Block(**fields)
+    block = Block(
+        **fields, private_key=private_key, public_key=public_key,
+        block_type=TYPE_METADATA
+    )
+    # Le type fait partie du contenu haché (et donc signé)
+    assert block.hash != untyped.hash
+    assert "type" not in untyped.to_dict()
+    assert block.to_dict()["type"] == "metadata"
+
+    for copy in (
+        Block.from_dict(block.to_dict()), pickle.loads(pickle.dumps(block))
+    ):
+        assert copy.block_type == TYPE_METADATA
+        assert copy.calculate_hash() == block.hash
+
+    # Un bloc sans type dont les données commencent comme une étiquette de
+    # type n'a pas le même contenu haché qu'un bloc typé
+    for data in ["abc", "00ff"]:
+        typed = Block(**{**fields, "data": data}, block_type=TYPE_METADATA)
+        for prefix in [f"T{TYPE_METADATA}", f"\x00{TYPE_METADATA}"]:
+            assert Block(**{**fields, "data": prefix + data}).hash \
+                != typed.hash
+
+    # Type modifié : le hash enregistré ne correspond plus
+    tampered = Block.from_dict({**block.to_dict(), "type": "fragment"})
+    assert tampered.block_type == TYPE_FRAGMENT
+    assert tampered.calculate_hash() != tampered.hash
+
+
 def test_block_verification_failure():
     key_manager = KeyManager()
     public_key = key_manager.get_public_key()
@@ -101,7 +172,7 @@ def test_create_blockchain():
     assert blockchain.is_chain_valid() is True
 
 
-def test_save_and_load_blockchain():
+def test_save_and_load_blockchain(tmp_path):
     blockchain = Blockchain()
 
     # Vérifie que la chaîne commence avec le bloc de genèse
@@ -132,13 +203,123 @@ def test_save_and_load_blockchain():
     assert blockchain.is_chain_valid() is True
 
     # Sauvegarde la chaîne
-    blockchain.save_to_file("tests/test_chain.json")
+    path = str(tmp_path / "chain.json")
+    blockchain.save_to_file(path)
 
     # Charge la chaîne
-    new_blockchain = Blockchain.load_from_file("tests/test_chain.json")
+    new_blockchain = Blockchain.load_from_file(path)
     # Vérifie que les deux chaînes sont identiques
     assert len(new_blockchain.chain) == 2
     assert new_blockchain.is_chain_valid() is True
     assert new_blockchain.chain[0].data == "Genesis Block"
     assert new_blockchain.chain[1].data == "Hello Blockchain"
     assert new_blockchain.chain[1].verify_block(public_key) is True
+
+
+def _signed_chain(length):
+    key_manager = KeyManager()
+    public_key = key_manager.get_public_key()
+    private_key = key_manager.get_private_key()
+    blockchain = Blockchain()
+    for i in range(1, length):
+        blockchain.add_block(Block(
+            index=i,
+            data=f"Bloc {i}",
+            previous_hash=blockchain.chain[-1].hash,
+            private_key=private_key,
+            public_key=public_key
+        ))
+    return blockchain
+
+
+def test_parallel_chain_verification():
+    blockchain = _signed_chain(10)
+    report = blockchain.verify(workers=2)
+    assert report.valid is True
+    assert report.failed_indexes == []
+    assert blockchain.is_chain_valid(workers=2) is True
+
+    # Une signature corrompue est signalée avec l'indice de son bloc
+    blockchain.chain[7].signature = bytes(len(blockchain.chain[7].signature))
+    assert blockchain.verify(workers=2).failed_indexes == [7]
+    assert blockchain.verify().failed_indexes == [7]
+
+    # Un chaînage rompu est détecté avant toute vérification de signature
+    blockchain.chain[3].previous_hash = "0"
+    assert blockchain.verify(workers=2).failed_indexes == [3]
+
+
+def test_verification_cache_skips_verified_blocks(tmp_path, monkeypatch):
+    from blockchain import verification
+    from blockchain.verification import VerificationCache
+
+    blockchain = _signed_chain(6)
+    calls = []
+    verify = verification.verify
+
+    def counting_verify(signature, data, public_key):
+        calls.append(data)
+        return verify(signature, data, public_key)
+
+    monkeypatch.setattr(verification, "verify", counting_verify)
+
+    path = str(tmp_path / "verified.sqlite")
+    cache = VerificationCache(maxsize=3, path=path)
+    assert blockchain.is_chain_valid(cache=cache) is True
+    assert len(calls) == 5
+
+    # Seul le nouveau bloc est vérifié lors de l'audit suivant, y compris
+    # avec un nouveau cache mémoire adossé à la même base
+    key_manager = KeyManager()
+    blockchain.add_block(Block(
+        index=6,
+        data="Bloc 6",
+        previous_hash=blockchain.chain[-1].hash,
+        private_key=key_manager.get_private_key(),
+        public_key=key_manager.get_public_key()
+    ))
+    calls.clear()
+    cache = VerificationCache(maxsize=3, path=path)
+    assert blockchain.is_chain_valid(cache=cache) is True
+    assert calls == [blockchain.chain[6].hash.encode()]
+
+    # Une signature modifiée ne correspond à aucune entrée du cache
+    blockchain.chain[2].signature = bytes(len(blockchain.chain[2].signature))
+    assert blockchain.verify(cache=cache).failed_indexes == [2]
+    cache.close()
+
+
+def test_incremental_verification_from_checkpoint(monkeypatch):
+    from blockchain import verification
+
+    blockchain = _signed_chain(5)
+    report = blockchain.verify()
+    assert report.checkpoint == (4, blockchain.chain[4].hash)
+
+    key_manager = KeyManager()
+    for i in range(5, 8):
+        blockchain.add_block(Block(
+            index=i,
+            data=f"Bloc {i}",
+            previous_hash=blockchain.chain[-1].hash,
+            private_key=key_manager.get_private_key(),
+            public_key=key_manager.get_public_key()
+        ))
+
+    calls = []
+    verify = verification.verify
+    monkeypatch.setattr(
+        verification, "verify",
+        lambda signature, data, public_key: calls.append(data) or verify(
+            signature, data, public_key
+        )
+    )
+    # Seuls les blocs ajoutés après le point de contrôle sont vérifiés
+    report = blockchain.verify(checkpoint=report.checkpoint)
+    assert report.valid is True
+    assert calls == [block.hash.encode() for block in blockchain.chain[5:]]
+    assert report.checkpoint == (7, blockchain.chain[7].hash)
+
+    # Un point de contrôle qui ne correspond plus à la chaîne est signalé
+    assert blockchain.verify(checkpoint=(4, "0" * 64)).failed_indexes == [4]
+    assert blockchain.verify(checkpoint=(9, "0" * 64)).valid is False
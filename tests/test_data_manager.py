@@ -1,13 +1,36 @@
+import base64
 import json
+import os
+import random
+import subprocess
+import sys
+import pytest
 from data_manager import fragmentation, compression
+from data_manager.archive import add_metadata_block
 from blockchain.dilithium import KeyManager
 from blockchain.blockchain import Blockchain
 from data_manager.fragmentation import (
+    FragmentPolicy,
+    IngestOptions,
     add_file_to_blockchain,
     extract_file_from_blockchain,
 )
-from data_manager.compression import decompress_data
-from data_manager.chiffrement import generate_kem_keys
+from data_manager.chunking import chunk_data, iter_chunks
+from data_manager.compression import compress_data
+from data_manager.envelope import pack_fragment, unpack_fragment
+from data_manager.fragment_store import FragmentStore
+from data_manager.chiffrement import (
+    KemSession,
+    encrypt_fragment,
+    generate_kem_keys,
+)
+from blockchain.block import (
+    TYPE_FRAGMENT,
+    TYPE_FRAGMENT_HEADER,
+    TYPE_GENESIS,
+    TYPE_METADATA,
+    Block,
+)
 
 
 def test_fragment_and_compress():
@@ -27,10 +50,54 @@ def test_fragment_and_compress():
         assert decompressed_fragment == fragment
 
 
-def test_add_and_extract_file_from_blockchain():
+def test_compression_codecs():
+    data = b"Diplome de Master " * 1000
+    for codec in ["zlib", "zlib-1", "zlib-9", "lzma", "bz2"]:
+        compressed = compression.compress_data(data, codec)
+        assert compression.codec_of(compressed) == codec
+        assert len(compressed) < len(data)
+        assert compression.decompress_data(compressed) == data
+
+    # Le mode "auto" ne compresse pas les données incompressibles
+    random_data = os.urandom(100_000)
+    compressed = compression.compress_data(random_data, "auto")
+    assert compression.codec_of(compressed) == "none"
+    assert compression.decompress_data(compressed) == random_data
+    assert compression.codec_of(compression.compress_data(data, "auto")) \
+        == "zlib"
+
+
+def test_extract_legacy_encrypt_then_compress_chain(tmp_path):
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+
+    # Chaîne au format historique : chiffrement puis compression
+    fragments = fragmentation.fragment_file("tests/pdf_test.pdf")
+    blockchain = Blockchain()
+    for fragment in fragments:
+        encrypted = json.dumps(encrypt_fragment(fragment, kem_public_key))
+        blockchain.add_block(Block(
+            index=len(blockchain.chain),
+            data=compress_data(encrypted.encode()).hex(),
+            previous_hash=blockchain.chain[-1].hash,
+            private_key=sig_private_key,
+            public_key=sig_public_key
+        ))
+
+    output_path = tmp_path / "reconstructed.pdf"
+    extract_file_from_blockchain(
+        blockchain, output_path, kem_private_key, sig_public_key
+    )
+    with open(output_path, "rb") as f:
+        assert f.read() == b"".join(fragments)
+
+
+def test_add_and_extract_file_from_blockchain(tmp_path):
     # Chemins des fichiers
     test_file_path = "tests/pdf_test.pdf"
-    reconstructed_file_path = "tests/pdf_test_reconstructed.pdf"
+    reconstructed_file_path = tmp_path / "reconstructed.pdf"
 
     # Vérifie que le fichier d'entrée existe
     with open(test_file_path, "rb") as f:
@@ -55,19 +122,17 @@ def test_add_and_extract_file_from_blockchain():
     # Vérifie que des blocs ont été ajoutés
     assert len(blockchain.chain) > 1, "Aucun bloc ajouté à la blockchain."
 
-    blockchain.save_to_file("tests/test_chain2.json")
+    blockchain.save_to_file(str(tmp_path / "chain.json"))
 
     # Vérifie chaque bloc de la blockchain
     for block in blockchain.chain[1:]:
-        compressed_fragment = bytes.fromhex(block.data)
-        encrypted_data_bytes = decompress_data(compressed_fragment)
-
-        # Désérialisation JSON
-        encrypted_data = json.loads(encrypted_data_bytes.decode())
+        # Enveloppe binaire (le fragment est compressé avant chiffrement)
+        encrypted_data = unpack_fragment(bytes.fromhex(block.data))
         assert "ciphertext" in encrypted_data, "Fragment chiffré manquant."
         assert "nonce" in encrypted_data, "Nonce manquant."
         assert "tag" in encrypted_data, "Tag AES manquant."
         assert "kem_ct" in encrypted_data, "Clé encapsulée manquante."
+        assert "codec" in encrypted_data, "Codec de compression manquant."
 
     # Extrait le fichier depuis la blockchain
     extract_file_from_blockchain(
@@ -79,3 +144,351 @@ def test_add_and_extract_file_from_blockchain():
         extracted_content = f.read()
     assert extracted_content == original_content, \
         "Le fichier reconstruit est différent de l'original."
+
+
+def test_add_and_extract_file_with_kem_session(tmp_path):
+    test_file_path = "tests/pdf_test.pdf"
+    reconstructed_file_path = tmp_path / "reconstructed.pdf"
+
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+
+    blockchain = Blockchain()
+    add_file_to_blockchain(
+        test_file_path, blockchain, kem_public_key,
+        sig_private_key, sig_public_key, IngestOptions(session=True)
+    )
+
+    # Le KEM ciphertext n'est stocké qu'une fois, dans le bloc d'en-tête
+    header = json.loads(bytes.fromhex(blockchain.chain[1].data).decode())
+    assert "kem_session" in header
+    for block in blockchain.chain[2:]:
+        encrypted_data = unpack_fragment(bytes.fromhex(block.data))
+        assert "kem_ct" not in encrypted_data
+        assert "nonce" not in encrypted_data
+
+    extract_file_from_blockchain(
+        blockchain, reconstructed_file_path, kem_private_key, sig_public_key
+    )
+
+    with open(test_file_path, "rb") as f:
+        original_content = f.read()
+    with open(reconstructed_file_path, "rb") as f:
+        assert f.read() == original_content
+
+
+STREAMING_SCRIPT = """
+import hashlib, os, resource, sys
+from blockchain.blockchain import Blockchain
+from blockchain.dilithium import KeyManager
+from data_manager.chiffrement import generate_kem_keys
+from data_manager.fragmentation import (
+    IngestOptions, add_file_to_blockchain, extract_file_from_blockchain,
+)
+
+size_mb, directory = int(sys.argv[1]), sys.argv[2]
+source = os.path.join(directory, "source.bin")
+output = os.path.join(directory, "output.bin")
+chain_path = os.path.join(directory, "diploma.chain")
+
+digest = hashlib.sha256()
+with open(source, "wb") as f:
+    for _ in range(size_mb):
+        chunk = os.urandom(1024 * 1024)
+        digest.update(chunk)
+        f.write(chunk)
+
+key_manager = KeyManager()
+kem_public_key, kem_private_key = generate_kem_keys()
+add_file_to_blockchain(
+    source, Blockchain.open(chain_path), kem_public_key,
+    key_manager.get_private_key(), key_manager.get_public_key(),
+    IngestOptions(session=True, fragment_size=1024 * 1024),
+)
+extract_file_from_blockchain(
+    Blockchain.load_from_file(chain_path, lazy=True), output,
+    kem_private_key, key_manager.get_public_key(),
+)
+
+extracted = hashlib.sha256()
+with open(output, "rb") as f:
+    while chunk := f.read(1024 * 1024):
+        extracted.update(chunk)
+assert extracted.digest() == digest.digest()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def _streaming_peak_rss_kb(size_mb, directory):
+    result = subprocess.run(
+        [sys.executable, "-c", STREAMING_SCRIPT, str(size_mb),
+         str(directory)],
+        capture_output=True, text=True, check=True,
+    )
+    return int(result.stdout.split()[-1])
+
+
+# Cas lent : DIPLOMA_STREAMING_MB=500 vérifie le comportement sur un fichier
+# de plusieurs centaines de Mo (ignoré par défaut)
+STREAMING_MB = os.environ.get("DIPLOMA_STREAMING_MB")
+
+
+@pytest.mark.parametrize("large_mb", [
+    24,
+    pytest.param(
+        int(STREAMING_MB or 0),
+        marks=pytest.mark.skipif(
+            not STREAMING_MB, reason="DIPLOMA_STREAMING_MB non défini"
+        ),
+        id="DIPLOMA_STREAMING_MB",
+    ),
+])
+def test_streaming_ingest_and_extract_bounded_memory(tmp_path, large_mb):
+    (tmp_path / "small").mkdir()
+    (tmp_path / "large").mkdir()
+    small = _streaming_peak_rss_kb(4, tmp_path / "small")
+    large = _streaming_peak_rss_kb(large_mb, tmp_path / "large")
+
+    # Le pic mémoire ne dépend pas de la taille du fichier
+    assert large - small < 16 * 1024, (small, large)
+
+
+def test_parallel_ingest_matches_serial_chain():
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+    session = KemSession.open(kem_public_key)
+
+    def ingest(**options):
+        blockchain = Blockchain()
+        blockchain.chain = [reference_genesis]
+        add_file_to_blockchain(
+            "tests/pdf_test.pdf", blockchain, kem_public_key,
+            sig_private_key, sig_public_key, IngestOptions(
+                session=session, timestamp=1700000000000, **options
+            )
+        )
+        return [block.to_dict() for block in blockchain.chain]
+
+    reference_genesis = Blockchain().chain[0]
+    serial = ingest()
+    assert ingest(workers=2) == serial
+    assert ingest(workers=2, parallel_signing=True) == serial
+
+
+def test_extract_verifies_each_block_once(tmp_path, monkeypatch):
+    from blockchain import block as block_module, verification
+
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+    blockchain = Blockchain()
+    add_file_to_blockchain(
+        "tests/pdf_test.pdf", blockchain, kem_public_key,
+        key_manager.get_private_key(), sig_public_key,
+        IngestOptions(session=True)
+    )
+
+    calls = []
+    verify = verification.verify
+
+    def counting_verify(signature, data, public_key):
+        calls.append(data)
+        return verify(signature, data, public_key)
+
+    monkeypatch.setattr(verification, "verify", counting_verify)
+    monkeypatch.setattr(block_module, "verify", counting_verify)
+    extract_file_from_blockchain(
+        blockchain, tmp_path / "reconstructed.pdf", kem_private_key,
+        sig_public_key
+    )
+    assert sorted(calls) == sorted(
+        block.hash.encode() for block in blockchain.chain[1:]
+    )
+
+
+def test_content_defined_chunking(tmp_path):
+    shared = os.urandom(200_000)
+    path = tmp_path / "fichier.bin"
+    path.write_bytes(shared)
+    chunks = list(iter_chunks(path, 1024, 4096, 16384))
+    assert b"".join(chunks) == shared
+    assert chunks == chunk_data(shared, 1024, 4096, 16384)
+    assert all(len(chunk) <= 16384 for chunk in chunks)
+    assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+
+    # Un ajout en tête ne déplace que les premières coupures
+    shifted = chunk_data(b"en-tete" + shared, 1024, 4096, 16384)
+    assert len(set(chunks) & set(shifted)) >= len(chunks) - 2
+
+
+def test_fragment_store_deduplicates_across_files(tmp_path):
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+    store = FragmentStore.open(
+        tmp_path / "fragments", kem_public_key, kem_private_key
+    )
+
+    # Deux fichiers partageant un même modèle (aléatoire mais reproductible :
+    # les points de coupe, donc la déduplication, en dépendent)
+    template = random.Random(15).randbytes(150_000)
+    paths = []
+    for name in ["alice", "bob"]:
+        path = tmp_path / f"{name}.pdf"
+        path.write_bytes(name.encode() * 100 + template)
+        paths.append(path)
+
+    chains = []
+    for path in paths:
+        blockchain = Blockchain()
+        add_file_to_blockchain(
+            path, blockchain, kem_public_key, sig_private_key,
+            sig_public_key,
+            IngestOptions(chunking=True, fragment_store=store)
+        )
+        chains.append(blockchain)
+    assert store.reused >= store.stored // 2 - 2
+    assert store.size() < 1.2 * len(template)
+
+    # Références engagées par un seul en-tête signé : avec le magasin, la
+    # chaîne est bien plus petite que celle du fichier seul
+    for blockchain in chains:
+        assert sum(bool(block.signature) for block in blockchain.chain) == 1
+    plain = Blockchain()
+    add_file_to_blockchain(
+        paths[0], plain, kem_public_key, sig_private_key, sig_public_key,
+        IngestOptions(chunking=True)
+    )
+    chains[0].save_to_file(str(tmp_path / "dedup.chain"))
+    plain.save_to_file(str(tmp_path / "plain.chain"))
+    assert os.path.getsize(tmp_path / "dedup.chain") < \
+        0.2 * os.path.getsize(tmp_path / "plain.chain")
+
+    # Réouverture du magasin (nouvelle décapsulation) puis extraction
+    store = FragmentStore.open(
+        tmp_path / "fragments", kem_public_key, kem_private_key
+    )
+    for path, blockchain in zip(paths, chains):
+        output_path = tmp_path / "reconstructed.pdf"
+        extract_file_from_blockchain(
+            blockchain, output_path, kem_private_key, sig_public_key,
+            fragment_store=store
+        )
+        assert output_path.read_bytes() == path.read_bytes()
+
+
+def test_fragment_policy(tmp_path):
+    # Un fichier de quelques octets donne tout de même un fragment
+    tiny = tmp_path / "petit.bin"
+    tiny.write_bytes(b"abc")
+    assert fragmentation.fragment_file(tiny, 10) == [b"abc"]
+    assert fragmentation.fragment_file(tiny) == [b"abc"]
+
+    policy = FragmentPolicy(percentage=10, min_size=4096, max_size=65536)
+    assert policy.fragment_size(10_000) == 4096
+    assert policy.fragment_size(100_000) == 10_000
+    assert policy.fragment_size(10 ** 9) == 65536
+    assert FragmentPolicy(size=1000, min_size=1).fragment_size(10 ** 6) \
+        == 1000
+
+    # Mode adaptatif : le coût fixe d'un bloc reste sous la cible
+    policy = FragmentPolicy(
+        target_overhead=0.1, block_cost=1e-3, byte_cost=1e-8,
+        max_size=10 ** 7
+    )
+    assert policy.fragment_size(10 ** 9) == 10 ** 6
+    data = tmp_path / "donnees.bin"
+    data.write_bytes(os.urandom(50_000))
+    fragments = fragmentation.fragment_file(
+        data, policy=FragmentPolicy(size=16384)
+    )
+    assert [len(fragment) for fragment in fragments] \
+        == [16384, 16384, 16384, 848]
+
+    # Taille explicite au-delà du maximum par défaut : respectée
+    size = fragmentation.MAX_FRAGMENT_SIZE + 1024
+    large = tmp_path / "grand.bin"
+    large.write_bytes(bytes(size + 10))
+    assert [
+        len(fragment)
+        for fragment in fragmentation.iter_fragments(large, fragment_size=size)
+    ] == [size, 10]
+
+
+def test_binary_fragment_envelope():
+    fields = {
+        "ciphertext": os.urandom(1000), "tag": os.urandom(16),
+        "fragment": 7, "codec": "zlib", "key_id": "0123456789abcdef",
+    }
+    packed = pack_fragment(fields)
+    assert unpack_fragment(packed) == fields
+
+    # Plus compact que le JSON de champs base64
+    as_json = json.dumps({
+        "ciphertext": base64.b64encode(fields["ciphertext"]).decode(),
+        "tag": base64.b64encode(fields["tag"]).decode(),
+        "fragment": 7, "codec": "zlib", "key_id": "0123456789abcdef",
+    }).encode()
+    assert len(packed) < len(as_json) * 0.8
+
+
+def test_typed_blocks_extract_without_trial_parsing(monkeypatch):
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+
+    blockchain = Blockchain()
+    add_metadata_block(
+        blockchain, {"Nom": "Alice", "Diplôme": "Master",
+                     "Date d'obtention": "2024-06-30"},
+        sig_private_key, sig_public_key
+    )
+    add_file_to_blockchain(
+        "tests/pdf_test.pdf", blockchain, kem_public_key, sig_private_key,
+        sig_public_key, IngestOptions(session=True, merkle=True)
+    )
+    types = [block.block_type for block in blockchain.chain]
+    assert types[:3] == [TYPE_GENESIS, TYPE_METADATA, TYPE_FRAGMENT_HEADER]
+    assert set(types[3:]) == {TYPE_FRAGMENT}
+
+    # Seul l'en-tête est désérialisé (vérification de la racine, puis
+    # extraction) : ni les métadonnées ni les enveloppes
+    parsed = []
+    loads = json.loads
+
+    def counting_loads(text, *args, **kwargs):
+        parsed.append(text)
+        return loads(text, *args, **kwargs)
+
+    monkeypatch.setattr(fragmentation.json, "loads", counting_loads)
+    with open("tests/pdf_test.pdf", "rb") as f:
+        assert b"".join(fragmentation.iter_file_from_blockchain(
+            blockchain, kem_private_key, sig_public_key, quiet=True
+        )) == f.read()
+    header = bytes(blockchain.chain[2].payload).decode()
+    assert parsed and all(text == header for text in parsed)
+    monkeypatch.undo()
+
+    # Blocs sans type (chaînes antérieures) : type déduit du contenu
+    for block, block_type in zip(blockchain.chain, types):
+        untyped = Block.restore(
+            block.index, block.timestamp, block.payload,
+            block.previous_hash, None
+        )
+        assert fragmentation.block_type_of(untyped) == block_type
+
+    # Le type d'un fragment engagé (non signé) ne peut pas être changé
+    chain = list(blockchain.chain)
+    last = chain[-1]
+    chain[-1] = Block(
+        last.index, last.timestamp, last.payload, last.previous_hash,
+        block_type=TYPE_METADATA
+    )
+    blockchain.chain = chain
+    assert blockchain.is_chain_valid() is False
@@ -1,5 +1,14 @@
 from blockchain.dilithium import generate_keys, sign, verify
-from data_manager.chiffrement import encrypt_fragment, decrypt_fragment, kemalg
+import subprocess
+import sys
+import pytest
+from data_manager.chiffrement import (
+    KemSession,
+    encrypt_fragment,
+    encrypt_fragment_with_session,
+    decrypt_fragment,
+    kemalg,
+)
 
 
 def test_generate_keys():
@@ -30,3 +39,34 @@ def test_encryption_decryption():
     encrypted = encrypt_fragment(data, public_key)
     decrypted = decrypt_fragment(encrypted, private_key)
     assert decrypted == data
+
+
+def test_session_encryption_decryption():
+    public_key, private_key = kemalg.keypair()
+    session = KemSession.open(public_key)
+    encrypted = [
+        encrypt_fragment_with_session(data, session, i)
+        for i, data in enumerate([b"Hello", b"Blockchain"])
+    ]
+
+    restored = KemSession.from_header(session.to_header(), private_key)
+    assert decrypt_fragment(encrypted[0], private_key, restored) == b"Hello"
+    assert decrypt_fragment(encrypted[1], private_key, restored) == \
+        b"Blockchain"
+
+    # Un fragment déplacé ne se déchiffre pas avec la clé d'un autre indice
+    encrypted[1]["fragment"] = 0
+    with pytest.raises(ValueError):
+        decrypt_fragment(encrypted[1], private_key, restored)
+
+
+def test_import_does_not_generate_keys():
+    # Aucune paire de clés ni auto-test à l'import des modules
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import cli_diplomas, blockchain.dilithium as d\n"
+         "print(cli_diplomas.get_keys.cache_info().currsize,"
+         " hasattr(d, 'public_key'))"],
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout == "0 False\n"
@@ -0,0 +1,70 @@
+import os
+import pytest
+from blockchain.dilithium import sign, verify
+from blockchain.blockchain import Blockchain
+from data_manager.chiffrement import KemSession
+from data_manager.fragmentation import (
+    IngestOptions,
+    add_file_to_blockchain,
+    extract_file_from_blockchain,
+)
+from data_manager.keystore import KeyStore, key_id, load_keys
+
+
+def test_keystore_persists_keys(tmp_path):
+    directory = str(tmp_path / "keystore")
+    keys = KeyStore(directory).load()
+    assert sorted(os.listdir(directory)) == \
+        ["kem.key", "kem.pub", "sig.key", "sig.pub"]
+
+    # Une seconde ouverture relit les mêmes clés au lieu d'en générer
+    reloaded = KeyStore(directory).load()
+    assert reloaded.sig_private_key == keys.sig_private_key
+    assert reloaded.kem_private_key == keys.kem_private_key
+    assert reloaded.kem_key_id == key_id(keys.kem_public_key)
+
+    signature = sign(b"Diplome", reloaded.sig_private_key)
+    assert verify(signature, b"Diplome", keys.sig_public_key) is True
+    session = KemSession.open(keys.kem_public_key)
+    restored = KemSession.from_header(
+        session.to_header(), reloaded.kem_private_key
+    )
+    assert restored.shared_secret == session.shared_secret
+
+    # Chargement unique par processus
+    assert load_keys(directory) is load_keys(directory)
+
+
+def test_keystore_passphrase(tmp_path):
+    directory = str(tmp_path / "keystore")
+    keys = KeyStore(directory, passphrase="secret").load()
+    with open(os.path.join(directory, "sig.key"), "rb") as f:
+        assert keys.sig_private_key not in f.read()
+
+    assert KeyStore(directory, "secret").load().sig_private_key == \
+        keys.sig_private_key
+    with pytest.raises(ValueError):
+        KeyStore(directory, "mauvaise").load()
+    with pytest.raises(ValueError):
+        KeyStore(directory).load()
+
+
+def test_key_id_recorded_in_blocks(tmp_path):
+    keys = KeyStore(str(tmp_path / "keystore")).load()
+    blockchain = Blockchain()
+    add_file_to_blockchain(
+        "tests/pdf_test.pdf", blockchain, keys.kem_public_key,
+        keys.sig_private_key, keys.sig_public_key,
+        IngestOptions(session=True, kem_key_id=keys.kem_key_id)
+    )
+
+    output_path = str(tmp_path / "diplome.pdf")
+    extract_file_from_blockchain(
+        blockchain, output_path, keys.kem_private_key, keys.sig_public_key,
+        keys.kem_key_id
+    )
+    with pytest.raises(ValueError, match="chiffré avec la clé"):
+        extract_file_from_blockchain(
+            blockchain, output_path, keys.kem_private_key,
+            keys.sig_public_key, "0" * 16
+        )
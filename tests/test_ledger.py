@@ -0,0 +1,138 @@
+import os
+import pytest
+from blockchain.blockchain import Blockchain
+from blockchain.ledger import Ledger
+from blockchain.storage import LazyChain
+from data_manager.archive import (
+    append_diploma,
+    close_ledgers,
+    iter_chain_files,
+    ledger_chain,
+    ledger_path,
+    open_diploma,
+)
+from data_manager.audit import audit_archive
+from data_manager.fragmentation import extract_file_from_blockchain
+from data_manager.index import DiplomaIndex
+from data_manager.keystore import load_keys
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    keys = load_keys(str(tmp_path / "keystore"))
+    directory = str(tmp_path / "db")
+    sizes = []
+    with DiplomaIndex(directory) as index:
+        for name in ["alice", "bob", "charlie"]:
+            diploma_id, path, segment = append_diploma(
+                "tests/pdf_test.pdf", {"Nom": name}, keys.kem_public_key,
+                keys.sig_private_key, keys.sig_public_key,
+                directory=directory, diploma_id=name,
+                kem_key_id=keys.kem_key_id
+            )
+            index.add_segment(diploma_id, path, *segment)
+            sizes.append(os.path.getsize(path))
+    return directory, keys, sizes
+
+
+def test_ledger_segments(ledger, tmp_path, monkeypatch):
+    directory, keys, sizes = ledger
+    path = ledger_path(directory)
+    segments = Ledger(path).segments()
+
+    # Un seul bloc de genèse, segments contigus
+    assert segments["alice"][0] == 1
+    assert segments["bob"][0] == segments["alice"][1] + 1
+    assert segments["charlie"][0] == segments["bob"][1] + 1
+    assert len(Blockchain.load_from_file(path, lazy=True).chain) == \
+        segments["charlie"][1] + 1
+    # Chaque ajout n'écrit que les blocs du nouveau diplôme
+    assert sizes[2] - sizes[1] == pytest.approx(sizes[1] - sizes[0], 0.05)
+
+    # Extraction et vérification ne lisent que le segment et ses voisins
+    read = set()
+    original_read = LazyChain._read
+
+    def counting_read(chain, i):
+        read.add(i)
+        return original_read(chain, i)
+
+    monkeypatch.setattr(LazyChain, "_read", counting_read)
+    with DiplomaIndex(directory) as index:
+        entry = index.get("bob")
+    assert entry["block_count"] == segments["bob"][1] - segments["bob"][0] + 1
+    segment = open_diploma(entry)
+    output = str(tmp_path / "bob.pdf")
+    extract_file_from_blockchain(
+        segment, output, keys.kem_private_key, keys.sig_public_key,
+        keys.kem_key_id
+    )
+    with open("tests/pdf_test.pdf", "rb") as f, open(output, "rb") as g:
+        assert f.read() == g.read()
+    start, end = segments["bob"]
+    assert read <= set(range(start - 1, end + 2))
+
+
+def test_ledger_tampered_segment(ledger):
+    directory, keys, _ = ledger
+    path = ledger_path(directory)
+    segments = Ledger(path).segments()
+
+    # Un fragment de Bob altéré dans le journal
+    chain = Blockchain.load_from_file(path, lazy=True).chain
+    offset = chain.offsets[segments["bob"][1]] + 200
+    chain.close()
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    # L'index se reconstruit depuis l'index des segments du registre
+    with DiplomaIndex(directory) as index:
+        index.rebuild(iter_chain_files(directory))
+        assert sorted(e["id"] for e in index.search()) == \
+            ["alice", "bob", "charlie"]
+        entries = index.chains()
+
+    results = {
+        result["id"]: result for result in audit_archive(entries)
+    }
+    assert results["alice"]["valid"] is True
+    assert results["charlie"]["valid"] is True
+    assert results["bob"]["valid"] is False
+    # Indice du bloc dans le registre
+    assert results["bob"]["first_bad_index"] == segments["bob"][1]
+    assert results["bob"]["segment"] == list(segments["bob"])
+
+
+def test_ledger_chain_reused_and_released(ledger, tmp_path):
+    directory, keys, _ = ledger
+    path = ledger_path(directory)
+    ledgers = {}
+    chain = ledger_chain(path, 1, ledgers)
+
+    # Un diplôme ajouté ensuite : la chaîne ouverte est complétée par la
+    # seule fin de l'index d'offsets, sans être rouverte
+    _, _, (start, end) = append_diploma(
+        "tests/pdf_test.pdf", {"Nom": "dave"}, keys.kem_public_key,
+        keys.sig_private_key, keys.sig_public_key, directory=directory,
+        diploma_id="dave", kem_key_id=keys.kem_key_id
+    )
+    assert len(chain) == start
+    assert ledger_chain(path, end, ledgers) is chain
+    assert len(chain) == end + 1
+    segment = Ledger(path).open_segment(start, end, chain)
+    assert segment.verify(public_key=keys.sig_public_key).valid
+    segment.close()
+    assert not chain._mmap.closed
+    close_ledgers(ledgers)
+    assert chain._mmap.closed and ledgers == {}
+
+    # Segment ouvert seul : il libère la chaîne du registre
+    with DiplomaIndex(directory) as index:
+        index.add_segment("dave", path, start, end)
+        segment = open_diploma(index.get("dave"))
+    assert segment.is_chain_valid()
+    segment.close()
+    assert segment.chain.chain._mmap.closed
@@ -0,0 +1,95 @@
+import pytest
+from blockchain.block import Block
+from blockchain.blockchain import Blockchain
+from blockchain.dilithium import KeyManager
+from blockchain.merkle import (
+    fragment_proof,
+    hash_leaves,
+    leaf_hash,
+    merkle_proof,
+    merkle_root,
+    verify_fragment,
+    verify_proof,
+)
+from data_manager.chiffrement import generate_kem_keys
+from data_manager.fragmentation import (
+    IngestOptions,
+    add_file_to_blockchain,
+    extract_file_from_blockchain,
+)
+
+
+def test_merkle_inclusion_proofs():
+    for count in range(1, 10):
+        leaves = hash_leaves([f"fragment {i}" for i in range(count)])
+        root = merkle_root(leaves)
+        for i, leaf in enumerate(leaves):
+            proof = merkle_proof(leaves, i)
+            assert verify_proof(leaf, proof, root)
+            assert not verify_proof(leaf_hash("autre"), proof, root)
+
+    # Le hachage parallèle donne les mêmes feuilles
+    datas = [f"fragment {i}" for i in range(40)]
+    assert hash_leaves(datas, workers=2) == hash_leaves(datas)
+
+
+def test_merkle_committed_file(tmp_path):
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+
+    blockchain = Blockchain()
+    add_file_to_blockchain(
+        "tests/pdf_test.pdf", blockchain, kem_public_key, sig_private_key,
+        sig_public_key,
+        IngestOptions(session=True, merkle=True, fragment_size=32 * 1024)
+    )
+    # Une seule signature : celle de l'en-tête
+    signed = [block.index for block in blockchain.chain if block.signature]
+    assert signed == [1]
+    assert blockchain.verify().valid
+
+    # Le journal binaire conserve les fragments non signés
+    path = str(tmp_path / "merkle.chain")
+    blockchain.save_to_file(path)
+    blockchain = Blockchain.load_from_file(path, lazy=True)
+    output_path = tmp_path / "reconstructed.pdf"
+    extract_file_from_blockchain(
+        blockchain, output_path, kem_private_key, sig_public_key
+    )
+    with open("tests/pdf_test.pdf", "rb") as f:
+        assert output_path.read_bytes() == f.read()
+
+    # Preuve d'inclusion d'un seul fragment
+    index = len(blockchain.chain) - 2
+    proof = fragment_proof(blockchain.chain, index)
+    assert proof[0] == 1
+    assert verify_fragment(blockchain.chain, index, proof, sig_public_key)
+    assert not verify_fragment(
+        blockchain.chain, index + 1, proof, sig_public_key
+    )
+    with pytest.raises(ValueError):
+        fragment_proof(blockchain.chain, 1)
+    # Bloc hors de la plage engagée par l'en-tête
+    for outside in (proof[0], len(blockchain.chain)):
+        with pytest.raises(ValueError):
+            verify_fragment(blockchain.chain, outside, proof, sig_public_key)
+
+    # Un fragment remplacé (chaînage intact) est détecté par la racine
+    chain = list(blockchain.chain)
+    blockchain.close()
+    last = chain[-1]
+    chain[-1] = Block(
+        index=last.index, timestamp=last.timestamp, data="00",
+        previous_hash=last.previous_hash
+    )
+    blockchain.chain = chain
+    assert blockchain.verify().failed_indexes == [1]
+
+    # Un bloc non signé hors engagement est refusé
+    chain[-1] = last
+    blockchain.add_block(Block(
+        index=len(chain), data="00", previous_hash=last.hash
+    ), signed=False)
+    assert blockchain.verify().failed_indexes == [len(chain) - 1]
@@ -0,0 +1,77 @@
+import json
+import pytest
+from blockchain import metrics
+from blockchain.blockchain import Blockchain
+from blockchain.dilithium import KeyManager
+from data_manager.chiffrement import generate_kem_keys
+from data_manager.fragmentation import (
+    IngestOptions,
+    add_file_to_blockchain,
+    extract_file_from_blockchain,
+)
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_by_default():
+    assert not metrics.is_enabled()
+    with metrics.stage("rien", 10) as measure:
+        measure.nbytes = 20
+    assert metrics.snapshot() == {}
+
+
+def test_stage_breakdown(tmp_path, enabled):
+    key_manager = KeyManager()
+    sig_public_key = key_manager.get_public_key()
+    sig_private_key = key_manager.get_private_key()
+    kem_public_key, kem_private_key = generate_kem_keys()
+
+    path = str(tmp_path / "diplome.chain")
+    blockchain = Blockchain.open(path)
+    add_file_to_blockchain(
+        "tests/pdf_test.pdf", blockchain, kem_public_key, sig_private_key,
+        sig_public_key, IngestOptions(session=True, fragment_size=64 * 1024)
+    )
+    blockchain.close()
+    extract_file_from_blockchain(
+        Blockchain.load_from_file(path, lazy=True),
+        tmp_path / "extrait.pdf", kem_private_key, sig_public_key
+    )
+
+    stages = metrics.report()["stages"]
+    fragments = stages["aes.encrypt"]["count"]
+    assert fragments > 1
+    assert stages["kem.encap"]["count"] == 1
+    assert stages["kem.decap"]["count"] == 1
+    assert stages["aes.decrypt"]["count"] == fragments
+    assert stages["dilithium.sign"]["count"] == fragments + 1
+    assert stages["file.read"]["bytes"] == \
+        stages["file.write"]["bytes"] == \
+        (tmp_path / "extrait.pdf").stat().st_size
+    for stage in stages.values():
+        assert sum(stage["buckets"]) == stage["count"]
+        assert stage["p50"] <= stage["p99"]
+
+    # Mesures d'un autre processus ajoutées aux mesures courantes
+    measures = metrics.snapshot()
+    metrics.merge(measures)
+    assert metrics.report()["stages"]["kem.encap"]["count"] == 2
+
+    metrics.write_report(tmp_path / "metrics.json")
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    assert report["stages"]["kem.encap"]["count"] == 2
+
+    metrics.write_report(tmp_path / "metrics.prom")
+    text = (tmp_path / "metrics.prom").read_text()
+    assert "# TYPE diploma_stage_seconds histogram" in text
+    assert 'diploma_stage_seconds_bucket{stage="kem.encap",le="+Inf"} 2' \
+        in text
+    assert f'diploma_stage_bytes_total{{stage="file.read"}} ' \
+        f'{2 * stages["file.read"]["bytes"]}' in text
@@ -0,0 +1,189 @@
+import os
+from blockchain.block import TYPE_GENESIS, Block
+from blockchain.blockchain import Blockchain
+from blockchain import storage
+from blockchain.dilithium import KeyManager
+from blockchain.storage import ChainStore, json_to_store, store_to_json
+
+
+def _build_chain(length):
+    key_manager = KeyManager()
+    public_key = key_manager.get_public_key()
+    private_key = key_manager.get_private_key()
+    blockchain = Blockchain()
+    for i in range(1, length):
+        blockchain.add_block(Block(
+            index=i,
+            data=f"Bloc {i}".encode().hex(),
+            previous_hash=blockchain.chain[-1].hash,
+            private_key=private_key,
+            public_key=public_key
+        ))
+    return blockchain, public_key, private_key
+
+
+def test_save_and_load_binary_store(tmp_path):
+    path = str(tmp_path / "chain.chain")
+    blockchain, public_key, private_key = _build_chain(4)
+    blockchain.save_to_file(path)
+
+    loaded = Blockchain.load_from_file(path)
+    assert [b.to_dict() for b in loaded.chain] == \
+        [b.to_dict() for b in blockchain.chain]
+    assert loaded.is_chain_valid() is True
+
+    # Un nouveau bloc est ajouté en fin de journal sans réécrire le reste
+    size = os.path.getsize(path)
+    blockchain.add_block(Block(
+        index=4,
+        data="Bloc 4".encode().hex(),
+        previous_hash=blockchain.chain[-1].hash,
+        private_key=private_key,
+        public_key=public_key
+    ))
+    blockchain.save_to_file(path)
+    with open(path, "rb") as f:
+        head = f.read(size)
+    with ChainStore(path) as store:
+        assert len(store) == 5
+        assert store.read_block(4).data == "Bloc 4".encode().hex()
+    json_path = str(tmp_path / "chain.json")
+    blockchain.save_to_file(json_path)
+    assert os.path.getsize(path) < os.path.getsize(json_path)
+    with open(path, "rb") as f:
+        assert f.read(size) == head
+
+
+def test_store_recovers_missing_index_entries(tmp_path):
+    path = str(tmp_path / "chain.chain")
+    blockchain, _, _ = _build_chain(3)
+    blockchain.save_to_file(path)
+
+    # Simule un arrêt brutal : index perdu et enregistrement tronqué
+    os.remove(path + ".idx")
+    with open(path, "ab") as f:
+        f.write(b"\xff\x00")
+    with ChainStore(path) as store:
+        assert len(store) == 3
+        assert store.read_block(2).hash == blockchain.chain[2].hash
+
+
+def test_store_drops_indexed_record_cut_short(tmp_path):
+    path = str(tmp_path / "chain.chain")
+    blockchain, _, _ = _build_chain(3)
+    blockchain.save_to_file(path)
+    with ChainStore(path) as store:
+        last = store.offsets[2]
+
+    # Arrêt brutal : entrée d'index écrite, données du bloc incomplètes
+    with open(path, "r+b") as f:
+        f.truncate(last + 10)
+    with open(path + ".idx", "rb") as f:
+        index = f.read()
+
+    # Un lecteur ignore le bloc sans toucher aux fichiers
+    with ChainStore(path, writable=False) as store:
+        assert len(store) == 2
+    assert os.path.getsize(path) == last + 10
+    with open(path + ".idx", "rb") as f:
+        assert f.read() == index
+
+    # L'ouverture en écriture supprime l'enregistrement et son entrée
+    with ChainStore(path) as store:
+        assert len(store) == 2
+        store.append(blockchain.chain[2])
+    with ChainStore(path, writable=False) as store:
+        assert [block.hash for block in store] == \
+            [block.hash for block in blockchain.chain]
+
+
+def test_json_store_conversion(tmp_path):
+    json_path = str(tmp_path / "chain.json")
+    store_path = str(tmp_path / "chain.chain")
+    back_path = str(tmp_path / "back.json")
+    blockchain, _, _ = _build_chain(3)
+    blockchain.save_to_file(json_path)
+
+    json_to_store(json_path, store_path)
+    store_to_json(store_path, back_path)
+    restored = Blockchain.load_from_file(back_path)
+    assert [b.to_dict() for b in restored.chain] == \
+        [b.to_dict() for b in blockchain.chain]
+
+
+def test_lazy_load_decodes_blocks_on_access(tmp_path, monkeypatch):
+    path = str(tmp_path / "chain.chain")
+    blockchain, _, _ = _build_chain(5)
+    blockchain.save_to_file(path)
+
+    decoded = []
+    decode_block = storage.decode_block
+
+    def counting_decode(buffer, keys, views=False):
+        block = decode_block(buffer, keys, views)
+        decoded.append(block.index)
+        return block
+
+    monkeypatch.setattr(storage, "decode_block", counting_decode)
+    lazy = Blockchain.load_from_file(path, lazy=True)
+    assert len(lazy.chain) == 5
+    assert decoded == []
+
+    assert lazy.chain[1].data == blockchain.chain[1].data
+    assert lazy.chain[-1].hash == blockchain.chain[-1].hash
+    assert decoded == [1, 4]
+
+    assert lazy.is_chain_valid() is True
+    lazy.chain.close()
+
+
+def test_compact_codec_round_trip(tmp_path):
+    blockchain, public_key, _ = _build_chain(6)
+    path = str(tmp_path / "compact.chain")
+    blockchain.save_to_file(path)
+
+    # La clé publique n'est stockée qu'une fois dans le journal
+    with open(path, "rb") as f:
+        assert f.read().count(public_key) == 1
+    for lazy in (False, True):
+        loaded = Blockchain.load_from_file(path, lazy=lazy)
+        assert [b.to_dict() for b in loaded.chain] == \
+            [b.to_dict() for b in blockchain.chain]
+        assert loaded.is_chain_valid() is True
+        assert loaded.chain[0].block_type == TYPE_GENESIS
+        loaded.close()
+
+    # Index perdu : les enregistrements de clé sont retrouvés
+    os.remove(path + ".idx")
+    with ChainStore(path) as store:
+        assert len(store) == 6
+        assert store.read_block(5).public_key == public_key
+
+
+def test_version_1_store_still_readable(tmp_path):
+    blockchain, public_key, private_key = _build_chain(3)
+    path = str(tmp_path / "v1.chain")
+    with open(path, "wb") as f:
+        f.write(storage.MAGIC + bytes([1]))
+        for block in blockchain.chain:
+            record = storage.encode_block(block, version=1)
+            f.write(storage.RECORD_LENGTH.pack(len(record)) + record)
+
+    loaded = Blockchain.load_from_file(path)
+    assert [b.to_dict() for b in loaded.chain] == \
+        [b.to_dict() for b in blockchain.chain]
+
+    # Un journal de version 1 est complété dans son format
+    blockchain.add_block(Block(
+        index=3,
+        data="Bloc 3".encode().hex(),
+        previous_hash=blockchain.chain[-1].hash,
+        private_key=private_key,
+        public_key=public_key
+    ))
+    blockchain.save_to_file(path)
+    with ChainStore(path) as store:
+        assert store.version == 1
+        assert store.read_block(3).to_dict() == blockchain.chain[3].to_dict()
+        # Type du bloc de genèse conservé en dernier champ
+        assert store.read_block(0).block_type == TYPE_GENESIS